@@ -1,21 +1,208 @@
-import os, json, requests, re # type: ignore
-from fastapi import FastAPI, Body # type: ignore
+import io, os, json, time, asyncio, hashlib, logging, tempfile
+from typing import Optional
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Body, HTTPException, Request # type: ignore
 from fastapi.middleware.cors import CORSMiddleware # type: ignore
-from pydantic import BaseModel # type: ignore
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse # type: ignore
+from pydantic import BaseModel, ValidationError # type: ignore
 from dotenv import load_dotenv # type: ignore
+from cache import ResponseCache
+from draft import draft_analysis, gig_weaknesses
+from concurrency import AdmissionController, CancelOnDisconnect, Overloaded, SingleFlight, bounded_map, until
+from jobs import FINISHED, JobQueue, RetryLater
+from jsonextract import JSONScanner, extract_fields, extract_json, looks_like_markdown, strip_code_fences
+from metrics import (
+    CACHE_LOOKUPS,
+    CHAT_TURN_PROMPT_EVAL_SECONDS,
+    OLLAMA_REQUESTS,
+    PROMPT_TOKENS_ESTIMATED,
+    PROMPT_TRUNCATIONS,
+    REGISTRY,
+    SEMANTIC_LOOKUP_SECONDS,
+    SEMANTIC_LOOKUPS,
+    SEMANTIC_SIMILARITY,
+    STAGE_SECONDS,
+    STRUCTURED_OUTPUTS,
+    observe_cancelled,
+    observe_completion,
+)
+from ollama_client import Completion, DeadlineExceeded, OllamaError, OllamaUnavailable, parse_keep_alive
+from pool import OllamaPool
+from schemas import GigImprovement, ReplySuggestion, SchemaError, json_schema, repair_request, validate
+from semcache import SemanticIndex
+from sessions import SessionBusy, SessionStore
+from tagindex import TagIndexFile, TagLog
+from warmup import ModelWarmer
+from seo import (
+    iter_csv as seo_iter_csv,
+    iter_ndjson as seo_iter_ndjson,
+    normalize as seo_normalize,
+    render as seo_render,
+    score_gig,
+)
 from prompts import (
-    SYSTEM_PROMPT_IMPROVE_GIG,
-    build_user_prompt_for_improve,
-    build_user_prompt_from_scratch,
+    MIN_FIELD_TOKENS,
+    Prompt,
+    chat_prompt,
+    improve_prompt,
+    reply_prompt,
+    scratch_prompt,
+    shorten,
+    squeeze_whitespace,
 )
 
 load_dotenv()
 
+# DEBUG shows per-request details (cache hits, response shapes); INFO and up for normal runs
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+log = logging.getLogger("gig_helper")
+# httpx logs every Ollama request at INFO; keep that for DEBUG runs only
+logging.getLogger("httpx").setLevel(logging.DEBUG if LOG_LEVEL == "DEBUG" else logging.WARNING)
+
 # Use an Ollama model name (pulled locally), e.g. "llama3.1" or "qwen2.5:7b-instruct"
 MODEL = os.getenv("MODEL", "llama3.1")
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+# Several Ollama hosts, comma-separated; generations go to the least-loaded healthy one
+OLLAMA_URLS = [u.strip() for u in os.getenv("OLLAMA_URLS", OLLAMA_URL).split(",") if u.strip()]
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "120"))
+# Total seconds a route's generation may take once it has a slot, across API fallbacks, host
+# failover and the structured repair call ("route=seconds,..."; other routes get OLLAMA_TIMEOUT).
+# OLLAMA_TIMEOUT itself only bounds each single read from Ollama.
+OLLAMA_DEADLINES = {
+    route.strip(): float(seconds)
+    for route, _, seconds in (item.partition("=") for item in os.getenv(
+        "OLLAMA_DEADLINES", "reply_suggestion=45,chat_gig=90,improve_gig=120,improve_gig_batch=180,improve_gig_job=300"
+    ).split(","))
+    if route.strip() and seconds.strip()
+}
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "64"))
+# Background health poll: seconds between checks (HEALTH_RETRY_INTERVAL while Ollama is down)
+HEALTH_INTERVAL = float(os.getenv("HEALTH_INTERVAL", "10"))
+HEALTH_RETRY_INTERVAL = float(os.getenv("HEALTH_RETRY_INTERVAL", "2"))
+
+# How long Ollama keeps a model loaded after each request ("30m", seconds, -1 = forever, "" = Ollama's default)
+OLLAMA_KEEP_ALIVE = parse_keep_alive(os.getenv("OLLAMA_KEEP_ALIVE", "30m"))
+# Models loaded on every host at startup besides MODEL (comma-separated)
+PRELOAD_MODELS = [m.strip() for m in os.getenv("PRELOAD_MODELS", "").split(",") if m.strip()]
+# While inside KEEPALIVE_DAYS/KEEPALIVE_HOURS (server local time), hosts idle for KEEPALIVE_INTERVAL
+# seconds get an empty generation so the models stay loaded; 0 turns the pings off
+KEEPALIVE_INTERVAL = float(os.getenv("KEEPALIVE_INTERVAL", "240"))
+KEEPALIVE_DAYS = os.getenv("KEEPALIVE_DAYS", "mon-fri")
+KEEPALIVE_HOURS = os.getenv("KEEPALIVE_HOURS", "08:00-20:00")
+
+# Response cache: in-memory LRU in front of a SQLite file (CACHE_DB="" keeps it memory-only)
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+CACHE_TTL = float(os.getenv("CACHE_TTL", "86400"))
+CACHE_DB = os.getenv("CACHE_DB", "cache.db")
+# Near-duplicate cache (off by default): a gig whose EMBED_MODEL embedding of niche/title/description
+# has cosine similarity >= SEMANTIC_CACHE_THRESHOLD with an answered one reuses that answer.
+# Vectors are memory-mapped from SEMANTIC_CACHE_PATH.f32 ("" = memory only), SEMANTIC_CACHE_SIZE at most.
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "false").lower() in ("1", "true", "yes")
+EMBED_MODEL = os.getenv("EMBED_MODEL", "nomic-embed-text")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", "semantic")
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "20000"))
+
+# Each host is health-polled in the background; when none is up (or has MODEL) a generation
+# fails at once instead of after OLLAMA_TIMEOUT
+ollama = OllamaPool(OLLAMA_URLS, timeout=OLLAMA_TIMEOUT, max_connections=OLLAMA_MAX_CONNECTIONS,
+                    keep_alive=OLLAMA_KEEP_ALIVE, interval=HEALTH_INTERVAL, retry_interval=HEALTH_RETRY_INTERVAL,
+                    stale_after=max(60.0, 3 * HEALTH_INTERVAL))
+warmer = ModelWarmer(ollama, [MODEL, *PRELOAD_MODELS], keep_alive=OLLAMA_KEEP_ALIVE, interval=KEEPALIVE_INTERVAL,
+                     days=KEEPALIVE_DAYS, hours=KEEPALIVE_HOURS)
+cache = ResponseCache(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, db_path=CACHE_DB)
+semantic = SemanticIndex(SEMANTIC_CACHE_PATH, capacity=SEMANTIC_CACHE_SIZE) if SEMANTIC_CACHE else None
+# /improve_gig/batch: default and maximum parallel generations, and largest accepted batch
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+
+# Admission control in front of Ollama: concurrent generations per configured host (one global limit of
+# OLLAMA_MAX_INFLIGHT x hosts, not a per-host cap), queue depth and max queue wait (s)
+OLLAMA_MAX_INFLIGHT = int(os.getenv("OLLAMA_MAX_INFLIGHT", "2"))
+QUEUE_MAX_DEPTH = int(os.getenv("QUEUE_MAX_DEPTH", "32"))
+QUEUE_MAX_WAIT = float(os.getenv("QUEUE_MAX_WAIT", "30"))
+
+# Lower runs first: cheap interactive calls shouldn't wait behind long gig rewrites
+ROUTE_PRIORITY = {
+    "reply_suggestion": 0,
+    "chat_gig": 1,
+    "improve_gig": 2,
+    "improve_gig_batch": 3,
+    "improve_gig_job": 3,
+}
+# Routes whose generations wait for a slot as long as it takes instead of failing with 429
+PATIENT_ROUTES = {"improve_gig_batch", "improve_gig_job"}
+
+# /chat_gig sessions: how many are kept, follow-up turns of history per session, idle expiry (s),
+# and how long Ollama keeps the model loaded between turns
+CHAT_SESSIONS_MAX = int(os.getenv("CHAT_SESSIONS_MAX", "1000"))
+CHAT_SESSION_TURNS = int(os.getenv("CHAT_SESSION_TURNS", "12"))
+CHAT_SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL", "3600"))
+CHAT_KEEP_ALIVE = parse_keep_alive(os.getenv("CHAT_KEEP_ALIVE", "30m"))
+
+# Input token budget per route (estimated, system + user prompt; 0 = unlimited). Longer gig
+# descriptions, chat messages and buyer messages are cut in the middle to fit. COMPACT_PROMPTS
+# swaps in shorter system prompts: less prefill per call, somewhat less detailed answers.
+PROMPT_BUDGET_IMPROVE = int(os.getenv("PROMPT_BUDGET_IMPROVE", "1500"))
+PROMPT_BUDGET_CHAT = int(os.getenv("PROMPT_BUDGET_CHAT", "1500"))
+PROMPT_BUDGET_REPLY = int(os.getenv("PROMPT_BUDGET_REPLY", "800"))
+COMPACT_PROMPTS = os.getenv("COMPACT_PROMPTS", "false").lower() in ("1", "true", "yes")
 
-app = FastAPI()
+# Routes that ask Ollama for schema-constrained JSON (validated, with at most one repair call)
+# instead of free text; ?structured=true/false overrides it per request
+STRUCTURED_ROUTES = {r.strip() for r in os.getenv("STRUCTURED_ROUTES", "reply_suggestion").split(",") if r.strip()}
+
+# Background jobs (/jobs/...): SQLite file (JOBS_DB="" keeps them in memory), concurrent workers
+# (default: one per generation slot), how long finished results are kept (s), and how many times
+# a job is retried while Ollama is unreachable or busy; a job that overran its OLLAMA_DEADLINES budget
+# with Ollama up is only run JOB_DEADLINE_ATTEMPTS times in all, since it will likely overrun again
+JOBS_DB = os.getenv("JOBS_DB", "jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "0")) or OLLAMA_MAX_INFLIGHT * len(OLLAMA_URLS)
+JOB_TTL = float(os.getenv("JOB_TTL", str(7 * 86400)))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "20"))
+JOB_DEADLINE_ATTEMPTS = int(os.getenv("JOB_DEADLINE_ATTEMPTS", "2"))
+
+# /seo_score/bulk uploads stay in memory up to this size, then spill to a temp file
+SEO_SPOOL_BYTES = int(os.getenv("SEO_SPOOL_BYTES", str(8 * 1024 * 1024)))
+
+# Niche keyword/tag index behind /suggest_tags and /seo_score's keyword coverage, built offline with
+# `python tagindex.py TAG_INDEX TAG_LOG gigs.csv ...` and picked up again whenever it is rebuilt.
+# Tags from every analysed gig are appended to TAG_LOG for the next build ("" = don't record).
+TAG_INDEX = os.getenv("TAG_INDEX", "tags.idx")
+TAG_LOG = os.getenv("TAG_LOG", "tags.ndjson")
+# /seo_score adds a tip when a gig uses fewer than this share of its niche's top keywords/tags
+TAG_COVERAGE_TIP = float(os.getenv("TAG_COVERAGE_TIP", "0.3"))
+
+# Identical generations already in flight are joined rather than started again
+inflight = SingleFlight()
+sessions = SessionStore(max_sessions=CHAT_SESSIONS_MAX, max_turns=CHAT_SESSION_TURNS, ttl=CHAT_SESSION_TTL,
+                        busy_timeout=OLLAMA_TIMEOUT)
+jobs = JobQueue(db_path=JOBS_DB, workers=JOB_WORKERS, ttl=JOB_TTL, max_attempts=JOB_MAX_ATTEMPTS)
+tag_index = TagIndexFile(TAG_INDEX)
+tag_log = TagLog(TAG_LOG)
+admission = AdmissionController(max_inflight=OLLAMA_MAX_INFLIGHT * len(OLLAMA_URLS), max_queue=QUEUE_MAX_DEPTH, max_wait=QUEUE_MAX_WAIT)
+
+@asynccontextmanager
+async def lifespan(app):
+    ollama.start()
+    warmer.start()
+    jobs.start()
+    yield
+    await jobs.stop()
+    await warmer.stop()
+    await ollama.stop()
+    await ollama.aclose()
+    cache.close()
+    jobs.close()
+    await asyncio.to_thread(tag_log.close)
+    if semantic is not None:
+        semantic.close()
+
+app = FastAPI(lifespan=lifespan)
+# closing the popup (or re-clicking) cancels the request's handler, which aborts its Ollama generation
+app.add_middleware(CancelOnDisconnect)
 app.add_middleware(
     CORSMiddleware,
     # permissive for local dev (popup + localhost)
@@ -25,6 +212,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": f"Server busy: {exc}", "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(SessionBusy)
+async def session_busy_handler(request: Request, exc: SessionBusy):
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
 class GigReq(BaseModel):
     title: str = ""
     description: str = ""
@@ -40,111 +239,190 @@ class ChatReq(BaseModel):
     description: str = ""
     niche: str = ""
     user_message: str = ""
+    session_id: str = ""  # from the previous /chat_gig answer; empty starts a new conversation
 
 # ---------- Ollama helpers ----------
 
-def _flatten_messages_to_prompt(messages) -> str:
-    sys_txt = "\n".join(m.get("content", "") for m in messages if m.get("role") == "system").strip()
-    user_txt = "\n".join(m.get("content", "") for m in messages if m.get("role") == "user").strip()
-    if sys_txt:
-        return f"{sys_txt}\n\nUser:\n{user_txt}\n\nAssistant:"
-    return user_txt
+def gig_text(req) -> str:
+    """What the near-duplicate cache compares; empty (no lookup) for gigs without title or description."""
+    if not (req.title or "").strip() and not (req.description or "").strip():
+        return ""
+    return squeeze_whitespace(f"{req.niche}\n{req.title}\n{req.description}")
 
-def call_ollama(messages, model: str = MODEL, temperature: float = 0.5) -> str:
+def semantic_namespace(messages, format=None) -> str:
+    """Answers are only shared between requests built from the same system prompt and output format."""
+    return ResponseCache.make_key(MODEL, 0.5, [m for m in messages if m.get("role") == "system"], format)
+
+async def semantic_lookup(text: str, messages, key: str, route: str, format=None, accept=None):
     """
-    Use /api/chat if available; otherwise fall back to /api/generate (older Ollama).
-    Also handles NDJSON streaming from very old builds.
+    (answer of a near-duplicate gig or None, this gig's embedding to index with its own answer).
+    A hit is also stored under the exact key, so repeating this request is an ordinary cache hit.
+    A hit that `accept` rejects counts as a miss.
     """
-    print(f"[DEBUG] call_ollama called with model: {model}")
-    
-    # --- Try /api/chat (newer Ollama) ---
+    if semantic is None or not text:
+        return None, None
+    started = time.perf_counter()
     try:
-        print(f"[DEBUG] Trying /api/chat endpoint...")
-        r = requests.post(
-            f"{OLLAMA_URL}/api/chat",
-            json={
-                "model": model,
-                "messages": messages,
-                "options": {"temperature": temperature},
-                "stream": False
-            },
-            timeout=120
-        )
-        print(f"[DEBUG] /api/chat response status: {r.status_code}")
-        # If server exists but returns non-200 (e.g., 404 on old builds), don't raise; we will fall back.
-        if r.status_code == 200:
-            data = r.json()
-            content = data.get("message", {}).get("content", "")
-            print(f"[DEBUG] /api/chat successful, content length: {len(content)}")
-            return content
-        else:
-            print(f"[DEBUG] /api/chat failed with status {r.status_code}, falling back to /api/generate")
-    except requests.RequestException as e:
-        # network/connection error — fall through to /api/generate
-        print(f"[DEBUG] /api/chat exception: {e}, falling back to /api/generate")
-        pass
+        vector = await ollama.embed(text, EMBED_MODEL)
+    except OllamaError as e:
+        SEMANTIC_LOOKUPS.inc(route=route, result="error")
+        log.debug("embedding failed, skipping the near-duplicate cache: %s", e)
+        return None, None
+    similarity, match = await asyncio.to_thread(semantic.search, vector, semantic_namespace(messages, format))
+    hit = await cache.get(match) if match and similarity >= SEMANTIC_CACHE_THRESHOLD else None
+    if hit is not None and accept is not None and not accept(hit):
+        hit = None
+    SEMANTIC_LOOKUP_SECONDS.observe(time.perf_counter() - started, route=route)
+    if match:
+        SEMANTIC_SIMILARITY.observe(similarity, route=route)
+    SEMANTIC_LOOKUPS.inc(route=route, result="miss" if hit is None else "hit")
+    if hit is not None:
+        log.debug("near-duplicate hit on %s (similarity %.3f)", route, similarity)
+        await cache.set(key, hit)
+    return hit, vector
 
-    # --- Fallback: /api/generate (older Ollama) ---
-    prompt = _flatten_messages_to_prompt(messages)
+async def semantic_store(vector, messages, key: str, format=None):
+    if vector is not None:
+        await asyncio.to_thread(semantic.add, vector, semantic_namespace(messages, format), key)
 
-    try:
-        r = requests.post(
-            f"{OLLAMA_URL}/api/generate",
-            json={
-                "model": model,
-                "prompt": prompt,
-                "options": {"temperature": temperature},
-                "stream": False
-            },
-            timeout=120
-        )
-    except requests.RequestException as e:
-        # final error back to caller as JSON string (handled by coerce_json)
-        return json.dumps({"error": f"Ollama request failed: {e}"})
+def route_deadline(route: str) -> float:
+    return OLLAMA_DEADLINES.get(route, OLLAMA_TIMEOUT)
 
-    # Some older builds ignore stream=False and return NDJSON stream; detect by content-type
-    ctype = (r.headers.get("content-type") or "").lower()
-    if r.status_code == 200 and "application/json" in ctype:
-        try:
-            return r.json().get("response", "")
-        except Exception:
-            return r.text
+def deadline_error(route: str, budget: float) -> OllamaError:
+    return DeadlineExceeded(f"Ollama did not finish within the {budget:.0f}s budget for {route}")
+
+async def generate(messages, model: str = MODEL, temperature: float = 0.5, use_cache: bool = True,
+                   route: str = "improve_gig", semantic_text: str = "", budget: float = None, accept=None,
+                   **ollama_kw) -> Completion:
+    """
+    Generate a completion through the shared, connection-pooled client, consulting the
+    response cache first. use_cache=False skips the lookup but still stores the fresh result.
+    semantic_text (a gig's text) also enables the near-duplicate cache for this call.
+    Concurrent identical calls share one Ollama generation, which waits for an admission
+    slot at the route's priority and then gets `budget` seconds (default: the route's deadline);
+    it is aborted once every caller has gone away. `accept(text) -> bool` is a check an answer
+    must pass to be cached (or served from the cache); a rejected answer is still returned.
+    ollama_kw (prefer, keep_alive, context, format) goes to OllamaPool.chat. Raises OllamaError
+    (never cached) or Overloaded.
+    """
+    key = ResponseCache.make_key(model, temperature, messages, ollama_kw.get("format"))
+    vector = None
+    if use_cache:
+        hit = await cache.get(key)
+        if hit is not None and accept is not None and not accept(hit):
+            hit = None  # e.g. an answer cached before it was found not to match the schema
+        CACHE_LOOKUPS.inc(route=route, result="miss" if hit is None else "hit")
+        if hit is not None:
+            log.debug("cache hit: route=%s model=%s", route, model)
+            return Completion(text=hit, model=model)
+        if model == MODEL:
+            hit, vector = await semantic_lookup(semantic_text, messages, key, route, ollama_kw.get("format"), accept)
+            if hit is not None:
+                return Completion(text=hit, model=model)
 
-    # NDJSON streaming fallback
     try:
-        r = requests.post(
-            f"{OLLAMA_URL}/api/generate",
-            json={"model": model, "prompt": prompt, "options": {"temperature": temperature}, "stream": True},
-            timeout=120, stream=True
-        )
-        r.raise_for_status()
-        chunks = []
-        for line in r.iter_lines(decode_unicode=True):
-            if not line:
-                continue
+        ollama.check(model)
+    except OllamaError:
+        OLLAMA_REQUESTS.inc(route=route, model=model, outcome="unavailable")
+        raise
+
+    async def run():
+        queued = time.perf_counter()
+        async with admission.slot(ROUTE_PRIORITY[route], patient=route in PATIENT_ROUTES):
+            started = time.perf_counter()
+            STAGE_SECONDS.observe(started - queued, stage="queue_wait", route=route)
+            log.debug("ollama call: route=%s model=%s", route, model)
+            limit = route_deadline(route) if budget is None else budget
             try:
-                obj = json.loads(line)
-                if "response" in obj:
-                    chunks.append(obj["response"])
-                if obj.get("done"):
-                    break
-            except Exception:
-                continue
-        return "".join(chunks)
-    except requests.RequestException as e:
-        return json.dumps({"error": f"Ollama streaming failed: {e}"})
+                done = await asyncio.wait_for(ollama.chat(messages, model=model, temperature=temperature, **ollama_kw), max(0.0, limit))
+            except asyncio.TimeoutError:
+                saved = observe_cancelled(route, "deadline", time.perf_counter() - started)
+                log.warning("%s generation hit its %.0fs deadline (~%d tokens saved)", route, limit, saved)
+                raise deadline_error(route, limit)
+            except asyncio.CancelledError:
+                saved = observe_cancelled(route, "client", time.perf_counter() - started)
+                log.info("%s generation aborted, client gone (~%d tokens saved)", route, saved)
+                raise
+            except OllamaError:
+                OLLAMA_REQUESTS.inc(route=route, model=model, outcome="error")
+                raise
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage="ollama", route=route)
+        observe_completion(done, route)
+        log.debug("ollama (%s) ok: %d chars, %d tokens", done.backend, len(done.text), done.eval_count)
+        if accept is None or accept(done.text):
+            await cache.set(key, done.text)
+            await semantic_store(vector, messages, key, ollama_kw.get("format"))
+        return done
+
+    return await inflight.do(key, run)
+
+def matches_schema(schema, text: str) -> bool:
+    try:
+        validate(schema, text)
+    except SchemaError:
+        return False
+    return True
+
+async def generate_structured(messages, schema, route: str, use_cache: bool = True, semantic_text: str = "") -> dict:
+    """
+    Generate with Ollama's `format` set to the schema of Pydantic model `schema` and return the
+    validated fields. An answer that still fails validation gets one repair call (the bad answer
+    and the validation errors sent back to the model), within what is left of the route's
+    deadline; if that fails too, OllamaError. Only answers that validate are cached, so a
+    failed request reaches the model again when it is retried.
+    """
+    fmt = json_schema(schema)
+    accept = lambda text: matches_schema(schema, text)
+    done = await generate(messages, use_cache=use_cache, route=route, semantic_text=semantic_text, accept=accept,
+                          format=fmt)
+    try:
+        data = validate(schema, done.text)
+    except SchemaError as e:
+        log.info("%s answer failed schema validation, repairing: %s", route, e)
+        error = e
+    else:
+        STRUCTURED_OUTPUTS.inc(route=route, result="first_pass")
+        return data
+
+    repair = messages + [{"role": "assistant", "content": done.text}, {"role": "user", "content": repair_request(error)}]
+    fixed = await generate(repair, use_cache=use_cache, route=route, budget=route_deadline(route) - done.total_duration,
+                           accept=accept, format=fmt)
+    try:
+        data = validate(schema, fixed.text)
+    except SchemaError as e:
+        STRUCTURED_OUTPUTS.inc(route=route, result="failed")
+        raise OllamaError(f"model output didn't match the {schema.__name__} schema: {e}")
+    STRUCTURED_OUTPUTS.inc(route=route, result="repaired")
+    # the original request has no cache entry (its answer was broken); give it the fixed one
+    await cache.set(ResponseCache.make_key(MODEL, 0.5, messages, fmt), fixed.text)
+    return data
 
+def wants_structured(route: str, structured) -> bool:
+    return route in STRUCTURED_ROUTES if structured is None else structured
 
-def coerce_json(text: str):
+async def call_ollama(messages, model: str = MODEL, temperature: float = 0.5, use_cache: bool = True,
+                      route: str = "improve_gig", semantic_text: str = "") -> str:
+    """Like generate(), but Ollama errors come back as a JSON string (handled by coerce_json)."""
+    try:
+        return (await generate(messages, model=model, temperature=temperature, use_cache=use_cache, route=route,
+                               semantic_text=semantic_text)).text
+    except OllamaError as e:
+        log.warning("Ollama error on %s: %s", route, e)
+        return json.dumps({"error": str(e)})
+
+
+def coerce_json(text: str, scanner: JSONScanner = None):
     """
     Handle both JSON and natural language responses.
     - If text is valid JSON, return it as object
     - If text is natural language (like our new format), return it as string
     - Fallback to JSON extraction for compatibility
+    Every step is a linear scan (see jsonextract), so malformed output can't blow up.
+    `scanner` has already scanned `text` as it streamed in (see stream_generation).
     """
     # Clean up the text
-    cleaned_text = text.strip()
-    cleaned_text = re.sub(r"^```(?:json)?\s*|\s*```$", "", cleaned_text, flags=re.I)
+    cleaned_text = strip_code_fences(text)
     
     # Try to parse as JSON first
     try:
@@ -153,58 +431,33 @@ def coerce_json(text: str):
         pass
 
     # Check if this looks like natural language (has headings, bullet points, etc.)
-    if re.search(r'^\s*[#*•\d]', cleaned_text, re.M) or '**' in cleaned_text:
+    if looks_like_markdown(cleaned_text):
         # This looks like natural language with formatting - return as string
         return cleaned_text
 
-    # Try extract fenced JSON
-    candidate = cleaned_text
-    m = re.search(r"\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}", candidate, flags=re.S)
-    if m:
-        candidate = m.group(0)
+    # First JSON object in the text, repairing trailing commas / truncation
+    data = extract_json(cleaned_text, scanner)
+    if data:
+        return data
 
-    # Remove trailing commas in objects/arrays
-    candidate = re.sub(r",\s*([}\]])", r"\1", candidate)
+    # Try to extract key-value pairs from the text and construct valid JSON
+    result = extract_fields(text, ("suggested_title", "suggested_description", "tags", "faqs"))
+    for key in ("suggested_title", "suggested_description"):
+        if not isinstance(result.get(key, ""), str):
+            del result[key]
+    if "tags" in result:
+        tags = result["tags"] if isinstance(result["tags"], list) else []
+        result["tags"] = [t.strip() for t in tags if isinstance(t, str)]
+    if "faqs" in result:
+        faqs = result["faqs"] if isinstance(result["faqs"], list) else []
+        result["faqs"] = [{"q": f["q"], "a": f["a"]} for f in faqs if isinstance(f, dict) and "q" in f and "a" in f]
 
-    try:
-        return json.loads(candidate)
-    except Exception:
-        # Try to extract key-value pairs from the text and construct valid JSON
-        result = {}
-        
-        # Extract suggested_title
-        title_match = re.search(r'"suggested_title"\s*:\s*"([^"]+)"', text, re.I)
-        if title_match:
-            result["suggested_title"] = title_match.group(1)
-        
-        # Extract suggested_description
-        desc_match = re.search(r'"suggested_description"\s*:\s*"([^"]+(?:"[^"]*"[^"]*)*)"', text, re.I | re.S)
-        if desc_match:
-            result["suggested_description"] = desc_match.group(1)
-        
-        # Extract tags array
-        tags_match = re.search(r'"tags"\s*:\s*\[([^\]]+)\]', text, re.I)
-        if tags_match:
-            tags_str = tags_match.group(1)
-            tags = [tag.strip().strip('"\'') for tag in re.findall(r'"([^"]+)"', tags_str)]
-            result["tags"] = tags
-        
-        # Extract FAQs
-        faqs_match = re.search(r'"faqs"\s*:\s*\[(.*?)\]', text, re.I | re.S)
-        if faqs_match:
-            faqs_text = faqs_match.group(1)
-            faqs = []
-            qa_pairs = re.findall(r'\{[^}]*"q"\s*:\s*"([^"]+)"[^}]*"a"\s*:\s*"([^"]+)"[^}]*\}', faqs_text, re.I)
-            for q, a in qa_pairs:
-                faqs.append({"q": q, "a": a})
-            result["faqs"] = faqs
-        
-        # If we extracted any content, return it
-        if result:
-            return result
-        
-        # Fallback: return the raw text as string for natural language
-        return cleaned_text
+    # If we extracted any content, return it
+    if result:
+        return result
+
+    # Fallback: return the raw text as string for natural language
+    return cleaned_text
 
 # ---------- Helpers ----------
 
@@ -224,25 +477,7 @@ def convert_json_to_natural_language(data: dict, req: GigReq) -> str:
     """Convert JSON response to natural language format."""
     
     # Analyze current gig weaknesses
-    weaknesses = []
-    if req.title:
-        if len(req.title) < 30:
-            weaknesses.append("Title is too short and lacks impact")
-        if "I will" in req.title.lower():
-            weaknesses.append("Title starts with generic 'I will' instead of focusing on benefits")
-        if not any(word in req.title.lower() for word in ["professional", "expert", "stunning", "high-quality", "premium"]):
-            weaknesses.append("Title lacks compelling adjectives that attract buyers")
-    
-    if req.description:
-        if len(req.description) < 100:
-            weaknesses.append("Description is too short and lacks detail")
-        if not req.description.startswith(("Transform", "Tired", "Looking", "Need", "Want")):
-            weaknesses.append("Description lacks a compelling hook in the first line")
-        if "•" not in req.description:
-            weaknesses.append("Description lacks benefit bullets that make it scannable")
-    
-    if not weaknesses:
-        weaknesses.append("Gig could benefit from more specific benefits and clearer call-to-action")
+    weaknesses = data.get("weaknesses") or gig_weaknesses(req.title, req.description)
     
     # Build natural language response
     response = f"""# 🚀 Fiverr Gig Optimization Analysis
@@ -287,56 +522,70 @@ def convert_json_to_natural_language(data: dict, req: GigReq) -> str:
     
     return response
 
-# ---------- Routes ----------
+# ---------- Route prompts & post-processing ----------
 
-@app.post("/improve_gig")
-def improve_gig(req: GigReq):
+def improve_messages(req: GigReq, route: str = "improve_gig", structured: bool = False) -> list:
     """
     If we have at least a title or description from the Fiverr page,
     use the 'improve' prompt. Otherwise, fall back to 'create from scratch'
-    with sensible defaults.
+    with sensible defaults. structured=True asks for GigImprovement JSON instead of Markdown.
     """
+    with STAGE_SECONDS.time(stage="prompt_build", route=route):
+        return budgeted(_improve_prompt(req, structured), route)
+
+def _improve_prompt(req: GigReq, structured: bool = False) -> Prompt:
     has_any = bool((req.title or "").strip() or (req.description or "").strip())
 
     if has_any:
-        user = build_user_prompt_for_improve(
+        return improve_prompt(
             niche=req.niche or "",
             title=req.title or "",
-            description=req.description or ""
-        )
-    else:
-        # You can pass real values from your popup form; these are placeholders.
-        user = build_user_prompt_from_scratch(
-            niche=req.niche or "Website design",
-            buyer="eCommerce brands",
-            deliverables="Homepage + product page + about page",
-            turnaround="3 days",
-            proof="4+ years experience"
+            description=req.description or "",
+            budget=PROMPT_BUDGET_IMPROVE,
+            compact=COMPACT_PROMPTS,
+            structured=structured,
         )
+    # You can pass real values from your popup form; these are placeholders.
+    return scratch_prompt(
+        budget=PROMPT_BUDGET_IMPROVE,
+        compact=COMPACT_PROMPTS,
+        structured=structured,
+        niche=req.niche or "Website design",
+        buyer="eCommerce brands",
+        deliverables="Homepage + product page + about page",
+        turnaround="3 days",
+        proof="4+ years experience"
+    )
 
-    out = call_ollama([
-        {"role": "system", "content": SYSTEM_PROMPT_IMPROVE_GIG},
-        {"role": "user", "content": user}
-    ])
-    
+def budgeted(prompt: Prompt, route: str) -> list:
+    """Record a built prompt's size and any truncation; returns its messages."""
+    PROMPT_TOKENS_ESTIMATED.observe(prompt.tokens, route=route)
+    for field in prompt.truncated:
+        PROMPT_TRUNCATIONS.inc(route=route, field=field)
+    if prompt.truncated:
+        log.debug("%s prompt cut to ~%d tokens (budget %d): %s", route, prompt.tokens, prompt.budget, ", ".join(prompt.truncated))
+    return prompt.messages
+
+def finalize_improve(out: str, req: GigReq, route: str = "improve_gig", scanner: JSONScanner = None):
+    """Turn raw model output for /improve_gig into the response the popup renders."""
     # Check if the response is JSON and convert it to natural language format
-    data = coerce_json(out)
-    print(f"[DEBUG] Response type: {type(data)}")
-    print(f"[DEBUG] Response keys: {list(data.keys()) if isinstance(data, dict) else 'Not a dict'}")
-    print(f"[DEBUG] Has suggested_title: {'suggested_title' in data if isinstance(data, dict) else False}")
+    with STAGE_SECONDS.time(stage="coerce_json", route=route):
+        data = coerce_json(out, scanner)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("response type=%s keys=%s", type(data).__name__, list(data) if isinstance(data, dict) else None)
     
     # Force conversion to natural language format
     if isinstance(data, dict):
-        print("[DEBUG] Converting JSON to natural language")
-        natural_response = convert_json_to_natural_language(data, req)
-        print(f"[DEBUG] Natural response length: {len(natural_response)}")
-        print(f"[DEBUG] Natural response preview: {natural_response[:100]}...")
+        tag_log.append(req.niche, req.title, req.description, data.get("tags"))
+        with STAGE_SECONDS.time(stage="natural_language", route=route):
+            natural_response = convert_json_to_natural_language(data, req)
+        log.debug("natural response: %d chars", len(natural_response))
         # Return the natural language response as a string
         return {"response": natural_response}
     else:
         # Check if the response is a refusal message
         if "cannot fulfill" in str(data).lower() or "cannot provide" in str(data).lower():
-            print("[DEBUG] AI refused, generating fallback response")
+            log.info("model refused on %s, sending fallback response", route)
             # Generate a fallback response using the conversion function
             fallback_data = {
                 "suggested_title": "Professional Web Development Services",
@@ -350,106 +599,564 @@ def improve_gig(req: GigReq):
             return {"response": natural_response}
         else:
             # Already natural language, return as is
-            print("[DEBUG] Returning as natural language")
             return data
 
-@app.post("/seo_score")
-def seo_score(data=Body(...)):
-    title = (data.get("title") or "").strip()
-    desc = (data.get("description") or "").strip()
-    primary_kw = (data.get("primary_kw") or "").strip().lower()
-
-    score = 0
-    score += 10 if 50 <= len(title) <= 70 else 0
-    score += 10 if primary_kw and primary_kw in desc[:100].lower() else 0
-    bullets = len([ln for ln in desc.splitlines() if ln.strip().startswith(("•", "-"))])
-    score += 10 if 3 <= bullets <= 5 else 0
-    score += 10 if 120 <= len(desc.split()) <= 250 else 0
-
-    tips = []
-    if not (50 <= len(title) <= 70): tips.append("Aim 50–70 chars for the title.")
-    if primary_kw and primary_kw not in desc[:100].lower(): tips.append("Put the primary keyword in the first 100 chars.")
-    if bullets < 3: tips.append("Add at least 3 benefit bullets (start with •).")
-    if bullets > 5: tips.append("Keep bullets to 3–5 for clarity.")
-    if not (120 <= len(desc.split()) <= 250): tips.append("Keep description 120–250 words.")
-
-    return {"score": score, "bullets": bullets, "tips": tips}
+def reply_messages(req: ReplyReq) -> list:
+    with STAGE_SECONDS.time(stage="prompt_build", route="reply_suggestion"):
+        prompt = reply_prompt(tone=req.tone, context=req.context, buyer_message=req.buyer_message,
+                              budget=PROMPT_BUDGET_REPLY)
+        return budgeted(prompt, "reply_suggestion")
 
-@app.post("/reply_suggestion")
-def reply_suggestion(req: ReplyReq):
-    sys = "You are a professional Fiverr seller assistant. Output JSON with keys: summary, reply, clarifying_questions[], next_steps[]."
-    user = f"Tone: {req.tone}\nContext: {req.context}\nBuyer message: {req.buyer_message}\nReturn JSON only."
-    out = call_ollama([{"role": "system", "content": sys}, {"role": "user", "content": user}])
-    return coerce_json(out)
-
-@app.post("/chat_gig")
-def chat_gig(req: ChatReq):
-    """
-    Chatbot endpoint for follow-up questions about gig optimization.
-    """
-    sys = """You are a helpful Fiverr Gig Optimization Coach. Users can ask you follow-up questions about their gig improvements.
+def chat_messages(req: ChatReq) -> list:
+    with STAGE_SECONDS.time(stage="prompt_build", route="chat_gig"):
+        prompt = chat_prompt(
+            title=req.title,
+            description=req.description,
+            niche=req.niche,
+            user_message=req.user_message,
+            budget=PROMPT_BUDGET_CHAT,
+            compact=COMPACT_PROMPTS,
+        )
+        return budgeted(prompt, "chat_gig")
 
-Examples of requests you can handle:
-- "Make it more formal" - Rewrite the title/description in a more professional tone
-- "Add more benefits" - Add more benefit bullets to the description
-- "Make it shorter" - Create a more concise version
-- "Add more keywords" - Suggest additional SEO keywords
-- "Make it more casual" - Rewrite in a more friendly, approachable tone
-- "Focus on [specific benefit]" - Emphasize a particular benefit or feature
+def session_messages(session, req: ChatReq) -> list:
+    """The opening turn uses the full gig prompt; follow-ups append to the stored history."""
+    if not session.messages:
+        return chat_messages(req)
+    with STAGE_SECONDS.time(stage="prompt_build", route="chat_gig"):
+        # the history is bounded by CHAT_SESSION_TURNS; a single follow-up gets at most half the budget
+        message = squeeze_whitespace(req.user_message)
+        if PROMPT_BUDGET_CHAT:
+            message = shorten(message, max(MIN_FIELD_TOKENS, PROMPT_BUDGET_CHAT // 2))
+        return session.messages + [{"role": "user", "content": message}]
 
-Always provide helpful, actionable responses. If the user asks for changes, provide the updated content in the same format as the original analysis."""
-    
-    user = f"""Current Gig:
-Title: {req.title}
-Description: {req.description}
-Niche: {req.niche}
+def session_kw(session) -> dict:
+    return {"prefer": session.backend, "keep_alive": CHAT_KEEP_ALIVE, "context": session.context}
 
-User Request: {req.user_message}
+def record_turn(session, messages, done: Completion) -> dict:
+    """Store a finished turn in its session; returns what the client gets back about it."""
+    first = not session.messages
+    session.record(messages, done, sessions.max_turns)
+    if done.backend:  # cache hits never reached Ollama
+        CHAT_TURN_PROMPT_EVAL_SECONDS.observe(done.prompt_eval_duration, turn="first" if first else "followup")
+    return {"session_id": session.id, "turn": session.turns[-1]}
 
-Please help the user with their request. Provide specific, actionable advice or updated content."""
-    
-    out = call_ollama([{"role": "system", "content": sys}, {"role": "user", "content": user}])
-    
-    # Handle the response
-    data = coerce_json(out)
+def finalize_chat(out: str, scanner: JSONScanner = None) -> dict:
+    with STAGE_SECONDS.time(stage="coerce_json", route="chat_gig"):
+        data = coerce_json(out, scanner)
     if isinstance(data, dict):
         return {"response": data.get("response", str(data))}
     else:
         return {"response": str(data)}
 
-@app.get("/health")
-def health():
-    # Enrich health with Ollama version and model presence
-    version = None
-    models = []
-    model_present = None
-    err = None
+# ---------- Streaming ----------
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _ndjson(event: str, data) -> str:
+    return json.dumps({"type": event, **data}) + "\n"
+
+async def stream_generation(messages, finalize, fmt: str = "sse", use_cache: bool = True, route: str = "improve_gig",
+                            ollama_kw=None, on_done=None, on_close=None, draft=None, semantic_text: str = ""):
+    """
+    Forward Ollama tokens to the client as they arrive ("token" events), then run the
+    route's usual post-processing on the full text and send it as a single "done" event
+    together with time-to-first-token. Failures surface as an "error" event. Tokens are fed
+    to a JSONScanner as they pass, so finalize(text, scanner) doesn't have to scan the
+    whole answer again at the end.
+    A cache hit (exact, or near-duplicate when semantic_text is given) is sent as one
+    token followed by "done".
+    on_done(completion) may return extra fields for the "done" event; on_close() runs
+    when the stream ends, however it ends. A `draft` result is sent first as a "draft"
+    event, before the generation is queued, so the client has something to show at once.
+    """
+    emit = _ndjson if fmt == "ndjson" else _sse
+    media_type = "application/x-ndjson" if fmt == "ndjson" else "text/event-stream"
+    key = ResponseCache.make_key(MODEL, 0.5, messages)
+    priority = ROUTE_PRIORITY[route]
+    hit = await cache.get(key) if use_cache else None
+    vector = None
+    if use_cache:
+        CACHE_LOOKUPS.inc(route=route, result="miss" if hit is None else "hit")
+        if hit is None:
+            hit, vector = await semantic_lookup(semantic_text, messages, key, route)
+    if hit is None and draft is None:
+        # reject up front while we can still answer 429; queueing happens inside the stream
+        # (with a draft to show, a full queue becomes an "error" event after it instead)
+        admission.check(priority)
+
+    async def upstream():
+        queued = time.perf_counter()
+        async with admission.slot(priority):
+            started = time.perf_counter()
+            STAGE_SECONDS.observe(started - queued, stage="queue_wait", route=route)
+            limit, produced = route_deadline(route), 0
+            try:
+                async for item in until(ollama.stream(messages, model=MODEL, temperature=0.5, **(ollama_kw or {})),
+                                        time.monotonic() + limit):
+                    if isinstance(item, Completion):
+                        STAGE_SECONDS.observe(time.perf_counter() - started, stage="ollama", route=route)
+                        observe_completion(item, route)
+                        await cache.set(key, item.text)
+                        await semantic_store(vector, messages, key)
+                    else:
+                        produced += 1  # Ollama streams about one token per chunk
+                    yield item
+            except asyncio.TimeoutError:
+                saved = observe_cancelled(route, "deadline", time.perf_counter() - started, produced)
+                log.warning("%s stream hit its %.0fs deadline (~%d tokens saved)", route, limit, saved)
+                raise deadline_error(route, limit)
+            except asyncio.CancelledError:
+                saved = observe_cancelled(route, "client", time.perf_counter() - started, produced)
+                log.info("%s stream aborted, client gone (~%d tokens saved)", route, saved)
+                raise
+            except OllamaError:
+                OLLAMA_REQUESTS.inc(route=route, model=MODEL, outcome="error")
+                raise
 
+    async def tokens():
+        if hit is not None:
+            yield hit
+            yield Completion(text=hit, model=MODEL)
+            return
+        try:
+            ollama.check(MODEL)
+        except OllamaError:
+            OLLAMA_REQUESTS.inc(route=route, model=MODEL, outcome="unavailable")
+            raise
+        # identical streams in flight share one generation; late joiners replay from the start
+        async for item in inflight.stream(key, upstream):
+            yield item
+
+    async def events():
+        started = time.perf_counter()
+        ttft = None
+        scanner = JSONScanner("{")
+        if draft is not None:
+            yield emit("draft", {"result": draft, "draft_ms": round((time.perf_counter() - started) * 1000, 2)})
+        try:
+            async for item in tokens():
+                if isinstance(item, Completion):
+                    total = time.perf_counter() - started
+                    yield emit("done", {
+                        "result": finalize(item.text, scanner if scanner.text() == item.text else None),
+                        "ttft_ms": round((ttft or total) * 1000, 1),
+                        "total_ms": round(total * 1000, 1),
+                        "eval_count": item.eval_count,
+                        **(on_done(item) if on_done else {}),
+                    })
+                    break
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                    if hit is None:
+                        STAGE_SECONDS.observe(ttft, stage="ttft", route=route)
+                    log.debug("time to first token on %s: %.0f ms", route, ttft * 1000)
+                scanner.feed(item)
+                yield emit("token", {"text": item})
+        except (OllamaError, Overloaded) as e:
+            yield emit("error", {"error": str(e)})
+        finally:
+            if on_close:
+                on_close()
+
+    # X-Accel-Buffering stops reverse proxies from holding tokens back
+    return StreamingResponse(events(), media_type=media_type,
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# ---------- Routes ----------
+
+def draft_response(req: GigReq) -> dict:
+    """The rule-based analysis, shaped like finalize_improve's result."""
+    with STAGE_SECONDS.time(stage="draft", route="improve_gig"):
+        return {"response": draft_analysis(req.title, req.description, req.niche), "draft": True}
+
+async def improve_structured(req: GigReq, use_cache: bool, route: str = "improve_gig") -> dict:
+    """GigImprovement fields plus the usual rendered "response"."""
+    data = await generate_structured(improve_messages(req, route, structured=True), GigImprovement, route, use_cache,
+                                     semantic_text=gig_text(req))
+    tag_log.append(req.niche, req.title, req.description, data.get("tags"))
+    with STAGE_SECONDS.time(stage="natural_language", route=route):
+        return {"response": convert_json_to_natural_language(data, req), **data}
+
+@app.post("/improve_gig")
+async def improve_gig(req: GigReq, no_cache: bool = False, draft: bool = False, structured: Optional[bool] = None):
+    """
+    draft=true answers with the rule-based analysis (marked "draft": true) instead of a
+    429 or Ollama error when the generation can't be queued or Ollama is down.
+    structured=true asks for schema-checked JSON and also returns its fields
+    (suggested_title, tags, faqs, ...) next to the rendered "response".
+    """
+    structured = wants_structured("improve_gig", structured)
+    if not draft and not structured:
+        out = await call_ollama(improve_messages(req), use_cache=not no_cache, semantic_text=gig_text(req))
+        return finalize_improve(out, req)
+    try:
+        if structured:
+            return await improve_structured(req, use_cache=not no_cache)
+        done = await generate(improve_messages(req), use_cache=not no_cache, semantic_text=gig_text(req))
+    except (OllamaError, Overloaded) as e:
+        if not draft:
+            if isinstance(e, Overloaded):
+                raise
+            log.warning("Ollama error on improve_gig: %s", e)
+            return {"error": str(e)}
+        log.info("answering improve_gig with the draft: %s", e)
+        return {**draft_response(req), "refine_error": str(e)}
+    return finalize_improve(done.text, req)
+
+@app.post("/improve_gig/stream")
+async def improve_gig_stream(req: GigReq, format: str = "sse", no_cache: bool = False, draft: bool = True):
+    """
+    Token-streaming /improve_gig (format=sse or ndjson). Unless draft=false, a rule-based
+    analysis is sent first as a "draft" event, then the LLM's tokens and "done".
+    """
+    finalize = lambda out, scanner: finalize_improve(out, req, scanner=scanner)
+    return await stream_generation(improve_messages(req), finalize, format, not no_cache, "improve_gig",
+                                   draft=draft_response(req) if draft else None, semantic_text=gig_text(req))
+
+def _parse_batch(body: bytes, content_type: str) -> list:
+    """Accept a JSON array or NDJSON (one gig object per line)."""
+    try:
+        if "ndjson" in content_type or "jsonl" in content_type:
+            items = [json.loads(line) for line in body.decode("utf-8").splitlines() if line.strip()]
+        else:
+            items = json.loads(body or b"[]")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch body: {e}")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Batch body must be a JSON array or NDJSON")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {BATCH_MAX_ITEMS} gigs)")
+    return items
+
+@app.post("/improve_gig/batch")
+async def improve_gig_batch(request: Request, concurrency: int = BATCH_CONCURRENCY, no_cache: bool = False):
+    """
+    Analyze many gigs in one call. Body: JSON array of GigReq objects, or NDJSON
+    (Content-Type: application/x-ndjson). Results stream back as NDJSON in completion
+    order, one line per gig with its input index, then a final summary line with
+    throughput (gigs/min, tokens/s). Invalid gigs are reported first, without waiting
+    for a generation slot.
+    """
+    items = _parse_batch(await request.body(), request.headers.get("content-type", ""))
+    limit = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+    gigs, invalid = [], []  # (input index, GigReq) / (input index, error)
+    for i, raw in enumerate(items):
+        try:
+            if not isinstance(raw, dict):
+                raise TypeError("expected a JSON object")
+            gigs.append((i, GigReq(**raw)))
+        except (ValidationError, TypeError) as e:
+            invalid.append((i, "invalid gig: " + " ".join(str(e).split())))
+
+    async def analyze(gig):
+        req = gig[1]
+        started = time.perf_counter()
+        done = await generate(improve_messages(req, "improve_gig_batch"), use_cache=not no_cache, route="improve_gig_batch",
+                              semantic_text=gig_text(req))
+        return req, done, time.perf_counter() - started
+
+    async def lines():
+        started = time.perf_counter()
+        ok = tokens = 0
+        failed = len(invalid)
+        decode_s = 0.0
+        for i, msg in invalid:
+            yield json.dumps({"index": i, "ok": False, "error": msg}) + "\n"
+        async for n, res, err in bounded_map(gigs, analyze, limit):
+            i = gigs[n][0]
+            if err is not None:
+                failed += 1
+                yield json.dumps({"index": i, "ok": False, "error": str(err)}) + "\n"
+                continue
+            req, done, elapsed = res
+            ok += 1
+            tokens += done.eval_count
+            decode_s += done.eval_duration
+            yield json.dumps({
+                "index": i,
+                "ok": True,
+                "result": finalize_improve(done.text, req, "improve_gig_batch"),
+                "elapsed_ms": round(elapsed * 1000, 1),
+                "eval_count": done.eval_count,
+            }) + "\n"
+
+        wall = time.perf_counter() - started
+        yield json.dumps({"summary": {
+            "items": len(items),
+            "ok": ok,
+            "failed": failed,
+            "concurrency": limit,
+            "elapsed_s": round(wall, 3),
+            "gigs_per_min": round(ok / wall * 60, 2) if wall else None,
+            "eval_tokens": tokens,
+            "tokens_per_s": round(tokens / wall, 2) if wall else None,
+            # per-generation decode speed as reported by Ollama, independent of concurrency
+            "decode_tokens_per_s": round(tokens / decode_s, 2) if decode_s else None,
+        }}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+# ---------- Jobs ----------
+
+async def run_improve_job(payload: dict):
+    """Job handler behind /jobs/improve_gig; waits in the queue while Ollama is unreachable or busy."""
+    req = GigReq(**payload["gig"])
+    use_cache = not payload.get("no_cache")
+    try:
+        ollama.check(MODEL)
+        if payload.get("structured"):
+            return await improve_structured(req, use_cache, "improve_gig_job")
+        done = await generate(improve_messages(req, "improve_gig_job"), use_cache=use_cache, route="improve_gig_job",
+                              semantic_text=gig_text(req))
+    except Overloaded as e:
+        raise RetryLater(str(e), delay=e.retry_after)
+    except OllamaUnavailable as e:
+        raise RetryLater(str(e), delay=max(5.0, HEALTH_INTERVAL))
+    except DeadlineExceeded as e:
+        # Ollama answered but too slowly (a busy or cold host): worth another run, not twenty
+        raise RetryLater(str(e), delay=max(5.0, HEALTH_INTERVAL), max_attempts=JOB_DEADLINE_ATTEMPTS)
+    except OllamaError as e:
+        if not ollama.snapshot(MODEL)["ok"]:
+            raise RetryLater(str(e), delay=max(5.0, HEALTH_INTERVAL))
+        raise
+    return finalize_improve(done.text, req, "improve_gig_job")
+
+jobs.register("improve_gig", run_improve_job)
+
+@app.post("/jobs/improve_gig", status_code=202)
+async def submit_improve_job(req: GigReq, structured: Optional[bool] = None, no_cache: bool = False):
+    """
+    Queue an /improve_gig analysis and return the job at once ({"id", "status", ...}).
+    Fetch it with GET /jobs/{id}. Submitting the same gig again returns the pending or
+    finished job instead of starting another generation (unless no_cache=true).
+    """
+    payload = {
+        "gig": {"title": req.title, "description": req.description, "niche": req.niche},
+        "structured": wants_structured("improve_gig", structured),
+        "no_cache": no_cache,
+    }
+    dedupe = None if no_cache else hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+    return await jobs.submit("improve_gig", payload, dedupe_key=dedupe)
+
+@app.get("/jobs/stats")
+async def job_stats():
+    return await asyncio.to_thread(jobs.stats)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """A job's status and, once done, its result. wait=N long-polls up to N seconds (max 60) for it to finish."""
+    job = await jobs.wait(job_id, min(max(wait, 0), 60))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events: "status" now and every 15 s while the job waits or runs, then "done"."""
+    job = await jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+
+    async def events():
+        current = job
+        while current is not None and current["status"] not in FINISHED:
+            yield _sse("status", current)
+            current = await jobs.wait(job_id, 15)
+        yield _sse("done", current or {"id": job_id, "status": "expired"})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = await jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job
+
+@app.post("/seo_score")
+async def seo_score(data=Body(...)):
+    """
+    Title/description checks. With a tag index and a niche (or primary_kw), also which of
+    the niche's most used keywords and tags the title, description and tags cover.
+    """
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Expected a JSON object")
     try:
-        vr = requests.get(f"{OLLAMA_URL}/api/version", timeout=5)
-        if vr.ok:
-            version = vr.json()
-    except Exception as e:
-        err = f"version: {e}"
+        title, desc, primary_kw = seo_normalize(data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result = score_gig(title, desc, primary_kw)
+    index = tag_index.get()
+    niche = data.get("niche")
+    if niche is not None and not isinstance(niche, str):
+        raise HTTPException(status_code=400, detail=f"niche must be a string, not {type(niche).__name__}")
+    niche = (niche or "").strip() or primary_kw
+    if index is not None and niche:
+        tags = data.get("tags") or []
+        text = " ".join([title, desc, *(map(str, tags) if isinstance(tags, list) else [str(tags)])])
+        with STAGE_SECONDS.time(stage="keyword_coverage", route="seo_score"):
+            coverage = index.coverage(niche, text)
+        if coverage is not None:
+            result["keywords"] = coverage
+            if coverage["missing"] and coverage["coverage"] < TAG_COVERAGE_TIP:
+                result["tips"].append(f"Work in popular {coverage['niche']} keywords: {', '.join(coverage['missing'][:5])}.")
+    return result
+
+@app.get("/suggest_tags")
+async def suggest_tags(niche: str, limit: int = 10):
+    """Most used tags and title/description keywords for a niche, from the offline-built tag index."""
+    index = tag_index.get()
+    if index is None:
+        raise HTTPException(status_code=503, detail=f"No tag index at {TAG_INDEX}; build one with tagindex.py")
+    with STAGE_SECONDS.time(stage="suggest_tags", route="suggest_tags"):
+        return index.suggest(niche, max(1, min(limit, 50)))
+
+@app.post("/seo_score/bulk")
+async def seo_score_bulk(request: Request, format: str = ""):
+    """
+    Score a whole catalog in one call. Body: NDJSON (one gig per line) or CSV with a
+    header row (title, description, primary_kw[, id]); the format comes from ?format=
+    or the Content-Type. The upload is spooled (memory up to SEO_SPOOL_BYTES, then a
+    temp file), scored in columnar chunks off the event loop and streamed back as
+    NDJSON in input order, then a summary line with rows/s.
+    """
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")
+    spool = tempfile.SpooledTemporaryFile(max_size=SEO_SPOOL_BYTES)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    text = io.TextIOWrapper(spool, encoding="utf-8", errors="replace", newline="")
+    blocks = seo_render(seo_iter_csv(text) if fmt == "csv" else seo_iter_ndjson(text))
+
+    async def lines():
+        started = time.perf_counter()
+        total = 0
+        try:
+            while True:
+                block = await asyncio.to_thread(next, blocks, None)
+                if block is None:
+                    break
+                total += block[0]
+                yield block[1]
+        finally:
+            text.close()
+        elapsed = time.perf_counter() - started
+        yield json.dumps({"summary": {
+            "rows": total,
+            "elapsed_s": round(elapsed, 3),
+            "rows_per_s": round(total / elapsed, 1) if elapsed else None,
+        }}) + "\n"
 
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.post("/reply_suggestion")
+async def reply_suggestion(req: ReplyReq, no_cache: bool = False, structured: Optional[bool] = None):
+    """
+    Reply draft as {summary, reply, clarifying_questions, next_steps}. In structured mode
+    (the default, see STRUCTURED_ROUTES) the answer is schema-constrained and validated;
+    otherwise the free-text answer goes through coerce_json.
+    """
+    if wants_structured("reply_suggestion", structured):
+        try:
+            return await generate_structured(reply_messages(req), ReplySuggestion, "reply_suggestion", not no_cache)
+        except OllamaError as e:
+            log.warning("Ollama error on reply_suggestion: %s", e)
+            return {"error": str(e)}
+    out = await call_ollama(reply_messages(req), use_cache=not no_cache, route="reply_suggestion")
+    with STAGE_SECONDS.time(stage="coerce_json", route="reply_suggestion"):
+        return coerce_json(out)
+
+@app.post("/chat_gig")
+async def chat_gig(req: ChatReq, no_cache: bool = False):
+    """
+    Chatbot endpoint for follow-up questions about gig optimization. Conversations are
+    kept server-side: send back the session_id from the previous answer and only the new
+    user_message is added to the history, so Ollama can reuse the already evaluated prompt.
+    """
+    session = sessions.open(req.session_id, (req.title, req.description, req.niche))
+    session.acquire(sessions.busy_timeout)
+    try:
+        messages = session_messages(session, req)
+        try:
+            done = await generate(messages, use_cache=not no_cache, route="chat_gig", **session_kw(session))
+        except OllamaError as e:
+            log.warning("Ollama error on chat_gig: %s", e)
+            return {**finalize_chat(json.dumps({"error": str(e)})), "session_id": session.id}
+        turn = record_turn(session, messages, done)
+    finally:
+        session.release()
+    return {**finalize_chat(done.text), **turn}
+
+@app.post("/chat_gig/stream")
+async def chat_gig_stream(req: ChatReq, format: str = "sse", no_cache: bool = False):
+    """Token-streaming /chat_gig (format=sse or ndjson); the "done" event carries session_id."""
+    session = sessions.open(req.session_id, (req.title, req.description, req.niche))
+    session.acquire(sessions.busy_timeout)
     try:
-        tr = requests.get(f"{OLLAMA_URL}/api/tags", timeout=5)
-        if tr.ok:
-            data = tr.json()
-            # tags schema: {"models":[{"name":"llama3.1",...}, ...]}
-            models = [m.get("name") for m in data.get("models", []) if m.get("name")]
-            model_present = any((MODEL == m) or m.startswith(MODEL) for m in models)
-    except Exception as e:
-        err = f"{(err + '; ' if err else '')}tags: {e}"
+        messages = session_messages(session, req)
+        return await stream_generation(messages, finalize_chat, format, not no_cache, "chat_gig",
+                                       ollama_kw=session_kw(session),
+                                       on_done=lambda done: record_turn(session, messages, done),
+                                       on_close=session.release)
+    except BaseException:
+        session.release()
+        raise
+
+@app.get("/chat_gig/sessions")
+async def chat_sessions_stats():
+    return sessions.stats()
+
+@app.get("/chat_gig/sessions/{session_id}")
+async def chat_session_info(session_id: str):
+    """History size, serving host and per-turn prompt-eval cost of one conversation."""
+    session = sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return session.info()
+
+@app.delete("/chat_gig/sessions/{session_id}")
+async def chat_session_close(session_id: str):
+    return {"closed": sessions.close(session_id)}
 
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        **cache.stats(),
+        "single_flight": inflight.stats(),
+        "semantic": {**semantic.stats(), "threshold": SEMANTIC_CACHE_THRESHOLD, "model": EMBED_MODEL} if semantic else None,
+    }
+
+@app.get("/queue/stats")
+async def queue_stats():
+    return admission.stats()
+
+@app.get("/backends/stats")
+async def backends_stats():
+    """Per-host in-flight generations, request/failure counts and average latency."""
+    return ollama.stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint: stage latencies and Ollama token/timing histograms."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health")
+async def health(refresh: bool = False):
+    """
+    Server and Ollama status from the background poller (version, installed models,
+    whether MODEL is present, and how old that information is), plus which models the
+    warmer has preloaded where. refresh=true polls first.
+    """
+    if refresh:
+        await ollama.poll()
     return {
-        "ok": True if version else False,
         "model": MODEL,
-        "ollama_url": OLLAMA_URL,
-        "ollama_version": version,
-        "models": models,
-        "model_present": model_present,
-        "error": err,
+        "ollama_url": OLLAMA_URLS[0],
+        **ollama.snapshot(MODEL),
+        "warmup": warmer.stats(),
     }
 
 if __name__ == "__main__":
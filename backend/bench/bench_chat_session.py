@@ -0,0 +1,99 @@
+# backend/bench/bench_chat_session.py
+#
+# Prompt-evaluation cost per /chat_gig turn, with and without server-side sessions.
+#
+#   cd backend && python bench/bench_chat_session.py
+#   cd backend && python bench/bench_chat_session.py --conversations 8 --turns 8 --latency 1.0
+#
+# Runs the fake Ollama with --prefix-cache (only the part of a prompt that differs from a
+# recent one is "evaluated") and drives several concurrent conversations twice: once
+# stateless (every turn starts a new session, like the old endpoint) and once sending the
+# session_id back. Prints, per turn, the mean prompt tokens evaluated, prompt-eval time and
+# client latency, as reported in each answer's "turn" block.
+
+import os, sys, time, asyncio, argparse, subprocess
+import httpx # type: ignore
+from run_bench import BACKEND, GIG, HERE, free_port, wait_until_up
+
+FOLLOW_UPS = [
+    "Make it more formal",
+    "Add more benefits",
+    "Make it shorter",
+    "Add more keywords",
+    "Focus on fast delivery",
+    "Make it more casual",
+    "Rewrite the first line as a question",
+    "Add a call to action",
+]
+
+
+async def conversation(client, n: int, turns: int, keep_session: bool):
+    gig = {**GIG, "title": f"{GIG['title']} #{n}-{time.time_ns()}"}
+    session_id, rows = "", []
+    for t in range(turns):
+        body = {**gig, "user_message": FOLLOW_UPS[t % len(FOLLOW_UPS)], "session_id": session_id}
+        started = time.perf_counter()
+        r = await client.post("/chat_gig", params={"no_cache": "true"}, json=body)
+        elapsed = time.perf_counter() - started
+        data = r.json()
+        turn = data.get("turn") or {}
+        rows.append((t, turn.get("prompt_eval_count", 0), turn.get("prompt_eval_ms", 0.0), elapsed * 1000))
+        if keep_session:
+            session_id = data.get("session_id", "")
+    return rows
+
+
+async def drive(base: str, conversations: int, turns: int, keep_session: bool):
+    async with httpx.AsyncClient(base_url=base, timeout=300) as client:
+        results = await asyncio.gather(*(conversation(client, n, turns, keep_session) for n in range(conversations)))
+    per_turn = {}
+    for rows in results:
+        for t, count, ms, latency in rows:
+            per_turn.setdefault(t, []).append((count, ms, latency))
+    return per_turn
+
+
+def report(label: str, per_turn: dict):
+    print(f"\n{label}")
+    print(f"{'turn':>5} {'prompt tokens':>14} {'prompt eval ms':>15} {'latency ms':>11}")
+    for t in sorted(per_turn):
+        rows = per_turn[t]
+        mean = lambda i: sum(r[i] for r in rows) / len(rows)
+        print(f"{t + 1:>5} {mean(0):>14.0f} {mean(1):>15.1f} {mean(2):>11.1f}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Per-turn prompt-eval cost of /chat_gig with and without sessions.")
+    ap.add_argument("--conversations", type=int, default=4, help="concurrent conversations")
+    ap.add_argument("--turns", type=int, default=6, help="turns per conversation")
+    ap.add_argument("--latency", type=float, default=0.5, help="fake: prompt-eval time of a fully uncached prompt")
+    ap.add_argument("--mode", choices=["chat", "generate"], default="chat", help="fake: Ollama flavour")
+    args = ap.parse_args(argv)
+
+    fake_port, app_port = free_port(), free_port()
+    fake_url, app_url = f"http://127.0.0.1:{fake_port}", f"http://127.0.0.1:{app_port}"
+    fake = subprocess.Popen([
+        sys.executable, os.path.join(HERE, "fake_ollama.py"), "--port", str(fake_port),
+        "--latency", str(args.latency), "--mode", args.mode, "--prefix-cache",
+    ])
+    env = {**os.environ, "OLLAMA_URL": fake_url, "CACHE_DB": "",
+           "OLLAMA_MAX_INFLIGHT": str(args.conversations)}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(app_port), "--log-level", "warning"],
+        cwd=BACKEND, env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_up(f"{fake_url}/api/version")
+        wait_until_up(f"{app_url}/docs")
+        report("stateless (new session every turn)", asyncio.run(drive(app_url, args.conversations, args.turns, False)))
+        report("with session_id", asyncio.run(drive(app_url, args.conversations, args.turns, True)))
+    finally:
+        server.terminate()
+        fake.terminate()
+        server.wait()
+        fake.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
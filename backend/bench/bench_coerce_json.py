@@ -0,0 +1,116 @@
+# backend/bench/bench_coerce_json.py
+#
+# Microbenchmark for coerce_json on adversarial model outputs.
+#
+#   cd backend && python bench/bench_coerce_json.py            # new extractor only
+#   cd backend && python bench/bench_coerce_json.py --legacy   # also time the old regex cascade
+#                                                               # (slow on purpose: its faqs regex is cubic)
+#
+# Each case is timed at growing input sizes; the run fails (exit 1) if time grows
+# clearly faster than input size, i.e. if coerce_json stops being linear.
+
+import os, re, sys, json, math, time, argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# importing app must not create any state files (cache, jobs, tag log, near-duplicate index)
+for name in ("CACHE_DB", "JOBS_DB", "TAG_LOG", "SEMANTIC_CACHE_PATH"):
+    os.environ.setdefault(name, "")
+
+from app import coerce_json  # noqa: E402
+
+
+def legacy_coerce_json(text: str):
+    """The regex cascade coerce_json used before the single-pass extractor (kept for comparison)."""
+    cleaned_text = text.strip()
+    cleaned_text = re.sub(r"^```(?:json)?\s*|\s*```$", "", cleaned_text, flags=re.I)
+    try:
+        return json.loads(cleaned_text)
+    except Exception:
+        pass
+    if re.search(r'^\s*[#*•\d]', cleaned_text, re.M) or '**' in cleaned_text:
+        return cleaned_text
+    candidate = cleaned_text
+    m = re.search(r"\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}", candidate, flags=re.S)
+    if m:
+        candidate = m.group(0)
+    candidate = re.sub(r",\s*([}\]])", r"\1", candidate)
+    try:
+        return json.loads(candidate)
+    except Exception:
+        result = {}
+        title_match = re.search(r'"suggested_title"\s*:\s*"([^"]+)"', text, re.I)
+        if title_match:
+            result["suggested_title"] = title_match.group(1)
+        desc_match = re.search(r'"suggested_description"\s*:\s*"([^"]+(?:"[^"]*"[^"]*)*)"', text, re.I | re.S)
+        if desc_match:
+            result["suggested_description"] = desc_match.group(1)
+        tags_match = re.search(r'"tags"\s*:\s*\[([^\]]+)\]', text, re.I)
+        if tags_match:
+            result["tags"] = [t.strip().strip('"\'') for t in re.findall(r'"([^"]+)"', tags_match.group(1))]
+        faqs_match = re.search(r'"faqs"\s*:\s*\[(.*?)\]', text, re.I | re.S)
+        if faqs_match:
+            qa = re.findall(r'\{[^}]*"q"\s*:\s*"([^"]+)"[^}]*"a"\s*:\s*"([^"]+)"[^}]*\}', faqs_match.group(1), re.I)
+            result["faqs"] = [{"q": q, "a": a} for q, a in qa]
+        return result or cleaned_text
+
+
+# name -> builder(n) producing roughly n characters of hostile output
+CASES = {
+    "typical JSON answer in prose": lambda n: "Sure! Here it is:\n" + json.dumps({
+        "suggested_title": "Stunning Logo Design", "suggested_description": "Transform your brand. " * (n // 22),
+        "tags": ["logo"], "faqs": [{"q": "How long?", "a": "3 days"}]}) + "\nHope this helps.",
+    "unterminated description with inner quotes": lambda n: 'x {"suggested_description": "' + 'ab"' * (n // 3),
+    "unbalanced open braces": lambda n: "{ " * (n // 2) + "x",
+    "nested braces with noise": lambda n: "{a{b}" * (n // 5),
+    "truncated JSON string": lambda n: '{"suggested_title": "Logo", "suggested_description": "' + "b" * n,
+    "deep array nesting": lambda n: "[" * n,
+    "whitespace runs": lambda n: "\n" * n + "x",
+    "whitespace before fence": lambda n: "```" + " " * n + "``",
+    "faqs without closers": lambda n: 'x "faqs": [' + '{"q": "a", "a": "b"' * (n // 19) + "]",
+    "many trailing commas": lambda n: "{" + '"k": [1,],' * (n // 11) + '"z": 1,}',
+}
+
+
+def timed(fn, text, budget_s: float) -> float:
+    """Best of three runs (seconds); stops early once one run exceeds the budget."""
+    best = float("inf")
+    for _ in range(3):
+        t0 = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - t0)
+        if best > budget_s:
+            break
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated input sizes (chars)")
+    ap.add_argument("--legacy", action="store_true", help="also time the old regex cascade (small sizes only)")
+    ap.add_argument("--max-growth", type=float, default=14.0,
+                    help="fail if a 10x larger input takes more than this many times longer")
+    args = ap.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    failed = False
+    print(f"{'case':45} " + " ".join(f"{n:>12,}" for n in sizes) + "   growth/10x")
+    for name, build in CASES.items():
+        times = [timed(coerce_json, build(n), 5.0) for n in sizes]
+        # time ratio per 10x of input over the whole range: linear ~10x, n log n ~11-12x, quadratic ~100x
+        decades = math.log10(sizes[-1] / sizes[0]) if len(sizes) > 1 else 0
+        growth = (times[-1] / times[0]) ** (1 / decades) if decades and min(times) > 0 else 0
+        bad = growth > args.max_growth
+        failed |= bad
+        print(f"{name:45} " + " ".join(f"{t * 1000:10.2f}ms" for t in times) + f"   {growth:6.1f}x" + ("  FAIL" if bad else ""))
+
+        if args.legacy:
+            small = [n // 100 for n in sizes]
+            legacy = [timed(legacy_coerce_json, build(n), 2.0) for n in small]
+            print(f"{'  legacy regex @ ' + ','.join(str(n) for n in small):45} "
+                  + " ".join(f"{t * 1000:10.2f}ms" for t in legacy))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# backend/bench/fake_ollama.py
+#
+# Local stand-in for an Ollama server, for benchmarking the backend without a model.
+#
+#   python bench/fake_ollama.py --port 11435 --latency 0.2 --token-rate 200 --tokens 120
+#
+# Serves /api/chat, /api/generate (JSON or NDJSON streaming), /api/embed,
+# /api/tags and /api/version. Every generation waits `latency` seconds (prompt eval / first token)
+# and then emits `tokens` tokens at `token-rate` tokens/s. --fail-rate injects HTTP 500s,
+# --mode imitates older builds. --prefix-cache imitates Ollama's prompt cache: only the
+# part of a prompt not shared with one of the last few prompts is "evaluated", which
+# shortens the first-token wait and prompt_eval_count accordingly. /_stats and /_reset
+# expose the fake's own service time so a benchmark can subtract it and see the
+# backend's overhead. Embeddings are hashed word and word-pair counts, so texts that
+# share most of their wording come out close, as with a real embedding model. Like
+# Ollama, a generation stops when its client disconnects ("aborted" in /_stats, with
+# the tokens it no longer had to produce).
+
+import os, re, sys, json, time, zlib, random, asyncio, argparse
+from fastapi import FastAPI, Request # type: ignore
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse # type: ignore
+
+ANSWER = json.dumps({
+    "suggested_title": "Stunning Custom Logo Design That Makes Your Brand Unforgettable",
+    "suggested_description": "Transform your brand with a logo buyers remember.\n• Unlimited revisions\n• Vector files\n• 48h delivery",
+    "tags": ["logo design", "brand identity", "minimalist logo", "custom logo", "business logo"],
+    "faqs": [{"q": "How many concepts?", "a": "Three initial concepts."}],
+    "step_by_step": ["Update your title", "Rewrite the description", "Add the tags"],
+    "reasons": ["Higher search visibility", "More clicks", "Better conversion"],
+    "summary": "Buyer wants a logo.", "reply": "Thanks for reaching out!",
+    "clarifying_questions": ["What colors do you like?"], "next_steps": ["Send a brief"],
+})
+
+
+EMBED_DIM = 256
+
+
+def embedding(text: str) -> list:
+    words = re.findall(r"\w+", text.lower())
+    vec = [0.0] * EMBED_DIM
+    for feature in words + [a + " " + b for a, b in zip(words, words[1:])]:
+        vec[zlib.crc32(feature.encode()) % EMBED_DIM] += 1.0
+    return vec
+
+
+def create_app(latency=0.2, token_rate=200.0, tokens=120, fail_rate=0.0, mode="chat", model="llama3.1", seed=None,
+               prefix_cache=False, embed_model="nomic-embed-text"):
+    """
+    mode: "chat"     current Ollama (/api/chat + /api/generate)
+          "generate" old build without /api/chat (404)
+          "ndjson"   very old build that streams NDJSON from /api/generate even when stream=False
+    """
+    app = FastAPI()
+    rng = random.Random(seed)
+    # spread the canned answer over ~`tokens` chunks so token counts and timing line up
+    size = max(1, -(-len(ANSWER) // max(1, tokens)))
+    pieces = [ANSWER[i:i + size] for i in range(0, len(ANSWER), size)]
+    stats = {"requests": 0, "generations": 0, "failures": 0, "service_s": 0.0, "tokens": 0, "prompt_tokens": 0,
+             "embeddings": 0, "aborted": 0, "tokens_skipped": 0}
+    recent = []  # last few prompts, standing in for Ollama's cached slots
+
+    def prefill(body):
+        """(seconds before the first token, prompt tokens evaluated, prompt tokens in total) for this request."""
+        if "messages" in body:
+            text = json.dumps(body["messages"], ensure_ascii=False)
+            # the slot also holds the answer, exactly as a follow-up will send it back
+            seen = json.dumps(body["messages"] + [{"role": "assistant", "content": ANSWER}], ensure_ascii=False)[:-1]
+        else:
+            text = body.get("prompt", "")
+            seen = f"{text} {ANSWER}"
+        total = max(1, len(text) // 4)  # ~4 chars per token
+        new = total
+        if body.get("context"):
+            new = max(1, len(body.get("prompt", "")) // 4)
+            total = new + len(body["context"])
+        elif prefix_cache:
+            shared = max((len(os.path.commonprefix([text, p])) for p in recent), default=0)
+            new = max(1, (len(text) - shared) // 4)
+        if prefix_cache:
+            recent.append(seen)
+            del recent[:-4]
+        stats["prompt_tokens"] += new
+        cached = prefix_cache or body.get("context")
+        return (latency * new / total if cached else latency), new, total
+
+    def gen_time(wait):
+        return wait + len(pieces) / token_rate
+
+    def final(extra, wait=latency, prompt_tokens=200, context_tokens=200):
+        return {
+            "model": model, "done": True,
+            "eval_count": len(pieces), "eval_duration": int(len(pieces) / token_rate * 1e9),
+            "prompt_eval_count": prompt_tokens, "prompt_eval_duration": int(wait * 1e9),
+            "load_duration": 0, "total_duration": int(gen_time(wait) * 1e9),
+            "context": list(range(context_tokens + len(pieces))), **extra,
+        }
+
+    def maybe_fail():
+        stats["requests"] += 1
+        if fail_rate and rng.random() < fail_rate:
+            stats["failures"] += 1
+            return JSONResponse({"error": "injected failure"}, status_code=500)
+        return None
+
+    def abort(started, wait):
+        stats["aborted"] += 1
+        done = max(0.0, time.perf_counter() - started - wait) * token_rate
+        stats["tokens_skipped"] += max(0, len(pieces) - int(done))
+
+    def stream(key, body):
+        wait, prompt_tokens, context_tokens = prefill(body)
+
+        async def lines():
+            started = time.perf_counter()
+            try:
+                await asyncio.sleep(wait)
+                for piece in pieces:
+                    await asyncio.sleep(1 / token_rate)
+                    yield json.dumps({"model": model, key: _chunk(key, piece), "done": False}) + "\n"
+            except (asyncio.CancelledError, GeneratorExit):
+                abort(started, wait)
+                raise
+            yield json.dumps(final({key: _chunk(key, "")}, wait, prompt_tokens, context_tokens)) + "\n"
+            stats["generations"] += 1
+            stats["tokens"] += len(pieces)
+            stats["service_s"] += time.perf_counter() - started
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    async def whole(req, key, body):
+        wait, prompt_tokens, context_tokens = prefill(body)
+        started = time.perf_counter()
+        while time.perf_counter() - started < gen_time(wait):
+            await asyncio.sleep(min(0.05, max(0.0, gen_time(wait) - (time.perf_counter() - started))))
+            if await req.is_disconnected():
+                abort(started, wait)
+                return PlainTextResponse("", status_code=499)
+        stats["generations"] += 1
+        stats["tokens"] += len(pieces)
+        stats["service_s"] += time.perf_counter() - started
+        return final({key: _chunk(key, "".join(pieces))}, wait, prompt_tokens, context_tokens)
+
+    @app.post("/api/chat")
+    async def chat(req: Request):
+        if mode != "chat":
+            return PlainTextResponse("404 page not found", status_code=404)
+        failed = maybe_fail()
+        if failed:
+            return failed
+        body = await req.json()
+        return stream("message", body) if body.get("stream", True) else await whole(req, "message", body)
+
+    @app.post("/api/generate")
+    async def generate(req: Request):
+        failed = maybe_fail()
+        if failed:
+            return failed
+        body = await req.json()
+        if not body.get("prompt"):
+            return final({"response": ""})  # model preload
+        if mode == "ndjson" or body.get("stream", True):
+            return stream("response", body)
+        return await whole(req, "response", body)
+
+    @app.post("/api/embed")
+    async def embed(req: Request):
+        body = await req.json()
+        texts = body.get("input") or ""
+        await asyncio.sleep(0.005)
+        stats["embeddings"] += 1
+        return {"model": body.get("model"), "embeddings": [embedding(t) for t in ([texts] if isinstance(texts, str) else texts)]}
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": f"{model}:latest"}, {"name": f"{embed_model}:latest"}]}
+
+    @app.get("/api/version")
+    async def version():
+        return {"version": "0.0.0-fake"}
+
+    @app.get("/_stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/_reset")
+    async def reset():
+        stats.update(requests=0, generations=0, failures=0, service_s=0.0, tokens=0, prompt_tokens=0, embeddings=0,
+                     aborted=0, tokens_skipped=0)
+        recent.clear()
+        return stats
+
+    return app
+
+
+def _chunk(key, text):
+    return {"role": "assistant", "content": text} if key == "message" else text
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Fake Ollama server for benchmarks.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11435)
+    ap.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    ap.add_argument("--token-rate", type=float, default=200.0, help="tokens per second after the first")
+    ap.add_argument("--tokens", type=int, default=120, help="tokens per answer")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="fraction of generations answered with HTTP 500")
+    ap.add_argument("--mode", choices=["chat", "generate", "ndjson"], default="chat")
+    ap.add_argument("--model", default="llama3.1")
+    ap.add_argument("--prefix-cache", action="store_true", help="only evaluate the part of a prompt not seen recently")
+    args = ap.parse_args(argv)
+
+    import uvicorn # type: ignore
+    app = create_app(args.latency, args.token_rate, args.tokens, args.fail_rate, args.mode, args.model,
+                     prefix_cache=args.prefix_cache)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+# backend/bench/run_bench.py
+#
+# End-to-end benchmark of the backend against the fake Ollama in bench/fake_ollama.py.
+#
+#   cd backend && python bench/run_bench.py
+#   cd backend && python bench/run_bench.py --concurrency 1,8,32 --requests 200 --json bench.json
+#   cd backend && python bench/run_bench.py --baseline bench.json --max-regression 0.2
+#
+# Starts the fake and a real uvicorn process for app.py, drives each endpoint at fixed
+# concurrency levels and prints p50/p95/p99 latency, throughput, errors, upstream
+# failures (LLM routes still answer 200 when Ollama fails) and the server-side
+# overhead (client latency minus the fake's own generation time, per request).
+# With --baseline the run exits 1 if any p95 regressed by more than --max-regression.
+
+import os, sys, json, time, socket, asyncio, argparse, subprocess
+import httpx # type: ignore
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HERE = os.path.join(BACKEND, "bench")
+
+GIG = {
+    "title": "I will design a modern minimalist logo for your business",
+    "description": "I design logos.\n• Unlimited revisions\n• Vector files",
+    "niche": "Logo design",
+}
+
+# name -> (method, path, body builder(i)); bodies are made unique so the response cache
+# doesn't turn the run into a cache benchmark (use --allow-cache for that)
+ENDPOINTS = {
+    "improve_gig": ("POST", "/improve_gig", lambda i: {**GIG, "title": f"{GIG['title']} #{i}"}),
+    "chat_gig": ("POST", "/chat_gig", lambda i: {**GIG, "user_message": f"Make it shorter #{i}"}),
+    "reply_suggestion": ("POST", "/reply_suggestion", lambda i: {"buyer_message": f"Can you do a logo by Friday? #{i}"}),
+    "seo_score": ("POST", "/seo_score", lambda i: {**GIG, "primary_kw": "logo"}),
+    "health": ("GET", "/health", None),
+}
+LLM_ENDPOINTS = {"improve_gig", "chat_gig", "reply_suggestion"}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url: str, timeout: float = 20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    k = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+async def drive(base: str, name: str, concurrency: int, total: int, unique: bool):
+    method, path, body = ENDPOINTS[name]
+    latencies, errors = [], 0
+    counter = iter(range(total))
+    run_id = time.time_ns()
+
+    async def worker(client):
+        nonlocal errors
+        for i in counter:
+            payload = body(f"{run_id}-{i}" if unique else 0) if body else None
+            t0 = time.perf_counter()
+            try:
+                r = await client.request(method, path, json=payload)
+                ok = r.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - t0)
+            errors += 0 if ok else 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, timeout=300, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+    return sorted(latencies), errors, wall
+
+
+def run(args):
+    fake_port, app_port = free_port(), free_port()
+    fake_url, app_url = f"http://127.0.0.1:{fake_port}", f"http://127.0.0.1:{app_port}"
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    fake = subprocess.Popen([
+        sys.executable, os.path.join(HERE, "fake_ollama.py"), "--port", str(fake_port),
+        "--latency", str(args.latency), "--token-rate", str(args.token_rate),
+        "--tokens", str(args.tokens), "--fail-rate", str(args.fail_rate), "--mode", args.mode,
+    ])
+    env = {
+        **os.environ,
+        "OLLAMA_URL": fake_url,
+        # nothing on disk: no response/semantic cache, in-memory jobs, no tag log
+        "CACHE_DB": "",
+        "SEMANTIC_CACHE_PATH": "",
+        "JOBS_DB": "",
+        "TAG_LOG": "",
+        # let the whole benchmark load reach the fake; admission control is measured separately
+        "OLLAMA_MAX_INFLIGHT": os.environ.get("OLLAMA_MAX_INFLIGHT", str(max(levels))),
+        "QUEUE_MAX_DEPTH": os.environ.get("QUEUE_MAX_DEPTH", str(max(levels) * 4)),
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(app_port), "--log-level", "warning"],
+        cwd=BACKEND, env=env, stdout=subprocess.DEVNULL,
+    )
+    results = []
+    try:
+        wait_until_up(f"{fake_url}/api/version")
+        wait_until_up(f"{app_url}/docs")
+        names = args.endpoints.split(",") if args.endpoints else list(ENDPOINTS)
+        print(f"{'endpoint':18} {'conc':>5} {'reqs':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+              f"{'req/s':>8} {'err':>5} {'upfail':>6} {'overhead ms':>12}")
+        for name in names:
+            for c in levels:
+                httpx.post(f"{fake_url}/_reset")
+                lat, errors, wall = asyncio.run(drive(app_url, name, c, args.requests, not args.allow_cache))
+                fake_stats = httpx.get(f"{fake_url}/_stats").json()
+                # time spent inside the fake doesn't count against us; the rest is overhead
+                upstream = fake_stats["service_s"] if name in LLM_ENDPOINTS else 0.0
+                row = {
+                    "endpoint": name, "concurrency": c, "requests": len(lat),
+                    "p50_ms": percentile(lat, 50) * 1000, "p95_ms": percentile(lat, 95) * 1000,
+                    "p99_ms": percentile(lat, 99) * 1000, "rps": len(lat) / wall, "errors": errors,
+                    "upstream_failures": fake_stats["failures"],
+                    "overhead_ms": (sum(lat) - upstream) / len(lat) * 1000,
+                }
+                results.append(row)
+                print(f"{name:18} {c:>5} {row['requests']:>6} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} "
+                      f"{row['p99_ms']:>9.1f} {row['rps']:>8.1f} {errors:>5} {row['upstream_failures']:>6} "
+                      f"{row['overhead_ms']:>12.2f}")
+    finally:
+        server.terminate()
+        fake.terminate()
+        server.wait()
+        fake.wait()
+    return results
+
+
+def compare(results, baseline_path: str, max_regression: float) -> bool:
+    with open(baseline_path) as f:
+        baseline = {(r["endpoint"], r["concurrency"]): r for r in json.load(f)["results"]}
+    ok = True
+    for r in results:
+        old = baseline.get((r["endpoint"], r["concurrency"]))
+        if not old or not old["p95_ms"]:
+            continue
+        change = r["p95_ms"] / old["p95_ms"] - 1
+        if change > max_regression:
+            ok = False
+            print(f"REGRESSION {r['endpoint']} @ {r['concurrency']}: p95 {old['p95_ms']:.1f} -> {r['p95_ms']:.1f} ms "
+                  f"({change:+.0%})")
+    return ok
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark the backend against a fake Ollama.")
+    ap.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    ap.add_argument("--requests", type=int, default=100, help="requests per endpoint and level")
+    ap.add_argument("--endpoints", default="", help=f"subset of: {','.join(ENDPOINTS)}")
+    ap.add_argument("--latency", type=float, default=0.2, help="fake: seconds before the first token")
+    ap.add_argument("--token-rate", type=float, default=200.0, help="fake: tokens per second")
+    ap.add_argument("--tokens", type=int, default=120, help="fake: tokens per answer")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="fake: fraction of generations that fail")
+    ap.add_argument("--mode", choices=["chat", "generate", "ndjson"], default="chat", help="fake: Ollama flavour")
+    ap.add_argument("--allow-cache", action="store_true", help="repeat identical payloads (measures cache hits)")
+    ap.add_argument("--json", help="write results to this file")
+    ap.add_argument("--baseline", help="results file from an earlier run to compare p95 against")
+    ap.add_argument("--max-regression", type=float, default=0.2, help="allowed p95 increase vs baseline (0.2 = 20%%)")
+    args = ap.parse_args(argv)
+
+    results = run(args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    if args.baseline and not compare(results, args.baseline, args.max_regression):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+# backend/cache.py
+
+import json, time, sqlite3, asyncio, hashlib, threading
+from collections import OrderedDict
+from typing import Optional
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache for model outputs.
+
+    - memory: size-bounded LRU (OrderedDict), checked first, no I/O
+    - disk:   SQLite table that survives restarts; a disk hit is promoted into memory
+
+    Both tiers honour the same TTL. Pass db_path="" to run memory-only.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 86400, db_path: str = "cache.db"):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._mem = OrderedDict()  # key -> (expires_at, value)
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        self.evictions = 0
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._writes = 0
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(model: str, temperature: float, messages, format=None) -> str:
+        """(model, temperature, system prompt hash, rendered non-system turns[, output format]) -> stable hex key."""
+        system = "\n".join(m.get("content", "") for m in messages if m.get("role") == "system")
+        turns = [[m.get("role"), m.get("content", "")] for m in messages if m.get("role") != "system"]
+        parts = [model, temperature, _sha256(system), turns]
+        if format:
+            parts.append(format)
+        return _sha256(json.dumps(parts, ensure_ascii=False, sort_keys=True))
+
+    async def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        hit = self._mem.get(key)
+        if hit is not None:
+            if hit[0] > now:
+                self._mem.move_to_end(key)
+                self.hits["memory"] += 1
+                return hit[1]
+            del self._mem[key]
+
+        if self._db is not None:
+            row = await asyncio.to_thread(self._db_get, key)
+            if row is not None and row[1] > now:
+                self.hits["disk"] += 1
+                self._remember(key, row[0], row[1])
+                return row[0]
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str):
+        expires_at = time.time() + self.ttl
+        self._remember(key, value, expires_at)
+        if self._db is not None:
+            await asyncio.to_thread(self._db_set, key, value, expires_at)
+
+    def _remember(self, key, value, expires_at):
+        self._mem[key] = (expires_at, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.evictions += 1
+
+    def _db_get(self, key):
+        with self._db_lock:
+            return self._db.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+
+    def _db_set(self, key, value, expires_at):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                # prune expired rows now and then so the file doesn't grow forever
+                self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+            self._db.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits["memory"] + self.hits["disk"] + self.misses
+        return {
+            "entries": len(self._mem),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "disk": self._db is not None,
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((lookups - self.misses) / lookups, 4) if lookups else None,
+        }
+
+    def close(self):
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
@@ -0,0 +1,319 @@
+# backend/concurrency.py
+
+import asyncio, heapq, itertools, math, time
+from contextlib import asynccontextmanager
+
+
+class _SharedStream:
+    """One upstream async iterator replayed to any number of followers."""
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.waiters = 0
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        ev, self._changed = self._changed, asyncio.Event()
+        ev.set()
+
+    async def pump(self, agen):
+        try:
+            async for item in agen:
+                self.items.append(item)
+                self._notify()
+        except asyncio.CancelledError:
+            self.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    async def follow(self):
+        i = 0
+        while True:
+            changed = self._changed
+            while i < len(self.items):
+                yield self.items[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class SingleFlight:
+    """
+    Deduplicate identical concurrent work.
+
+    The first caller for a key starts the work; callers arriving while it is still running
+    wait on the same task and get the same result (or exception). The shared task is only
+    cancelled once every waiter has gone away.
+    """
+
+    def __init__(self):
+        self._calls = {}    # key -> [task, waiters]
+        self._streams = {}  # key -> _SharedStream
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        """Await fn() once per key across all concurrent callers."""
+        call = self._calls.get(key)
+        if call is None:
+            task = asyncio.ensure_future(fn())
+            call = self._calls[key] = [task, 0]
+            task.add_done_callback(lambda t: self._forget(self._calls, key, call))
+            self.started += 1
+        else:
+            self.coalesced += 1
+
+        call[1] += 1
+        try:
+            return await asyncio.shield(call[0])
+        finally:
+            call[1] -= 1
+            if call[1] == 0 and not call[0].done():
+                call[0].cancel()
+
+    async def stream(self, key, make_agen):
+        """Iterate make_agen() once per key; concurrent callers each see every item from the start."""
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = self._streams[key] = _SharedStream()
+            shared.task = asyncio.ensure_future(shared.pump(make_agen()))
+            shared.task.add_done_callback(lambda t: self._forget(self._streams, key, shared))
+            self.started += 1
+        else:
+            self.coalesced += 1
+
+        shared.waiters += 1
+        try:
+            async for item in shared.follow():
+                yield item
+        finally:
+            shared.waiters -= 1
+            if shared.waiters == 0 and not shared.task.done():
+                shared.task.cancel()
+
+    @staticmethod
+    def _forget(table, key, entry):
+        if table.get(key) is entry:
+            del table[key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls) + len(self._streams),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
+
+
+class Overloaded(Exception):
+    """The generation queue is full or too slow; the client should retry after `retry_after` seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class AdmissionController:
+    """
+    Caps concurrent generations and orders waiting work by priority (lower runs first,
+    FIFO within a priority). New work is rejected with Overloaded when the queue is
+    at max_queue or its estimated wait exceeds max_wait; queued work that still hasn't
+    started after max_wait is rejected too. When the queue is full, higher-priority work
+    displaces the newest lowest-priority waiter instead of being turned away. patient=True callers (e.g. batch jobs that
+    already bound their own concurrency) skip both limits and simply wait their turn: they don't count
+    towards max_queue and are never displaced.
+    """
+
+    def __init__(self, max_inflight: int = 2, max_queue: int = 32, max_wait: float = 30.0):
+        self.max_inflight = max(1, max_inflight)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self._queue = []  # heap of (priority, seq, future, patient)
+        self._seq = itertools.count()
+        self.avg_service = 10.0  # EWMA of generation time (s), seeds the wait estimate
+        self.admitted = 0
+        self.rejected = 0
+
+    def queued(self, patient: bool = True) -> int:
+        """Waiters in the queue; patient=False counts only those bound by max_queue."""
+        return sum(1 for _, _, f, p in self._queue if not f.done() and (patient or not p))
+
+    def estimated_wait(self, priority: int) -> float:
+        ahead = sum(1 for p, _, f, _ in self._queue if p <= priority and not f.done())
+        return (ahead // self.max_inflight + 1) * self.avg_service
+
+    def _displaceable(self, priority: int):
+        """The queued (non-patient) entry a newcomer at this priority may push out, if any."""
+        waiting = [e for e in self._queue if not e[2].done() and not e[3]]
+        worst = max(waiting, default=None, key=lambda e: (e[0], e[1]))
+        return worst if worst is not None and worst[0] > priority else None
+
+    def check(self, priority: int):
+        """Raise Overloaded now if work at this priority would be rejected on arrival."""
+        if self.in_flight < self.max_inflight and not self.queued():
+            return
+        if self.queued(patient=False) >= self.max_queue and self._displaceable(priority) is None:
+            self.rejected += 1
+            raise Overloaded("generation queue is full", self.estimated_wait(priority))
+        wait = self.estimated_wait(priority)
+        if wait > self.max_wait:
+            self.rejected += 1
+            raise Overloaded("estimated queue wait too long", wait)
+
+    async def acquire(self, priority: int, patient: bool = False):
+        if self.in_flight < self.max_inflight and not self.queued():
+            self.in_flight += 1
+            self.admitted += 1
+            return
+        if not patient:
+            self.check(priority)
+            if self.queued(patient=False) >= self.max_queue:
+                victim = self._displaceable(priority)[2]
+                self.rejected += 1
+                victim.set_exception(Overloaded("displaced by higher-priority work", self.avg_service))
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), fut, patient))
+        try:
+            await asyncio.wait_for(fut, None if patient else self.max_wait)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            if fut.done() and not fut.cancelled():
+                self._release()
+            raise Overloaded("timed out waiting for a generation slot", self.avg_service)
+        except asyncio.CancelledError:
+            # a slot may have been handed to us just as we were cancelled
+            if fut.done() and not fut.cancelled():
+                self._release()
+            raise
+        self.admitted += 1
+
+    def release(self, service_time: float = None):
+        if service_time is not None:
+            self.avg_service = 0.8 * self.avg_service + 0.2 * service_time
+        self._release()
+
+    def _release(self):
+        self.in_flight -= 1
+        while self._queue:
+            fut = heapq.heappop(self._queue)[2]
+            if not fut.done():
+                # hand the slot straight to the next waiter
+                self.in_flight += 1
+                fut.set_result(None)
+                return
+
+    @asynccontextmanager
+    async def slot(self, priority: int, patient: bool = False):
+        await self.acquire(priority, patient)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_inflight": self.max_inflight,
+            "queued": self.queued(),
+            "queued_patient": self.queued() - self.queued(patient=False),
+            "max_queue": self.max_queue,
+            "max_wait": self.max_wait,
+            "avg_service_s": round(self.avg_service, 3),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+async def until(agen, deadline: float):
+    """Iterate `agen` until time.monotonic() reaches `deadline`, then close it and raise asyncio.TimeoutError."""
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(agen.__anext__(), max(0.0, deadline - time.monotonic()))
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        await agen.aclose()
+
+
+class CancelOnDisconnect:
+    """
+    ASGI middleware that cancels a request's handler as soon as the client disconnects, so
+    whatever it awaits (an Ollama generation, a queue slot) is abandoned instead of being
+    finished for nobody. Starlette itself only notices disconnects while streaming a response.
+    Once the last body chunk has been sent, a disconnect is just the end of the exchange (uvicorn
+    reports one as soon as the response is complete), so the handler is left to finish.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        inbox = asyncio.Queue()
+        sent = False
+
+        async def tracked_send(message):
+            nonlocal sent
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                sent = True  # before sending: the server may report the disconnect right after
+            await send(message)
+
+        async def listen():
+            while True:
+                message = await receive()
+                inbox.put_nowait(message)  # the handler still sees every message, disconnect included
+                if message["type"] == "http.disconnect":
+                    return
+
+        handler = asyncio.ensure_future(self.app(scope, inbox.get, tracked_send))
+        listener = asyncio.ensure_future(listen())
+        try:
+            await asyncio.wait({handler, listener}, return_when=asyncio.FIRST_COMPLETED)
+            if not handler.done() and not sent:
+                handler.cancel()
+                await asyncio.gather(handler, return_exceptions=True)
+                return
+            return await handler
+        finally:
+            listener.cancel()
+            handler.cancel()
+
+
+async def bounded_map(items, fn, limit: int):
+    """
+    Run fn(item) for every item with at most `limit` running at once, yielding
+    (index, result, error) in completion order. Pending work is cancelled if the
+    consumer stops early.
+    """
+    sem = asyncio.Semaphore(max(1, limit))
+    done = asyncio.Queue()
+
+    async def run(i, item):
+        async with sem:
+            try:
+                done.put_nowait((i, await fn(item), None))
+            except Exception as e:
+                done.put_nowait((i, None, e))
+
+    tasks = [asyncio.ensure_future(run(i, item)) for i, item in enumerate(items)]
+    try:
+        for _ in range(len(tasks)):
+            yield await done.get()
+    finally:
+        for t in tasks:
+            t.cancel()
@@ -0,0 +1,113 @@
+# backend/health.py
+#
+# Background view of the Ollama backend: reachability, version and installed models,
+# refreshed on a timer so /health answers from memory and generations can fail fast
+# when the backend or model is known to be missing.
+
+import time, asyncio, logging
+from ollama_client import OllamaError
+
+log = logging.getLogger("gig_helper.health")
+
+
+def model_installed(model: str, models) -> bool:
+    """'llama3.1' matches an installed 'llama3.1' or 'llama3.1:<tag>'."""
+    return any(m == model or m.startswith(model + ":") for m in models)
+
+
+class OllamaHealth:
+    """
+    Polls /api/version and /api/tags every `interval` seconds (every `retry_interval`
+    while the backend is down) and keeps the last result with its timestamp.
+    A result older than `stale_after` is treated as unknown, so a stuck poller never
+    blocks generations on old news.
+    """
+
+    def __init__(self, client, interval: float = 10.0, retry_interval: float = 2.0, stale_after: float = 60.0):
+        self.client = client
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self.stale_after = stale_after
+        self.reachable = None  # None until the first poll finishes
+        self.version = None
+        self.models = None  # None until /api/tags has answered once
+        self.error = None
+        self.checked_at = None  # wall clock, for display
+        self._checked = None  # monotonic, for staleness
+        self.last_ok_at = None
+        self._wake = None
+        self._task = None
+
+    def start(self):
+        """Start polling on the running event loop (call from the app's lifespan)."""
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        """Re-poll now instead of at the next tick (e.g. after a failed generation)."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            await self.poll()
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval if self.reachable else self.retry_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def poll(self):
+        vr, tr = await asyncio.gather(self.client.version(), self.client.tags(), return_exceptions=True)
+        errors = []
+        if isinstance(vr, Exception):
+            errors.append(f"version: {vr}")
+        if isinstance(tr, Exception):
+            errors.append(f"tags: {tr}")
+        was = self.reachable
+        self.reachable = not isinstance(vr, Exception)
+        if self.reachable:
+            self.version = vr
+            self.last_ok_at = time.time()
+        if not isinstance(tr, Exception):
+            self.models = tr
+        self.error = "; ".join(errors) or None
+        self.checked_at = time.time()
+        self._checked = time.monotonic()
+        if was is not None and was != self.reachable:
+            log.warning("Ollama at %s is %s", self.client.base_url, "back up" if self.reachable else f"down: {self.error}")
+
+    @property
+    def fresh(self) -> bool:
+        return self._checked is not None and time.monotonic() - self._checked <= self.stale_after
+
+    def check(self, model: str):
+        """Raise OllamaError right away if the last fresh poll says this call can't succeed."""
+        if not self.fresh:
+            return
+        if not self.reachable:
+            raise OllamaError(f"Ollama at {self.client.base_url} is unreachable ({self.error})")
+        if self.models is not None and not model_installed(model, self.models):
+            raise OllamaError(f"model '{model}' is not installed on Ollama; run: ollama pull {model}")
+
+    def snapshot(self, model: str) -> dict:
+        return {
+            "ok": bool(self.reachable and self.version),
+            "ollama_version": self.version,
+            "models": self.models or [],
+            "model_present": model_installed(model, self.models) if self.models is not None else None,
+            "error": self.error,
+            "checked_at": self.checked_at,
+            "age_s": round(time.monotonic() - self._checked, 3) if self._checked is not None else None,
+            "last_ok_at": self.last_ok_at,
+        }
@@ -0,0 +1,286 @@
+# backend/jobs.py
+#
+# Durable background jobs for long generations. A POST stores the job in SQLite and
+# returns its id at once; a pool of worker tasks takes queued jobs oldest first, and
+# clients fetch (or long-poll) the result later, even from a new popup or after a
+# server restart: jobs that were running when the process stopped are queued again.
+
+import json, time, uuid, sqlite3, asyncio, logging, threading
+
+log = logging.getLogger("gig_helper.jobs")
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class RetryLater(Exception):
+    """Raised by a handler when the job should go back to the queue (e.g. Ollama is down)."""
+
+    def __init__(self, reason: str, delay: float = 5.0, max_attempts: int = None):
+        super().__init__(reason)
+        self.delay = delay
+        self.max_attempts = max_attempts  # tighter cap than the queue's for this kind of failure
+
+
+class JobQueue:
+    """
+    SQLite-backed job queue with `workers` concurrent runners. Handlers are registered
+    per kind: `async handler(payload) -> JSON-serialisable result`. A handler error fails
+    the job; RetryLater puts it back (up to max_attempts runs). Finished jobs are kept
+    for `ttl` seconds. db_path="" keeps the queue in memory (lost on restart).
+    """
+
+    def __init__(self, db_path: str = "jobs.db", workers: int = 2, ttl: float = 7 * 86400, max_attempts: int = 3):
+        self.workers = workers
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self._handlers = {}
+        self._tasks = []
+        self._running = {}  # job id -> asyncio.Task of the handler
+        self._cancelling = set()  # ids of running jobs a client cancelled
+        self._waiters = {}  # job id -> asyncio.Event set when it finishes
+        self._wake = None
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(db_path or ":memory:", check_same_thread=False)
+        if db_path:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, dedupe_key TEXT,"
+            " status TEXT NOT NULL, result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL, not_before REAL NOT NULL DEFAULT 0,"
+            " started_at REAL, finished_at REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, created_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_dedupe ON jobs (dedupe_key)")
+        self._db.commit()
+
+    def register(self, kind: str, handler):
+        self._handlers[kind] = handler
+
+    # ---------- Lifecycle ----------
+
+    def start(self):
+        if self._tasks:
+            return
+        self._wake = asyncio.Event()
+        requeued = self._execute("UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?", (QUEUED, RUNNING))
+        if requeued:
+            log.info("requeued %d job(s) interrupted by the last shutdown", requeued)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop the workers; jobs they were running stay 'running' and are requeued by the next start()."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def close(self):
+        with self._db_lock:
+            self._db.close()
+
+    # ---------- Client side ----------
+
+    async def submit(self, kind: str, payload: dict, dedupe_key: str = None) -> dict:
+        """
+        Queue a job and return it. With a dedupe_key, an unfinished or successful job with
+        the same key is returned instead, so resubmitting the same work doesn't run it twice.
+        """
+        if kind not in self._handlers:
+            raise KeyError(f"unknown job kind {kind!r}")
+        if dedupe_key:
+            existing = await asyncio.to_thread(self._find, dedupe_key)
+            if existing is not None:
+                return existing
+        job = {
+            "id": uuid.uuid4().hex, "kind": kind, "payload": json.dumps(payload, ensure_ascii=False),
+            "dedupe_key": dedupe_key, "status": QUEUED, "created_at": time.time(),
+        }
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT INTO jobs (id, kind, payload, dedupe_key, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            tuple(job.values()),
+        )
+        if self._wake is not None:
+            self._wake.set()
+        return await self.get(job["id"])
+
+    async def get(self, job_id: str):
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def wait(self, job_id: str, timeout: float):
+        """The job once it has finished, or as it stands after `timeout` seconds (None if unknown)."""
+        # listen before looking, so a job finishing in between can't be missed
+        event = self._waiters.setdefault(job_id, asyncio.Event())
+        job = await self.get(job_id)
+        if job is None or job["status"] in FINISHED:
+            self._waiters.pop(job_id, None)  # nothing will notify it any more
+            return job
+        if timeout <= 0:
+            return job
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return await self.get(job_id)
+
+    async def cancel(self, job_id: str):
+        """Cancel a queued or running job; returns it (None if unknown). Finished jobs are left as they are."""
+        job = await self.get(job_id)
+        if job is None or job["status"] in FINISHED:
+            return job
+        if job["status"] == QUEUED and await asyncio.to_thread(self._finish, job_id, CANCELLED, None, "cancelled", QUEUED):
+            self._notify(job_id)
+        else:
+            # running, or claimed by a worker since we looked: the worker records the cancellation
+            self._cancelling.add(job_id)
+            task = self._running.get(job_id)
+            if task is not None and not task.done():
+                task.cancel()
+            elif await asyncio.to_thread(self._finish, job_id, CANCELLED, None, "cancelled", QUEUED):
+                # it went back to the queue for a retry since we looked
+                self._cancelling.discard(job_id)
+                self._notify(job_id)
+        job = await self.wait(job_id, 5)
+        if job is not None and job["status"] in FINISHED:
+            self._cancelling.discard(job_id)  # it finished on its own before the worker saw the cancel
+        return job
+
+    # ---------- Workers ----------
+
+    async def _worker(self):
+        while True:
+            job = await asyncio.to_thread(self._claim)
+            if job is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), 1.0)  # also picks up delayed retries
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: dict):
+        if job["id"] in self._cancelling:  # cancelled between the claim and now
+            self._cancelling.discard(job["id"])
+            await asyncio.to_thread(self._finish, job["id"], CANCELLED, None, "cancelled")
+            self._notify(job["id"])
+            return
+        handler = self._handlers.get(job["kind"])
+        task = asyncio.create_task(handler(job["payload"])) if handler else None
+        if task is None:
+            await asyncio.to_thread(self._finish, job["id"], FAILED, None, f"no handler for {job['kind']!r}")
+            self._notify(job["id"])
+            return
+        self._running[job["id"]] = task
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if job["id"] not in self._cancelling:
+                raise  # the worker itself is being stopped; the job stays 'running' for the next start()
+            await asyncio.to_thread(self._finish, job["id"], CANCELLED, None, "cancelled")
+        except RetryLater as e:
+            if job["id"] in self._cancelling:
+                await asyncio.to_thread(self._finish, job["id"], CANCELLED, None, "cancelled")
+            elif job["attempts"] >= min(self.max_attempts, e.max_attempts or self.max_attempts):
+                await asyncio.to_thread(self._finish, job["id"], FAILED, None, str(e))
+            else:
+                log.info("job %s back in the queue for %.0fs: %s", job["id"], e.delay, e)
+                await asyncio.to_thread(self._requeue, job["id"], time.time() + e.delay)
+                # a cancel that came in meanwhile; if another worker has claimed the job since,
+                # the mark stays for that worker to act on
+                if job["id"] not in self._cancelling or not await asyncio.to_thread(
+                        self._finish, job["id"], CANCELLED, None, "cancelled", QUEUED):
+                    return
+        except Exception as e:
+            log.warning("job %s (%s) failed: %s", job["id"], job["kind"], e)
+            await asyncio.to_thread(self._finish, job["id"], FAILED, None, str(e))
+        else:
+            await asyncio.to_thread(self._finish, job["id"], DONE, result, None)
+        finally:
+            self._running.pop(job["id"], None)
+        self._cancelling.discard(job["id"])
+        self._notify(job["id"])
+
+    def _notify(self, job_id: str):
+        event = self._waiters.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    # ---------- SQLite (run via asyncio.to_thread) ----------
+
+    def _execute(self, sql: str, params=()) -> int:
+        with self._db_lock:
+            n = self._db.execute(sql, params).rowcount
+            self._db.commit()
+            return n
+
+    def _claim(self):
+        """Mark the oldest runnable queued job as running and return it."""
+        now = time.time()
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT id, kind, payload, attempts FROM jobs WHERE status = ? AND not_before <= ?"
+                " ORDER BY created_at LIMIT 1",
+                (QUEUED, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (RUNNING, now, row[0]),
+            )
+            self._db.commit()
+        return {"id": row[0], "kind": row[1], "payload": json.loads(row[2]), "attempts": row[3] + 1}
+
+    def _requeue(self, job_id: str, not_before: float):
+        self._execute("UPDATE jobs SET status = ?, not_before = ?, started_at = NULL WHERE id = ? AND status = ?",
+                      (QUEUED, not_before, job_id, RUNNING))
+
+    def _finish(self, job_id: str, status: str, result, error, only_if: str = None) -> bool:
+        """Record the outcome unless the job already has one (or isn't in status `only_if`); True if it did."""
+        now = time.time()
+        sql = "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ? AND status NOT IN (?, ?, ?)"
+        params = (status, None if result is None else json.dumps(result, ensure_ascii=False), error, now, job_id) + FINISHED
+        if only_if:
+            sql, params = sql + " AND status = ?", params + (only_if,)
+        with self._db_lock:
+            n = self._db.execute(sql, params).rowcount
+            # drop finished jobs past their ttl while we're here
+            self._db.execute("DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at <= ?", (now - self.ttl,))
+            self._db.commit()
+        return n > 0
+
+    _COLUMNS = "id, kind, status, result, error, attempts, created_at, started_at, finished_at"
+
+    def _row(self, row) -> dict:
+        job = dict(zip(("id", "kind", "status", "result", "error", "attempts", "created_at", "started_at", "finished_at"), row))
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        if job["status"] == QUEUED:
+            job["position"] = self._position(job["created_at"])
+        return job
+
+    def _position(self, created_at: float) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?",
+                                (QUEUED, created_at)).fetchone()[0]
+
+    def _get(self, job_id: str):
+        with self._db_lock:
+            row = self._db.execute(f"SELECT {self._COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return self._row(row) if row else None
+
+    def _find(self, dedupe_key: str):
+        with self._db_lock:
+            row = self._db.execute(
+                f"SELECT {self._COLUMNS} FROM jobs WHERE dedupe_key = ? AND status IN (?, ?, ?)"
+                " ORDER BY created_at DESC LIMIT 1",
+                (dedupe_key, QUEUED, RUNNING, DONE),
+            ).fetchone()
+            return self._row(row) if row else None
+
+    def stats(self) -> dict:
+        with self._db_lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {"workers": self.workers, "running": len(self._running), **{s: counts.get(s, 0) for s in (QUEUED, RUNNING) + FINISHED}}
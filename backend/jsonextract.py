@@ -0,0 +1,287 @@
+# backend/jsonextract.py
+#
+# Single-pass, brace/string-aware JSON extraction for model output.
+# Every helper here walks its input a bounded number of times (no backtracking
+# regexes), so long or malformed generations can't pin a worker.
+
+import json, re
+
+# Only characters that change scanner state; the regex engine skips everything else in C.
+_SCAN_TOKENS = re.compile(r'[{}\[\]"\\]')
+_REPAIR_TOKENS = re.compile(r'[{}\[\]",\\]')
+_STRING_TOKENS = re.compile(r'["\\]')
+_WS = re.compile(r"\s*")
+_CLOSER = {"{": "}", "[": "]"}
+
+
+class JSONScanner:
+    """
+    Incremental scanner that finds the first balanced JSON value in a text stream.
+
+    Feed chunks (e.g. model tokens) as they arrive; `complete` turns True as soon as the
+    first top-level value opened by one of `openers` closes. Anything before it (prose,
+    code fences) is ignored. Total work is linear in the text fed.
+    """
+
+    def __init__(self, openers: str = "{"):
+        self.openers = openers
+        self.start = -1
+        self.end = -1
+        self._chunks = []
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def complete(self) -> bool:
+        return self.end >= 0
+
+    def text(self) -> str:
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    def feed(self, chunk: str) -> bool:
+        base = self._pos
+        self._chunks.append(chunk)
+        self._pos += len(chunk)
+        if self.complete:
+            return True
+
+        skip = 1 if self._escape else 0  # escaped char carried over from the previous chunk
+        self._escape = False
+        for m in _SCAN_TOKENS.finditer(chunk):
+            i = m.start()
+            if i < skip:
+                continue
+            ch = chunk[i]
+            if self.start < 0:
+                if ch in self.openers:
+                    self.start = base + i
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if ch == "\\":
+                    if i + 1 < len(chunk):
+                        skip = i + 2
+                    else:
+                        self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.end = base + i + 1
+                    return True
+        return False
+
+    def fragment(self):
+        """The (possibly still open) JSON text found so far, or None if nothing has started."""
+        if self.start < 0:
+            return None
+        return self.text()[self.start:self.end if self.complete else None]
+
+    def result(self):
+        """Parse what we have, repairing a truncated tail; None if nothing usable was found."""
+        frag = self.fragment()
+        if frag is None:
+            return None
+        try:
+            return loads_lenient(frag)
+        except ValueError:
+            return None
+
+
+def strip_code_fences(text: str) -> str:
+    """Drop a leading ``` / ```json fence and a trailing ``` fence, if present."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text[3:]
+        if text[:4].lower() == "json":
+            text = text[4:]
+        text = text.lstrip()
+    if text.endswith("```"):
+        text = text[:-3].rstrip()
+    return text
+
+
+def looks_like_markdown(text: str) -> bool:
+    """True if any line starts with a heading, bullet or number, or the text uses **bold**."""
+    if "**" in text:
+        return True
+    return any(line.lstrip()[:1] in ("#", "*", "•") or line.lstrip()[:1].isdigit() for line in text.splitlines())
+
+
+def extract_json(text: str, scanner: JSONScanner = None):
+    """
+    First JSON object in `text` (prose and truncation tolerated); a bare top-level array as a fallback.
+    `scanner` is a JSONScanner("{") already fed the same output token by token (while streaming),
+    so the scan isn't repeated here.
+    """
+    if scanner is None:
+        scanner = JSONScanner("{")
+        scanner.feed(text)
+    if scanner.start >= 0:
+        return scanner.result()
+    if text.lstrip().startswith("["):
+        try:
+            return loads_lenient(text.strip())
+        except ValueError:
+            return None
+    return None
+
+
+def loads_lenient(fragment: str):
+    """
+    json.loads with repairs for common model mistakes: raw control characters in strings,
+    trailing commas, and output cut off mid-value (open strings/brackets are closed, and a
+    dangling partial member is dropped). Raises ValueError if nothing parses.
+    """
+    try:
+        return json.loads(fragment, strict=False)
+    except RecursionError:
+        raise ValueError("JSON nested too deeply")
+    except ValueError:
+        pass
+
+    body, stack, in_string, escape, last_cut = _repair_pass(fragment)
+    candidates = []
+    tail = body[:-1] if escape else body
+    if in_string:
+        tail += '"'
+    tail = tail.rstrip()
+    if tail.endswith(","):
+        tail = tail[:-1]
+    elif tail.endswith(":"):
+        tail += " null"
+    candidates.append(tail + _closers(stack))
+    if last_cut is not None:
+        candidates.append(body[:last_cut[0]] + _closers(last_cut[1]))
+
+    for candidate in candidates:
+        try:
+            return json.loads(candidate, strict=False)
+        except (ValueError, RecursionError):
+            continue
+    raise ValueError("could not repair JSON fragment")
+
+
+def _closers(stack) -> str:
+    out = []
+    while stack is not None:
+        out.append(stack[0])
+        stack = stack[1]
+    return "".join(out)
+
+
+def _repair_pass(s: str):
+    """
+    One pass over s that drops trailing commas and tracks open brackets/strings.
+    The bracket stack is a linked list of (closer, parent) so remembering it at each
+    comma (the fallback cut point) is O(1).
+    """
+    out, flushed, out_len = [], 0, 0
+    stack = None
+    in_string = False
+    skip = -1
+    last_cut = None
+    for m in _REPAIR_TOKENS.finditer(s):
+        i = m.start()
+        if i == skip:
+            continue
+        ch = s[i]
+        if in_string:
+            if ch == "\\":
+                skip = i + 1
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack = (_CLOSER[ch], stack)
+        elif ch in "}]":
+            # tolerate one missing closer; otherwise leave the stray bracket alone
+            if stack is not None and stack[0] == ch:
+                stack = stack[1]
+            elif stack is not None and stack[1] is not None and stack[1][0] == ch:
+                stack = stack[1][1]
+        elif ch == ",":
+            j = _WS.match(s, i + 1).end()
+            if j < len(s) and s[j] in "}]":
+                out.append(s[flushed:i])
+                out_len += i - flushed
+                flushed = i + 1
+            else:
+                last_cut = (out_len + i - flushed, stack)
+    out.append(s[flushed:])
+    return "".join(out), stack, in_string, skip == len(s), last_cut
+
+
+def extract_fields(text: str, keys) -> dict:
+    """
+    Last-resort recovery of individual `"key": value` members from text that isn't
+    parseable as a whole. Each key costs one linear search plus one value scan.
+    """
+    result = {}
+    for key in keys:
+        value = _field_value(text, key)
+        if value is not None:
+            result[key] = value
+    return result
+
+
+def _field_value(text: str, key: str):
+    needle = f'"{key}"'
+    i = text.find(needle)
+    while i >= 0:
+        j = _WS.match(text, i + len(needle)).end()
+        if j < len(text) and text[j] == ":":
+            return _value_at(text, _WS.match(text, j + 1).end())
+        i = text.find(needle, i + 1)
+    return None
+
+
+def _value_at(text: str, j: int):
+    if j >= len(text):
+        return None
+    if text[j] == '"':
+        return _string_at(text, j)
+    if text[j] in "{[":
+        scanner = JSONScanner("{[")
+        scanner.feed(text[j:])
+        return scanner.result()
+    return None
+
+
+def _string_at(text: str, j: int) -> str:
+    """
+    A string value starting at text[j] == '"'. Models sometimes leave inner quotes
+    unescaped, so the value ends at the first quote that is followed by , } ] or the end.
+    """
+    skip = -1
+    for m in _STRING_TOKENS.finditer(text, j + 1):
+        i = m.start()
+        if i == skip:
+            continue
+        if text[i] == "\\":
+            skip = i + 1
+            continue
+        k = _WS.match(text, i + 1).end()
+        if k >= len(text) or text[k] in ",}]":
+            raw = text[j + 1:i]
+            try:
+                return json.loads(f'"{raw}"', strict=False)
+            except ValueError:
+                return raw
+    raw = text[j + 1:]
+    try:
+        return json.loads(f'"{raw}"', strict=False)
+    except ValueError:
+        return raw
@@ -0,0 +1,277 @@
+# backend/metrics.py
+#
+# Minimal in-process metrics with Prometheus text exposition (served at /metrics).
+# Counters and fixed-bucket histograms keyed by label values; an observation is a
+# dict lookup, a bisect and two additions, so it is cheap enough for the hot path.
+
+import time, bisect, threading
+from contextlib import contextmanager
+
+# seconds, covering a ~1 ms JSON parse up to a multi-minute cold generation
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(v) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(k, "")) for k in self.labels)
+
+    def _label_str(self, key: tuple, extra: str = "") -> str:
+        parts = [f'{k}="{_escape(v)}"' for k, v in zip(self.labels, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+            lines += self._render_series(series)
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def _render_series(self, series) -> list:
+        return [f"{self.name}{self._label_str(key)} {_fmt(value)}" for key, value in series]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                # per-bucket counts (last slot is +Inf), sum, count
+                s = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the with-block (also when it raises)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_series(self, series) -> list:
+        lines = []
+        for key, (counts, total, n) in series:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = 'le="%s"' % _fmt(bound)
+                lines.append(f"{self.name}_bucket{self._label_str(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_str(key)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{self._label_str(key)} {n}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help: str, labels=()) -> Counter:
+        m = Counter(name, help, labels)
+        self._metrics.append(m)
+        return m
+
+    def gauge(self, name: str, help: str, labels=()) -> Gauge:
+        m = Gauge(name, help, labels)
+        self._metrics.append(m)
+        return m
+
+    def histogram(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        m = Histogram(name, help, labels, buckets)
+        self._metrics.append(m)
+        return m
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for m in self._metrics:
+            lines += m.render()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "gig_helper_stage_seconds",
+    "Time spent per request stage (prompt_build, queue_wait, ollama, ttft, coerce_json, natural_language, draft, suggest_tags, keyword_coverage).",
+    labels=("stage", "route"),
+)
+OLLAMA_REQUESTS = REGISTRY.counter(
+    "gig_helper_ollama_requests_total",
+    "Ollama generations by outcome (ok, error, unavailable = rejected by the health check).",
+    labels=("route", "model", "outcome"),
+)
+OLLAMA_EVAL_TOKENS = REGISTRY.histogram(
+    "gig_helper_ollama_eval_tokens",
+    "Tokens generated per call (Ollama eval_count).",
+    labels=("route", "model"), buckets=TOKEN_BUCKETS,
+)
+OLLAMA_PROMPT_TOKENS = REGISTRY.histogram(
+    "gig_helper_ollama_prompt_tokens",
+    "Prompt tokens evaluated per call (Ollama prompt_eval_count).",
+    labels=("route", "model"), buckets=TOKEN_BUCKETS,
+)
+OLLAMA_EVAL_SECONDS = REGISTRY.histogram(
+    "gig_helper_ollama_eval_seconds",
+    "Decode time per call (Ollama eval_duration).",
+    labels=("route", "model"),
+)
+OLLAMA_PROMPT_EVAL_SECONDS = REGISTRY.histogram(
+    "gig_helper_ollama_prompt_eval_seconds",
+    "Prompt evaluation time per call (Ollama prompt_eval_duration).",
+    labels=("route", "model"),
+)
+OLLAMA_LOAD_SECONDS = REGISTRY.histogram(
+    "gig_helper_ollama_load_seconds",
+    "Model load time per call (Ollama load_duration); non-zero means a cold model.",
+    labels=("route", "model"),
+)
+BACKEND_INFLIGHT = REGISTRY.gauge(
+    "gig_helper_backend_inflight",
+    "Generations currently running on each Ollama backend.",
+    labels=("backend",),
+)
+BACKEND_SECONDS = REGISTRY.histogram(
+    "gig_helper_backend_request_seconds",
+    "Wall time of successful generations per Ollama backend.",
+    labels=("backend",),
+)
+BACKEND_FAILURES = REGISTRY.counter(
+    "gig_helper_backend_failures_total",
+    "Failed generations per Ollama backend (unreachable = retried elsewhere when possible).",
+    labels=("backend", "kind"),
+)
+MODEL_LOAD_SECONDS = REGISTRY.histogram(
+    "gig_helper_model_load_seconds",
+    "Model load time reported by warmup preloads and keepalive pings (near zero = already loaded).",
+    labels=("backend", "model", "reason"),
+)
+CHAT_TURN_PROMPT_EVAL_SECONDS = REGISTRY.histogram(
+    "gig_helper_chat_turn_prompt_eval_seconds",
+    "Prompt evaluation time of /chat_gig session turns (first vs follow-up, which reuse the prefix).",
+    labels=("turn",),
+)
+PROMPT_TOKENS_ESTIMATED = REGISTRY.histogram(
+    "gig_helper_prompt_tokens_estimated",
+    "Estimated prompt tokens per request after budgeting (before Ollama sees it).",
+    labels=("route",), buckets=TOKEN_BUCKETS,
+)
+PROMPT_TRUNCATIONS = REGISTRY.counter(
+    "gig_helper_prompt_truncations_total",
+    "Prompt fields shortened to fit the route's input budget.",
+    labels=("route", "field"),
+)
+STRUCTURED_OUTPUTS = REGISTRY.counter(
+    "gig_helper_structured_outputs_total",
+    "Schema-constrained answers by result (first_pass, repaired, failed).",
+    labels=("route", "result"),
+)
+SEMANTIC_LOOKUPS = REGISTRY.counter(
+    "gig_helper_semantic_cache_lookups_total",
+    "Near-duplicate cache lookups by result (hit, miss, error).",
+    labels=("route", "result"),
+)
+SEMANTIC_LOOKUP_SECONDS = REGISTRY.histogram(
+    "gig_helper_semantic_cache_lookup_seconds",
+    "Embedding plus index search time per near-duplicate lookup.",
+    labels=("route",),
+)
+SEMANTIC_SIMILARITY = REGISTRY.histogram(
+    "gig_helper_semantic_cache_similarity",
+    "Cosine similarity of the closest indexed gig per lookup (to tune SEMANTIC_CACHE_THRESHOLD).",
+    labels=("route",), buckets=(0.5, 0.7, 0.8, 0.85, 0.9, 0.93, 0.95, 0.97, 0.99, 1.0),
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "gig_helper_cache_lookups_total",
+    "Response cache lookups by result (hit, miss).",
+    labels=("route", "result"),
+)
+OLLAMA_CANCELLED = REGISTRY.counter(
+    "gig_helper_ollama_cancelled_total",
+    "Generations aborted before Ollama finished (client = every waiting client disconnected, deadline = route budget spent).",
+    labels=("route", "reason"),
+)
+OLLAMA_TOKENS_SAVED = REGISTRY.counter(
+    "gig_helper_ollama_tokens_saved_total",
+    "Estimated tokens Ollama did not generate because the generation was aborted.",
+    labels=("route",),
+)
+
+# per route: moving averages of (tokens per answer, decode tokens/s), to estimate what an abort saved
+_typical = {}
+
+
+def observe_completion(done, route: str):
+    """Record Ollama's own timing/token counters for a finished generation."""
+    labels = {"route": route, "model": done.model}
+    OLLAMA_REQUESTS.inc(route=route, model=done.model, outcome="ok")
+    OLLAMA_EVAL_TOKENS.observe(done.eval_count, **labels)
+    OLLAMA_PROMPT_TOKENS.observe(done.prompt_eval_count, **labels)
+    OLLAMA_EVAL_SECONDS.observe(done.eval_duration, **labels)
+    OLLAMA_PROMPT_EVAL_SECONDS.observe(done.prompt_eval_duration, **labels)
+    OLLAMA_LOAD_SECONDS.observe(done.load_duration, **labels)
+    if done.eval_count and done.eval_duration:
+        tokens, rate = _typical.get(route, (done.eval_count, done.eval_count / done.eval_duration))
+        _typical[route] = (0.8 * tokens + 0.2 * done.eval_count, 0.8 * rate + 0.2 * done.eval_count / done.eval_duration)
+
+
+def observe_cancelled(route: str, reason: str, elapsed: float, produced: int = None) -> int:
+    """
+    Count an aborted generation and the tokens it would still have produced: the route's
+    typical answer length minus what was generated (streamed tokens, or elapsed x decode rate).
+    """
+    OLLAMA_CANCELLED.inc(route=route, reason=reason)
+    tokens, rate = _typical.get(route, (0.0, 0.0))
+    saved = max(0, round(tokens - (elapsed * rate if produced is None else produced)))
+    if saved:
+        OLLAMA_TOKENS_SAVED.inc(saved, route=route)
+    return saved
@@ -0,0 +1,341 @@
+# backend/ollama_client.py
+
+import json
+from dataclasses import dataclass
+from typing import Optional
+import httpx # type: ignore
+
+
+class OllamaError(Exception):
+    """Raised when the Ollama backend can't produce a completion."""
+
+
+class OllamaUnavailable(OllamaError):
+    """The host couldn't be reached at all (nothing was sent), so another host may be tried."""
+
+
+class DeadlineExceeded(OllamaError):
+    """The route's time budget ran out before the generation finished (the host itself answered)."""
+
+# httpx errors raised before a request reaches the server
+_CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+
+@dataclass
+class Completion:
+    """Generated text plus the timing/token stats Ollama reports (durations in seconds)."""
+    text: str
+    model: str = ""
+    eval_count: int = 0
+    eval_duration: float = 0.0
+    prompt_eval_count: int = 0
+    prompt_eval_duration: float = 0.0
+    load_duration: float = 0.0
+    total_duration: float = 0.0
+    backend: str = ""  # base URL of the host that generated it (set by OllamaPool)
+    context: Optional[list] = None  # /api/generate token context, to continue the conversation cheaply
+
+    @classmethod
+    def from_ollama(cls, text: str, model: str, data: dict) -> "Completion":
+        ns = lambda k: (data.get(k) or 0) / 1e9
+        return cls(
+            text=text,
+            model=data.get("model") or model,
+            eval_count=data.get("eval_count") or 0,
+            eval_duration=ns("eval_duration"),
+            prompt_eval_count=data.get("prompt_eval_count") or 0,
+            prompt_eval_duration=ns("prompt_eval_duration"),
+            load_duration=ns("load_duration"),
+            total_duration=ns("total_duration"),
+            context=data.get("context"),
+        )
+
+
+def flatten_messages_to_prompt(messages) -> str:
+    sys_txt = "\n".join(m.get("content", "") for m in messages if m.get("role") == "system").strip()
+    if any(m.get("role") == "assistant" for m in messages):
+        # multi-turn: render the whole transcript so earlier answers stay in the prompt
+        turns = []
+        for m in messages:
+            if m.get("role") == "user":
+                turns.append(continuation_prompt(m.get("content", "")))
+            elif m.get("role") == "assistant":
+                turns.append(" " + m.get("content", "").strip())
+        return (sys_txt + "".join(turns)).strip()
+    user_txt = "\n".join(m.get("content", "") for m in messages if m.get("role") == "user").strip()
+    if sys_txt:
+        return f"{sys_txt}\n\nUser:\n{user_txt}\n\nAssistant:"
+    return user_txt
+
+
+def continuation_prompt(user_message: str) -> str:
+    """One more user turn in flatten_messages_to_prompt's format (sent with a saved context)."""
+    return f"\n\nUser:\n{user_message.strip()}\n\nAssistant:"
+
+
+def _last_user(messages) -> str:
+    return next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+
+
+def parse_keep_alive(value: str):
+    """Env-style keep_alive: '' -> None (Ollama's default), '300' / '-1' -> seconds, '30m' -> as is."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    return int(value) if value.lstrip("-").isdigit() else value
+
+
+def _extra(keep_alive, context=None, format=None) -> dict:
+    extra = {}
+    if keep_alive is not None:
+        extra["keep_alive"] = keep_alive
+    if context:
+        extra["context"] = context
+    if format:
+        extra["format"] = format
+    return extra
+
+
+class OllamaClient:
+    """
+    Async client for one Ollama host over a persistent connection pool.
+
+    The first call negotiates which API the host speaks and remembers it:
+      - "chat":            /api/chat (current Ollama)
+      - "generate":        /api/generate returning a single JSON object
+      - "generate_stream": /api/generate on very old builds that ignore stream=False
+    so later calls go straight to the right endpoint instead of re-probing.
+
+    keep_alive is passed through to Ollama (how long the model stays loaded after the call);
+    the client's own keep_alive is the default for every request. context is the
+    token context from a previous /api/generate answer; on generate-only hosts the call then
+    sends just the newest user turn instead of the whole transcript. /api/chat ignores it and
+    relies on Ollama's prompt-prefix cache instead. format ("json" or a JSON schema) constrains
+    the output to valid JSON of that shape (schemas need Ollama 0.5+; older builds treat it as "json"
+    or ignore it, so callers still validate).
+    """
+
+    API_CHAT = "chat"
+    API_GENERATE = "generate"
+    API_GENERATE_STREAM = "generate_stream"
+
+    def __init__(self, base_url: str, timeout: float = 120.0, max_connections: int = 64, keep_alive=None):
+        self.base_url = base_url.rstrip("/")
+        self.api = None
+        self.keep_alive = keep_alive
+        self._http = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(timeout, connect=5.0),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def chat(self, messages, model: str, temperature: float = 0.5, keep_alive=None, context=None,
+                   format=None) -> Completion:
+        keep_alive = self.keep_alive if keep_alive is None else keep_alive
+        try:
+            if self.api in (None, self.API_CHAT):
+                done = await self._chat(messages, model, temperature, keep_alive, format)
+                if done is not None:
+                    return done
+            prompt = continuation_prompt(_last_user(messages)) if context else flatten_messages_to_prompt(messages)
+            return await self._generate(prompt, model, temperature, _extra(keep_alive, context, format))
+        except _CONNECT_ERRORS as e:
+            raise OllamaUnavailable(f"Ollama at {self.base_url} unreachable: {e}") from e
+        except httpx.HTTPError as e:
+            raise OllamaError(f"Ollama request failed: {e}") from e
+
+    async def _chat(self, messages, model, temperature, keep_alive=None, format=None):
+        r = await self._http.post("/api/chat", json={
+            "model": model,
+            "messages": messages,
+            "options": {"temperature": temperature},
+            "stream": False,
+            **_extra(keep_alive, format=format),
+        })
+        if r.status_code == 200:
+            self.api = self.API_CHAT
+            data = r.json()
+            return Completion.from_ollama(data.get("message", {}).get("content", ""), model, data)
+        _raise_for_model_error(r)
+        if r.status_code == 404 and self.api != self.API_CHAT:
+            # Endpoint doesn't exist on this build; remember and use /api/generate from now on.
+            # (Concurrent first calls can all get here, so "generate" may already be set.)
+            self.api = self.API_GENERATE
+            return None
+        raise OllamaError(f"/api/chat returned HTTP {r.status_code}: {r.text[:200]}")
+
+    async def _generate(self, prompt, model, temperature, extra=None) -> Completion:
+        if self.api == self.API_GENERATE_STREAM:
+            return await self._generate_stream(prompt, model, temperature, extra)
+
+        r = await self._http.post("/api/generate", json={
+            "model": model,
+            "prompt": prompt,
+            "options": {"temperature": temperature},
+            "stream": False,
+            **(extra or {}),
+        })
+        _raise_for_model_error(r)
+        if r.status_code != 200:
+            raise OllamaError(f"/api/generate returned HTTP {r.status_code}: {r.text[:200]}")
+
+        # Some older builds ignore stream=False and answer with NDJSON; detect by content-type
+        # and parse the body we already have rather than generating the answer a second time.
+        ctype = (r.headers.get("content-type") or "").lower()
+        if "application/json" in ctype:
+            self.api = self.API_GENERATE
+            data = r.json()
+            return Completion.from_ollama(data.get("response", ""), model, data)
+        self.api = self.API_GENERATE_STREAM
+        return _join_ndjson(r.text.splitlines(), model)
+
+    async def _generate_stream(self, prompt, model, temperature, extra=None) -> Completion:
+        async with self._http.stream("POST", "/api/generate", json={
+            "model": model,
+            "prompt": prompt,
+            "options": {"temperature": temperature},
+            "stream": True,
+            **(extra or {}),
+        }) as r:
+            if r.status_code != 200:
+                await r.aread()
+                _raise_for_model_error(r)
+                raise OllamaError(f"/api/generate returned HTTP {r.status_code}: {r.text[:200]}")
+            return _join_ndjson([line async for line in r.aiter_lines()], model)
+
+    async def stream(self, messages, model: str, temperature: float = 0.5, keep_alive=None, context=None, format=None):
+        """
+        Yield tokens as Ollama produces them, then a final Completion carrying the full text and stats.
+        Uses the negotiated API; a host that hasn't been probed yet is probed with a streaming /api/chat.
+        """
+        keep_alive = self.keep_alive if keep_alive is None else keep_alive
+        try:
+            if self.api in (None, self.API_CHAT):
+                path, payload = "/api/chat", {"messages": messages, **_extra(keep_alive, format=format)}
+            elif context:
+                path, payload = "/api/generate", {"prompt": continuation_prompt(_last_user(messages)), **_extra(keep_alive, context, format)}
+            else:
+                path, payload = "/api/generate", {"prompt": flatten_messages_to_prompt(messages), **_extra(keep_alive, format=format)}
+            payload.update({"model": model, "options": {"temperature": temperature}, "stream": True})
+
+            async with self._http.stream("POST", path, json=payload) as r:
+                if r.status_code != 200:
+                    await r.aread()
+                    _raise_for_model_error(r)
+                    if r.status_code == 404 and self.api != self.API_CHAT:
+                        self.api = self.API_GENERATE
+                    else:
+                        raise OllamaError(f"{path} returned HTTP {r.status_code}: {r.text[:200]}")
+                else:
+                    if self.api is None:
+                        self.api = self.API_CHAT
+                    chunks, last = [], {}
+                    async for line in r.aiter_lines():
+                        if not line:
+                            continue
+                        try:
+                            obj = json.loads(line)
+                        except Exception:
+                            continue
+                        if obj.get("error"):
+                            raise OllamaError(obj["error"])
+                        token = obj.get("message", {}).get("content", "") if path == "/api/chat" else obj.get("response", "")
+                        if token:
+                            chunks.append(token)
+                            yield token
+                        if obj.get("done"):
+                            last = obj
+                            break
+                    yield Completion.from_ollama("".join(chunks), model, last)
+                    return
+        except _CONNECT_ERRORS as e:
+            raise OllamaUnavailable(f"Ollama at {self.base_url} unreachable: {e}") from e
+        except httpx.HTTPError as e:
+            raise OllamaError(f"Ollama request failed: {e}") from e
+
+        # /api/chat turned out to be missing on this host; retry on /api/generate.
+        async for item in self.stream(messages, model, temperature, keep_alive, context, format):
+            yield item
+
+    async def preload(self, model: str, keep_alive=None) -> Completion:
+        """Load `model` into memory without generating anything (empty prompt); returns Ollama's timings."""
+        keep_alive = self.keep_alive if keep_alive is None else keep_alive
+        try:
+            r = await self._http.post("/api/generate", json={"model": model, "prompt": "", "stream": False, **_extra(keep_alive)})
+        except _CONNECT_ERRORS as e:
+            raise OllamaUnavailable(f"Ollama at {self.base_url} unreachable: {e}") from e
+        except httpx.HTTPError as e:
+            raise OllamaError(f"Ollama request failed: {e}") from e
+        _raise_for_model_error(r)
+        if r.status_code != 200:
+            raise OllamaError(f"/api/generate returned HTTP {r.status_code}: {r.text[:200]}")
+        if "application/json" in (r.headers.get("content-type") or "").lower():
+            return Completion.from_ollama("", model, r.json())
+        return _join_ndjson(r.text.splitlines(), model)
+
+    async def embed(self, text: str, model: str) -> list:
+        """Embedding vector for `text` (/api/embed, or /api/embeddings on builds before 0.3)."""
+        try:
+            r = await self._http.post("/api/embed", json={"model": model, "input": text, **_extra(self.keep_alive)})
+            if r.status_code == 404 and not _model_error(r):
+                r = await self._http.post("/api/embeddings", json={"model": model, "prompt": text})
+                _raise_for_model_error(r)
+                r.raise_for_status()
+                return r.json().get("embedding") or []
+        except _CONNECT_ERRORS as e:
+            raise OllamaUnavailable(f"Ollama at {self.base_url} unreachable: {e}") from e
+        except httpx.HTTPError as e:
+            raise OllamaError(f"Ollama embedding request failed: {e}") from e
+        _raise_for_model_error(r)
+        if r.status_code != 200:
+            raise OllamaError(f"/api/embed returned HTTP {r.status_code}: {r.text[:200]}")
+        vectors = r.json().get("embeddings") or [[]]
+        return vectors[0]
+
+    async def version(self):
+        r = await self._http.get("/api/version", timeout=5)
+        r.raise_for_status()
+        return r.json()
+
+    async def tags(self) -> list:
+        r = await self._http.get("/api/tags", timeout=5)
+        r.raise_for_status()
+        # tags schema: {"models":[{"name":"llama3.1",...}, ...]}
+        return [m.get("name") for m in r.json().get("models", []) if m.get("name")]
+
+
+def _model_error(r) -> str:
+    """Ollama answers 404 with a JSON error when the model isn't pulled; that's not a missing endpoint."""
+    if r.status_code != 404:
+        return ""
+    try:
+        err = r.json().get("error", "")
+    except Exception:
+        return ""
+    return err if "model" in err.lower() else ""
+
+
+def _raise_for_model_error(r):
+    err = _model_error(r)
+    if err:
+        raise OllamaError(err)
+
+
+def _join_ndjson(lines, model: str) -> Completion:
+    chunks, last = [], {}
+    for line in lines:
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except Exception:
+            continue
+        if "response" in obj:
+            chunks.append(obj["response"])
+        if obj.get("done"):
+            last = obj
+            break
+    return Completion.from_ollama("".join(chunks), model, last)
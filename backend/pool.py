@@ -0,0 +1,205 @@
+# backend/pool.py
+#
+# Several Ollama hosts behind the same chat()/stream() interface as OllamaClient.
+# Each generation goes to the least-loaded healthy host that has the model, and
+# moves on to the next one if the chosen host can't be reached.
+
+import time, asyncio, logging
+from health import OllamaHealth
+from metrics import BACKEND_FAILURES, BACKEND_INFLIGHT, BACKEND_SECONDS
+from ollama_client import Completion, OllamaClient, OllamaError, OllamaUnavailable
+
+log = logging.getLogger("gig_helper.pool")
+
+
+class Backend:
+    """One Ollama host: its client, health poller and load/latency bookkeeping."""
+
+    def __init__(self, url: str, timeout: float, max_connections: int, keep_alive=None, **health_kw):
+        self.client = OllamaClient(url, timeout=timeout, max_connections=max_connections, keep_alive=keep_alive)
+        self.health = OllamaHealth(self.client, **health_kw)
+        self.url = self.client.base_url
+        self.inflight = 0
+        self.requests = 0
+        self.failures = 0
+        self.avg_latency = None  # EWMA of successful generation wall time (s)
+        self.last_error = None
+        self.last_used = 0.0  # monotonic time of the last generation started here
+
+    def usable(self, model: str) -> bool:
+        try:
+            self.health.check(model)
+        except OllamaError:
+            return False
+        return True
+
+    def load(self) -> tuple:
+        return (self.inflight, self.avg_latency or 0.0)
+
+    def begin(self):
+        self.inflight += 1
+        self.requests += 1
+        self.last_used = time.monotonic()
+        BACKEND_INFLIGHT.set(self.inflight, backend=self.url)
+
+    def end(self, elapsed=None, error=None):
+        """elapsed for a success, error for a failure; neither when the caller went away."""
+        self.inflight -= 1
+        BACKEND_INFLIGHT.set(self.inflight, backend=self.url)
+        if error is not None:
+            self.failures += 1
+            self.last_error = str(error)
+            BACKEND_FAILURES.inc(backend=self.url, kind="unreachable" if isinstance(error, OllamaUnavailable) else "error")
+            self.health.wake()
+        elif elapsed is not None:
+            self.avg_latency = elapsed if self.avg_latency is None else 0.8 * self.avg_latency + 0.2 * elapsed
+            BACKEND_SECONDS.observe(elapsed, backend=self.url)
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "api": self.client.api,
+            "inflight": self.inflight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "avg_latency_s": round(self.avg_latency, 3) if self.avg_latency is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+class OllamaPool:
+    """
+    Routes generations across Ollama hosts. Hosts the health poller knows to be down,
+    or to lack the model, are skipped; the rest are tried in order of (in-flight
+    generations, average latency). A host that can't be connected to is skipped for
+    the next one; any other error is returned as is, since the request may have run.
+    """
+
+    def __init__(self, urls, timeout: float = 120.0, max_connections: int = 64, keep_alive=None, **health_kw):
+        if not urls:
+            raise ValueError("OllamaPool needs at least one URL")
+        self.backends = [Backend(url, timeout, max_connections, keep_alive, **health_kw) for url in urls]
+        self.failovers = 0
+
+    def start(self):
+        for b in self.backends:
+            b.health.start()
+
+    async def stop(self):
+        await asyncio.gather(*(b.health.stop() for b in self.backends))
+
+    async def aclose(self):
+        await asyncio.gather(*(b.client.aclose() for b in self.backends))
+
+    async def poll(self):
+        await asyncio.gather(*(b.health.poll() for b in self.backends))
+
+    def candidates(self, model: str, prefer: str = None) -> list:
+        """
+        Usable backends, least loaded first; OllamaError (with each host's reason) if there are none.
+        A usable `prefer` host (e.g. the one holding a chat session's warm cache) goes first.
+        """
+        usable = [b for b in self.backends if b.usable(model)]
+        if not usable:
+            reasons = []
+            for b in self.backends:
+                try:
+                    b.health.check(model)
+                except OllamaError as e:
+                    reasons.append(str(e))
+            raise OllamaError("; ".join(reasons))
+        ranked = sorted(usable, key=Backend.load)
+        if prefer:
+            ranked.sort(key=lambda b: b.url != prefer)
+        return ranked
+
+    def check(self, model: str):
+        """Raise OllamaError right away if no backend can serve `model` right now."""
+        self.candidates(model)
+
+    async def chat(self, messages, model: str, temperature: float = 0.5, prefer: str = None, **kw) -> Completion:
+        """kw (keep_alive, context, format) is passed on to OllamaClient.chat."""
+        last = None
+        for attempt, b in enumerate(self.candidates(model, prefer)):
+            if attempt:
+                self.failovers += 1
+                log.warning("retrying on %s after: %s", b.url, last)
+            b.begin()
+            started = time.perf_counter()
+            try:
+                done = await b.client.chat(messages, model=model, temperature=temperature, **kw)
+            except OllamaUnavailable as e:
+                b.end(error=e)
+                last = e
+                continue
+            except OllamaError as e:
+                b.end(error=e)
+                raise
+            except BaseException:
+                b.end()
+                raise
+            b.end(elapsed=time.perf_counter() - started)
+            done.backend = b.url
+            return done
+        raise last
+
+    async def stream(self, messages, model: str, temperature: float = 0.5, prefer: str = None, **kw):
+        """Like OllamaClient.stream; fails over only while no token has been sent yet."""
+        last = None
+        for attempt, b in enumerate(self.candidates(model, prefer)):
+            if attempt:
+                self.failovers += 1
+                log.warning("retrying stream on %s after: %s", b.url, last)
+            b.begin()
+            started = time.perf_counter()
+            sent = False
+            try:
+                async for item in b.client.stream(messages, model=model, temperature=temperature, **kw):
+                    if isinstance(item, Completion):
+                        item.backend = b.url
+                    sent = True
+                    yield item
+            except OllamaUnavailable as e:
+                b.end(error=e)
+                if sent:
+                    raise
+                last = e
+                continue
+            except OllamaError as e:
+                b.end(error=e)
+                raise
+            except BaseException:
+                b.end()
+                raise
+            b.end(elapsed=time.perf_counter() - started)
+            return
+        raise last
+
+    async def embed(self, text: str, model: str) -> list:
+        """OllamaClient.embed on the least-loaded host that has `model`, failing over like chat()."""
+        last = None
+        for b in self.candidates(model):
+            try:
+                return await b.client.embed(text, model)
+            except OllamaUnavailable as e:
+                b.health.wake()
+                last = e
+        raise last
+
+    def snapshot(self, model: str) -> dict:
+        """Combined health view (the first healthy host's version, union of models) plus per-host detail."""
+        views = [(b, b.health.snapshot(model)) for b in self.backends]
+        up = [v for _, v in views if v["ok"]]
+        models = sorted({m for _, v in views for m in v["models"]})
+        present = [v["model_present"] for _, v in views if v["model_present"] is not None]
+        return {
+            "ok": bool(up),
+            "ollama_version": up[0]["ollama_version"] if up else None,
+            "models": models,
+            "model_present": any(present) if present else None,
+            "error": "; ".join(f"{b.url}: {v['error']}" for b, v in views if v["error"]) or None,
+            "backends": [{**b.stats(), **v} for b, v in views],
+        }
+
+    def stats(self) -> dict:
+        return {"failovers": self.failovers, "backends": [b.stats() for b in self.backends]}
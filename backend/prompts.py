@@ -1,5 +1,8 @@
 # backend/prompts.py
 
+import re
+from dataclasses import dataclass
+
 SYSTEM_PROMPT_IMPROVE_GIG = """
 You are a helpful Fiverr Gig Optimization Coach. Your job is to analyze gigs and provide improvement suggestions.
 
@@ -45,6 +48,60 @@ Always be helpful, encouraging, and professional. Provide actionable advice that
 """.strip()
 
 
+# Same seven sections in about a third of the tokens, for when prefill time matters more than polish
+SYSTEM_PROMPT_IMPROVE_GIG_COMPACT = """
+You are a Fiverr gig optimization coach. Analyze the gig and answer in Markdown with these sections:
+
+# 🚀 Fiverr Gig Optimization Analysis
+## 1. **Current Weaknesses & Fiverr-Unfriendly Elements** (❌ bullets)
+## 2. **Stronger Title with Keywords** (✅ title, then **Why this works:**)
+## 3. **Rewritten Description** (hook + benefits + call to action)
+## 4. **SEO Tags** (6 tags, • separated)
+## 5. **Relevant FAQs** (**Q:** / **A:** pairs)
+## 6. **Step-by-Step Implementation Checklist** (**Step N:** lines)
+## 7. **Why These Improvements Help** (• bullets)
+
+Be specific, encouraging and actionable.
+""".strip()
+
+
+# Structured mode: the answer is constrained to GigImprovement's JSON schema and rendered by the server
+SYSTEM_PROMPT_IMPROVE_GIG_JSON = """
+You are a Fiverr gig optimization coach. Analyze the gig and answer with one JSON object:
+- weaknesses: specific problems with the current title and description
+- suggested_title: a stronger, keyword-rich title (50-70 characters, no "I will")
+- suggested_description: a rewritten description with a hook, 3-5 benefit bullets (•) and a call to action
+- tags: 5-6 SEO tags
+- faqs: 2-3 objects with q and a
+- step_by_step: an implementation checklist
+- reasons: why these changes help
+""".strip()
+
+
+SYSTEM_PROMPT_CHAT_GIG = """
+You are a helpful Fiverr Gig Optimization Coach. Users can ask you follow-up questions about their gig improvements.
+
+Examples of requests you can handle:
+- "Make it more formal" - Rewrite the title/description in a more professional tone
+- "Add more benefits" - Add more benefit bullets to the description
+- "Make it shorter" - Create a more concise version
+- "Add more keywords" - Suggest additional SEO keywords
+- "Make it more casual" - Rewrite in a more friendly, approachable tone
+- "Focus on [specific benefit]" - Emphasize a particular benefit or feature
+
+Always provide helpful, actionable responses. If the user asks for changes, provide the updated content in the same format as the original analysis.
+""".strip()
+
+
+SYSTEM_PROMPT_CHAT_GIG_COMPACT = (
+    "You are a Fiverr gig optimization coach. Answer follow-up requests about the user's gig "
+    "(tone, length, benefits, keywords). When asked for changes, give the updated title/description."
+)
+
+
+SYSTEM_PROMPT_REPLY = "You are a professional Fiverr seller assistant. Output JSON with keys: summary, reply, clarifying_questions[], next_steps[]."
+
+
 USER_PROMPT_IMPROVE_GIG = """
 Niche: {niche}
 Current Title: {title}
@@ -54,6 +111,15 @@ Goal: Analyze this gig and provide comprehensive improvement suggestions in natu
 """.strip()
 
 
+USER_PROMPT_IMPROVE_GIG_JSON = """
+Niche: {niche}
+Current Title: {title}
+Current Description: {description}
+
+Return the JSON object only.
+""".strip()
+
+
 USER_PROMPT_CREATE_FROM_SCRATCH = """
 Niche: {niche}
 Buyer: {buyer}
@@ -65,13 +131,30 @@ Goal: Create a brand new Fiverr gig from scratch and provide comprehensive sugge
 """.strip()
 
 
-def build_user_prompt_for_improve(niche: str = "", title: str = "", description: str = "") -> str:
-    """Use when you captured fields from the Fiverr edit page."""
-    return USER_PROMPT_IMPROVE_GIG.format(
-        niche=niche or "General freelancing service",
-        title=title or "",
-        description=description or ""
-    )
+USER_PROMPT_CREATE_FROM_SCRATCH_JSON = (
+    USER_PROMPT_CREATE_FROM_SCRATCH.rsplit("\n\n", 1)[0]
+    + "\n\nGoal: Create a brand new Fiverr gig from scratch. Return the JSON object only."
+)
+
+
+USER_PROMPT_CHAT_GIG = """
+Current Gig:
+Title: {title}
+Description: {description}
+Niche: {niche}
+
+User Request: {user_message}
+
+Please help the user with their request. Provide specific, actionable advice or updated content.
+""".strip()
+
+
+USER_PROMPT_REPLY = """
+Tone: {tone}
+Context: {context}
+Buyer message: {buyer_message}
+Return JSON only.
+""".strip()
 
 
 def build_user_prompt_from_scratch(
@@ -79,10 +162,12 @@ def build_user_prompt_from_scratch(
     buyer: str = "",
     deliverables: str = "",
     turnaround: str = "",
-    proof: str = ""
+    proof: str = "",
+    structured: bool = False
 ) -> str:
     """Use when the user has nothing yet and filled a short form in the popup."""
-    return USER_PROMPT_CREATE_FROM_SCRATCH.format(
+    template = USER_PROMPT_CREATE_FROM_SCRATCH_JSON if structured else USER_PROMPT_CREATE_FROM_SCRATCH
+    return template.format(
         niche=niche or "General freelancing service",
         buyer=buyer or "Small businesses and startups",
         deliverables=deliverables or "Clear, specific deliverables list",
@@ -90,3 +175,120 @@ def build_user_prompt_from_scratch(
         proof=proof or "3+ years experience"
     )
 
+
+# ---------- Token budget ----------
+#
+# Descriptions and buyer messages pasted from Fiverr can be arbitrarily long, and every
+# token of the prompt is paid for in prefill before the first answer token. The
+# *_prompt() builders below render a route's messages within an input budget: whitespace
+# is always squeezed, and if the estimate is still over budget the listed free-text
+# fields are cut (keeping their opening and closing sentences) until it fits.
+
+TRUNCATION_MARK = " […] "
+MIN_FIELD_TOKENS = 32  # never cut a field below this, even if the budget is still exceeded
+
+
+@dataclass
+class Prompt:
+    messages: list
+    tokens: int  # estimated tokens of the whole prompt (system + user)
+    budget: int  # 0 = unlimited
+    truncated: list  # names of the fields that were shortened to fit
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: ~4 characters per token for English with Llama-style tokenizers."""
+    return (len(text or "") + 3) // 4
+
+
+def squeeze_whitespace(text: str) -> str:
+    """Collapse runs of spaces/tabs, strip line ends, and keep at most one blank line in a row."""
+    text = re.sub(r"[ \t\u00a0]+", " ", text or "")
+    text = re.sub(r" ?\n ?", "\n", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+
+def shorten(text: str, max_tokens: int) -> str:
+    """
+    Cut text to about max_tokens by dropping whole sentences from the middle: a gig
+    description's hook is at the top and its call to action at the bottom, so about
+    two thirds of the budget go to the opening sentences and the rest to the closing ones.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    sentences = [s for s in _SENTENCE_END.split(text) if s.strip()]
+    room = max_tokens * 4 - len(TRUNCATION_MARK)
+    head, tail, used = [], [], 0
+    for s in sentences:
+        if used + len(s) + 1 > room * 2 // 3:
+            break
+        head.append(s)
+        used += len(s) + 1
+    for s in reversed(sentences[len(head):]):
+        if used + len(s) + 1 > room:
+            break
+        tail.insert(0, s)
+        used += len(s) + 1
+    if not head:  # one huge "sentence" (no punctuation): cut on characters instead
+        return text[: room * 2 // 3].rstrip() + TRUNCATION_MARK + (text[-(room // 3):].lstrip() if room > 2 else "")
+    return " ".join(head) + TRUNCATION_MARK + " ".join(tail)
+
+
+def fit_prompt(system: str, template: str, fields: dict, budget: int = 0, shrink=()) -> Prompt:
+    """
+    Render system + template.format(**fields) within `budget` estimated tokens by shortening
+    the `shrink` fields, longest first. The fixed parts are never cut, so a tiny budget can
+    still be exceeded; the returned estimate says by how much.
+    """
+    fields = {k: squeeze_whitespace(str(v)) for k, v in fields.items()}
+    truncated = []
+    fixed = estimate_tokens(system) + estimate_tokens(template.format(**{k: "" for k in fields}))
+    if budget:
+        over = fixed + sum(estimate_tokens(v) for v in fields.values()) - budget
+        for name in sorted(shrink, key=lambda k: -len(fields.get(k, ""))):
+            if over <= 0:
+                break
+            have = estimate_tokens(fields.get(name, ""))
+            keep = max(MIN_FIELD_TOKENS, have - over)
+            if keep < have:
+                fields[name] = shorten(fields[name], keep)
+                truncated.append(name)
+                over -= have - estimate_tokens(fields[name])
+    user = template.format(**fields)
+    messages = [{"role": "system", "content": system}, {"role": "user", "content": user}]
+    return Prompt(messages, estimate_tokens(system) + estimate_tokens(user), budget, truncated)
+
+
+def _improve_system(compact: bool, structured: bool) -> str:
+    if structured:
+        return SYSTEM_PROMPT_IMPROVE_GIG_JSON
+    return SYSTEM_PROMPT_IMPROVE_GIG_COMPACT if compact else SYSTEM_PROMPT_IMPROVE_GIG
+
+
+def improve_prompt(niche: str = "", title: str = "", description: str = "", budget: int = 0,
+                   compact: bool = False, structured: bool = False) -> Prompt:
+    template = USER_PROMPT_IMPROVE_GIG_JSON if structured else USER_PROMPT_IMPROVE_GIG
+    fields = {"niche": niche or "General freelancing service", "title": title or "", "description": description or ""}
+    return fit_prompt(_improve_system(compact, structured), template, fields, budget, shrink=("description", "title"))
+
+
+def scratch_prompt(budget: int = 0, compact: bool = False, structured: bool = False, **form) -> Prompt:
+    system = _improve_system(compact, structured)
+    user = build_user_prompt_from_scratch(structured=structured, **form)
+    return fit_prompt(system, "{user}", {"user": user}, budget)
+
+
+def chat_prompt(title: str = "", description: str = "", niche: str = "", user_message: str = "",
+                budget: int = 0, compact: bool = False) -> Prompt:
+    system = SYSTEM_PROMPT_CHAT_GIG_COMPACT if compact else SYSTEM_PROMPT_CHAT_GIG
+    fields = {"title": title, "description": description, "niche": niche, "user_message": user_message}
+    return fit_prompt(system, USER_PROMPT_CHAT_GIG, fields, budget, shrink=("description", "user_message"))
+
+
+def reply_prompt(tone: str = "friendly", context: str = "", buyer_message: str = "", budget: int = 0) -> Prompt:
+    # the reply system prompt is one line already; it has no compact variant
+    fields = {"tone": tone, "context": context, "buyer_message": buyer_message}
+    return fit_prompt(SYSTEM_PROMPT_REPLY, USER_PROMPT_REPLY, fields, budget, shrink=("context", "buyer_message"))
@@ -0,0 +1,76 @@
+# backend/schemas.py
+#
+# Pydantic models for the routes that can ask Ollama for schema-constrained JSON
+# (the `format` parameter), plus helpers that work on Pydantic v1 and v2 alike.
+
+import json
+from typing import List
+from pydantic import BaseModel, ValidationError # type: ignore
+from jsonextract import extract_json
+
+
+class SchemaError(ValueError):
+    """Model output that doesn't parse or doesn't match the schema; the message says what's wrong."""
+
+
+class ReplySuggestion(BaseModel):
+    summary: str
+    reply: str
+    clarifying_questions: List[str] = []
+    next_steps: List[str] = []
+
+
+class FAQ(BaseModel):
+    q: str
+    a: str
+
+
+class GigImprovement(BaseModel):
+    # the keys convert_json_to_natural_language renders
+    weaknesses: List[str] = []
+    suggested_title: str
+    suggested_description: str
+    tags: List[str]
+    faqs: List[FAQ] = []
+    step_by_step: List[str] = []
+    reasons: List[str] = []
+
+
+def json_schema(model) -> dict:
+    """JSON schema for Ollama's `format`, with every field listed as required so the model fills them all."""
+    schema = model.model_json_schema() if hasattr(model, "model_json_schema") else model.schema()
+    schema = json.loads(json.dumps(schema))  # private copy: Pydantic caches the v1 dict
+
+    def require_all(node):
+        if isinstance(node, dict):
+            if node.get("type") == "object" and "properties" in node:
+                node["required"] = list(node["properties"])
+            for value in node.values():
+                require_all(value)
+        elif isinstance(node, list):
+            for value in node:
+                require_all(value)
+
+    require_all(schema)
+    return schema
+
+
+def validate(model, text: str) -> dict:
+    """Parse `text` (lenient: fences, prose and truncation tolerated) into `model`; SchemaError if it can't."""
+    data = extract_json(text or "")
+    if not isinstance(data, dict):
+        raise SchemaError("the answer is not a JSON object")
+    try:
+        obj = model.model_validate(data) if hasattr(model, "model_validate") else model.parse_obj(data)
+    except ValidationError as e:
+        problems = "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+        raise SchemaError(problems) from e
+    return obj.model_dump() if hasattr(obj, "model_dump") else obj.dict()
+
+
+def repair_request(error: SchemaError) -> str:
+    """Follow-up user turn asking the model to fix its own JSON."""
+    return (
+        f"Your JSON did not match the required schema ({error}). "
+        "Return the corrected JSON object only, with every field filled in."
+    )
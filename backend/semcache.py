@@ -0,0 +1,124 @@
+# backend/semcache.py
+#
+# Near-duplicate lookup in front of the exact response cache. Gigs in one niche are
+# often reworded copies of each other, so their cache keys never match; here each
+# answered gig's embedding is kept with the exact-cache key of its answer, and a new
+# gig whose embedding is close enough reuses that answer.
+#
+# Vectors live in a fixed-size ring (capacity x dim float32) memory-mapped from
+# `<path>.f32`; which row belongs to which answer is kept in `<path>.db`. Lookup is
+# one matrix-vector product over the ring.
+
+import os, sqlite3, threading
+import numpy as np # type: ignore
+
+
+class SemanticIndex:
+    """
+    Unit-normalised embeddings with the cache key and namespace (prompt variant) each
+    one answers. path="" keeps everything in memory. The dimension is fixed by the
+    first vector added (or found on disk); a different dimension later (another
+    embedding model) starts the index afresh.
+    """
+
+    def __init__(self, path: str = "semantic", capacity: int = 20000):
+        self.path = path
+        self.capacity = capacity
+        self.dim = None
+        self._vectors = None
+        self._keys = [None] * capacity
+        self._ns = np.full(capacity, -1, dtype=np.int32)  # namespace id per row, -1 = empty
+        self._ns_ids = {}
+        self._next = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(f"{path}.db" if path else ":memory:", check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS rows (row INTEGER PRIMARY KEY, key TEXT NOT NULL, namespace TEXT NOT NULL)")
+        self._db.commit()
+        self._load()
+
+    def _load(self):
+        meta = dict(self._db.execute("SELECT name, value FROM meta").fetchall())
+        if "dim" not in meta or int(meta.get("capacity", 0)) != self.capacity:
+            return
+        self._open(int(meta["dim"]), fresh=False)
+        self._next = int(meta.get("next", 0))
+        for row, key, namespace in self._db.execute("SELECT row, key, namespace FROM rows WHERE row < ?", (self.capacity,)):
+            self._keys[row] = key
+            self._ns[row] = self._namespace_id(namespace)
+
+    def _open(self, dim: int, fresh: bool):
+        self.dim = dim
+        file = f"{self.path}.f32" if self.path else ""
+        if not file:
+            self._vectors = np.zeros((self.capacity, dim), dtype=np.float32)
+        else:
+            exists = os.path.exists(file) and os.path.getsize(file) == self.capacity * dim * 4
+            self._vectors = np.memmap(file, dtype=np.float32, mode="r+" if exists and not fresh else "w+",
+                                      shape=(self.capacity, dim))
+
+    def _reset(self, dim: int):
+        self._keys = [None] * self.capacity
+        self._ns[:] = -1
+        self._ns_ids = {}
+        self._next = 0
+        self._db.execute("DELETE FROM rows")
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?), ('capacity', ?), ('next', 0)", (str(dim), str(self.capacity)))
+        self._db.commit()
+        self._open(dim, fresh=True)
+
+    def _namespace_id(self, namespace: str) -> int:
+        return self._ns_ids.setdefault(namespace, len(self._ns_ids))
+
+    @staticmethod
+    def _unit(vector):
+        v = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(v))
+        return v / norm if norm else v
+
+    def search(self, vector, namespace: str):
+        """(similarity, cache key) of the closest vector in `namespace`, or (0.0, None)."""
+        with self._lock:
+            ns = self._ns_ids.get(namespace)
+            if ns is None or self._vectors is None or len(vector) != self.dim:
+                return 0.0, None
+            mask = self._ns == ns
+            if not mask.any():
+                return 0.0, None
+            # over the whole ring (no copy of the matching rows); other namespaces are masked out
+            sims = np.where(mask, self._vectors @ self._unit(vector), -1.0)
+            best = int(np.argmax(sims))
+            return float(sims[best]), self._keys[best]
+
+    def add(self, vector, namespace: str, key: str):
+        """Store vector -> key, overwriting the oldest row once the ring is full."""
+        with self._lock:
+            if self.dim != len(vector):
+                self._reset(len(vector))
+            row = self._next
+            self._vectors[row] = self._unit(vector)
+            self._keys[row] = key
+            self._ns[row] = self._namespace_id(namespace)
+            self._next = (row + 1) % self.capacity
+            self._db.execute("INSERT OR REPLACE INTO rows VALUES (?, ?, ?)", (row, key, namespace))
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('next', ?)", (str(self._next),))
+            self._db.commit()
+
+    def flush(self):
+        with self._lock:
+            if isinstance(self._vectors, np.memmap):
+                self._vectors.flush()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._db.close()
+
+    def stats(self) -> dict:
+        return {
+            "entries": int((self._ns >= 0).sum()),
+            "capacity": self.capacity,
+            "dim": self.dim,
+            "namespaces": len(self._ns_ids),
+            "bytes": self.capacity * (self.dim or 0) * 4,
+        }
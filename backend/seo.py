@@ -0,0 +1,193 @@
+# backend/seo.py
+#
+# SEO checks behind /seo_score, plus a columnar bulk scorer for whole catalog
+# scrapes (NDJSON or CSV in, NDJSON out, constant memory):
+#
+#   python seo.py gigs.csv > scores.ndjson
+#   cat gigs.ndjson | python seo.py - --format ndjson > scores.ndjson
+
+import sys, csv, json, time, argparse
+import numpy as np # type: ignore
+
+TIP_TITLE = "Aim 50–70 chars for the title."
+TIP_KEYWORD = "Put the primary keyword in the first 100 chars."
+TIP_FEW_BULLETS = "Add at least 3 benefit bullets (start with •)."
+TIP_MANY_BULLETS = "Keep bullets to 3–5 for clarity."
+TIP_WORDS = "Keep description 120–250 words."
+
+CHUNK_ROWS = 5000
+
+
+def field(row: dict, name: str) -> str:
+    """A text field of a gig: missing/null -> "", numbers as text; any other type is a ValueError."""
+    value = row.get(name)
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        return str(value)
+    raise ValueError(f"{name} must be a string, not {type(value).__name__}")
+
+
+def normalize(row: dict):
+    """(title, description, primary_kw) the way /seo_score reads them; ValueError for unusable fields."""
+    return (
+        field(row, "title").strip(),
+        field(row, "description").strip(),
+        field(row, "primary_kw").strip().lower(),
+    )
+
+
+def count_bullets(desc: str) -> int:
+    return len([ln for ln in desc.splitlines() if ln.strip().startswith(("•", "-"))])
+
+
+def score_gig(title: str, desc: str, primary_kw: str) -> dict:
+    """Score one gig (inputs already normalized)."""
+    score = 0
+    score += 10 if 50 <= len(title) <= 70 else 0
+    score += 10 if primary_kw and primary_kw in desc[:100].lower() else 0
+    bullets = count_bullets(desc)
+    score += 10 if 3 <= bullets <= 5 else 0
+    score += 10 if 120 <= len(desc.split()) <= 250 else 0
+
+    tips = []
+    if not (50 <= len(title) <= 70): tips.append(TIP_TITLE)
+    if primary_kw and primary_kw not in desc[:100].lower(): tips.append(TIP_KEYWORD)
+    if bullets < 3: tips.append(TIP_FEW_BULLETS)
+    if bullets > 5: tips.append(TIP_MANY_BULLETS)
+    if not (120 <= len(desc.split()) <= 250): tips.append(TIP_WORDS)
+
+    return {"score": score, "bullets": bullets, "tips": tips}
+
+
+def score_columns(titles, descs, kws):
+    """
+    Same checks as score_gig over whole columns at once. String features are pulled
+    out in one pass per column; the scoring and tip logic is NumPy array math.
+    Returns (score, bullets, tip_masks) where tip_masks pairs each tip with a bool array.
+    """
+    n = len(titles)
+    title_len = np.fromiter(map(len, titles), dtype=np.int32, count=n)
+    words = np.fromiter((len(d.split()) for d in descs), dtype=np.int32, count=n)
+    bullets = np.fromiter(map(count_bullets, descs), dtype=np.int32, count=n)
+    has_kw = np.fromiter(map(bool, kws), dtype=bool, count=n)
+    kw_hit = np.fromiter((bool(k) and k in d[:100].lower() for k, d in zip(kws, descs)), dtype=bool, count=n)
+
+    title_ok = (title_len >= 50) & (title_len <= 70)
+    bullets_ok = (bullets >= 3) & (bullets <= 5)
+    words_ok = (words >= 120) & (words <= 250)
+    score = 10 * (title_ok.astype(np.int32) + kw_hit + bullets_ok + words_ok)
+
+    tip_masks = [
+        (TIP_TITLE, ~title_ok),
+        (TIP_KEYWORD, has_kw & ~kw_hit),
+        (TIP_FEW_BULLETS, bullets < 3),
+        (TIP_MANY_BULLETS, bullets > 5),
+        (TIP_WORDS, ~words_ok),
+    ]
+    return score, bullets, tip_masks
+
+
+def score_chunk(rows):
+    """
+    Score a chunk of (row_number, row_or_error) pairs; yields one result dict per row,
+    in order. Rows that failed to parse or have unusable fields come through as their error.
+    """
+    rows = list(rows)
+    good, fields = [], []
+    for n, (i, row) in enumerate(rows):
+        if isinstance(row, dict):
+            try:
+                fields.append(normalize(row))
+            except ValueError as e:
+                rows[n] = (i, e)
+                continue
+            good.append((i, row))
+    if good:
+        titles, descs, kws = zip(*fields)
+        score, bullets, tip_masks = score_columns(titles, descs, kws)
+        score, bullets = score.tolist(), bullets.tolist()
+        masks = [(tip, mask.tolist()) for tip, mask in tip_masks]
+    scored = {}
+    for k, (i, row) in enumerate(good):
+        out = {"row": i}
+        if "id" in row:
+            out["id"] = row["id"]
+        out.update(score=score[k], bullets=bullets[k], tips=[tip for tip, mask in masks if mask[k]])
+        scored[i] = out
+    for i, row in rows:
+        yield scored[i] if i in scored else {"row": i, "error": str(row)}
+
+
+def chunked(iterable, size: int = CHUNK_ROWS):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ---------- Input parsing ----------
+
+def parse_ndjson_line(line: str):
+    """A row dict, or a ValueError describing why the line was rejected."""
+    try:
+        row = json.loads(line)
+    except ValueError as e:
+        return ValueError(f"invalid JSON: {e}")
+    return row if isinstance(row, dict) else ValueError("expected a JSON object")
+
+
+def iter_ndjson(lines):
+    """(row_number, row_or_error) for each non-blank NDJSON line."""
+    n = 0
+    for line in lines:
+        if line.strip():
+            yield n, parse_ndjson_line(line)
+            n += 1
+
+
+def iter_csv(lines):
+    """(row_number, row) for each CSV record; the header row names the columns."""
+    for n, row in enumerate(csv.DictReader(lines)):
+        yield n, row
+
+
+def render(rows, chunk_size: int = CHUNK_ROWS):
+    """Score (row_number, row) pairs chunk by chunk; yields (rows_in_chunk, ndjson_text)."""
+    for chunk in chunked(rows, chunk_size):
+        yield len(chunk), "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in score_chunk(chunk))
+
+
+# ---------- CLI ----------
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Bulk SEO scoring: NDJSON/CSV gigs in, NDJSON scores out.")
+    ap.add_argument("input", help="input file, or - for stdin")
+    ap.add_argument("--format", choices=["ndjson", "csv"], help="input format (default: from the file extension)")
+    ap.add_argument("--chunk-size", type=int, default=CHUNK_ROWS, help="rows scored per batch")
+    args = ap.parse_args(argv)
+
+    fmt = args.format or ("csv" if args.input.lower().endswith(".csv") else "ndjson")
+    src = sys.stdin if args.input == "-" else open(args.input, newline="", encoding="utf-8")
+    rows = iter_csv(src) if fmt == "csv" else iter_ndjson(src)
+
+    started = time.perf_counter()
+    total = 0
+    for n, text in render(rows, args.chunk_size):
+        sys.stdout.write(text)
+        total += n
+    sys.stdout.flush()
+
+    elapsed = time.perf_counter() - started
+    rate = total / elapsed if elapsed else 0.0
+    print(f"scored {total} rows in {elapsed:.2f}s ({rate:,.0f} rows/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# backend/sessions.py
+#
+# Server-held /chat_gig conversations. A session keeps its messages in a stable
+# order (system prompt, gig + first request, then each turn appended), so every
+# follow-up shares the previous prompt as a prefix and Ollama only has to evaluate
+# the new turn. It also remembers the host that served it and, on generate-only
+# hosts, the returned token context.
+
+import time, uuid
+from collections import OrderedDict
+
+
+class SessionBusy(Exception):
+    """A turn for this session is still being generated."""
+
+
+class ChatSession:
+    def __init__(self, sid: str, gig: tuple):
+        self.id = sid
+        self.gig = gig  # (title, description, niche) the conversation started from
+        self.messages = []
+        self.context = None
+        self.backend = None
+        self.turns = []  # per-turn prompt stats: what each follow-up actually cost
+        self.created = time.time()
+        self.last_used = time.monotonic()
+        self.busy_since = None
+
+    def acquire(self, stale_after: float):
+        """Mark a turn as running; SessionBusy if one already is (and isn't stale)."""
+        now = time.monotonic()
+        if self.busy_since is not None and now - self.busy_since < stale_after:
+            raise SessionBusy(f"session {self.id} is still answering the previous message")
+        self.busy_since = now
+        self.last_used = now
+
+    def release(self):
+        self.busy_since = None
+        self.last_used = time.monotonic()
+
+    def record(self, messages, done, max_turns: int):
+        """Keep the finished turn: history, the host and context that now hold it, and its prompt cost."""
+        self.messages = messages + [{"role": "assistant", "content": done.text}]
+        # a cached answer never reached Ollama: keep the host, but no context covers this turn
+        self.backend = done.backend or self.backend
+        self.context = done.context
+        self.turns.append({
+            "turn": len(self.turns) + 1,
+            "prompt_eval_count": done.prompt_eval_count,
+            "prompt_eval_ms": round(done.prompt_eval_duration * 1000, 1),
+            "load_ms": round(done.load_duration * 1000, 1),
+            "eval_count": done.eval_count,
+            "backend": done.backend or None,
+        })
+        self._trim(max_turns)
+
+    def _trim(self, max_turns: int):
+        """
+        Bound the history to max_turns exchanges after the opening one. Old turns are
+        dropped in one go (down to half) rather than one per turn, so the shared prompt
+        prefix (and the warm cache behind it) only changes every max_turns/2 turns.
+        """
+        head, rest = self.messages[:2], self.messages[2:]  # system + opening request
+        opening_answer, rest = rest[:1], rest[1:]
+        if len(rest) // 2 <= max_turns:
+            return
+        keep = max(1, max_turns // 2) * 2
+        self.messages = head + opening_answer + rest[-keep:]
+        self.context = None  # the saved context still covers the dropped turns
+
+    def info(self) -> dict:
+        return {
+            "id": self.id,
+            "turns": len(self.turns),
+            "history_messages": len(self.messages),
+            "backend": self.backend,
+            "has_context": bool(self.context),
+            "prompt_stats": self.turns,
+        }
+
+
+class SessionStore:
+    """
+    In-memory sessions, LRU-bounded to max_sessions and expired after ttl seconds idle.
+    """
+
+    def __init__(self, max_sessions: int = 1000, max_turns: int = 12, ttl: float = 3600, busy_timeout: float = 120):
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self.busy_timeout = busy_timeout
+        self._sessions = OrderedDict()
+        self.created = 0
+        self.evicted = 0
+        self.expired = 0
+
+    def get(self, sid: str):
+        s = self._sessions.get(sid)
+        if s is None:
+            return None
+        if time.monotonic() - s.last_used > self.ttl:
+            del self._sessions[sid]
+            self.expired += 1
+            return None
+        self._sessions.move_to_end(sid)
+        return s
+
+    def open(self, sid: str, gig: tuple) -> ChatSession:
+        """
+        The session for sid, or a new one (with a fresh id) if sid is unknown or expired.
+        A session whose gig was edited since it started is replaced, since its history no
+        longer matches the page.
+        """
+        self._expire()
+        s = self.get(sid) if sid else None
+        if s is not None:
+            if not any(gig) or gig == s.gig:
+                return s
+            del self._sessions[s.id]
+        s = ChatSession(uuid.uuid4().hex, gig)
+        self._sessions[s.id] = s
+        self._sessions.move_to_end(s.id)
+        self.created += 1
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+        return s
+
+    def _expire(self):
+        """Drop idle sessions from the LRU end; stops at the first one still in use."""
+        now = time.monotonic()
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used <= self.ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.expired += 1
+
+    def close(self, sid: str) -> bool:
+        return self._sessions.pop(sid, None) is not None
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "max_turns": self.max_turns,
+            "created": self.created,
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
@@ -0,0 +1,331 @@
+# backend/tagindex.py
+#
+# Niche -> keyword/tag frequencies for /suggest_tags and the keyword coverage check in
+# /seo_score, built offline from gig corpora and from the tags the model has already
+# suggested (harvested to an NDJSON log by the server):
+#
+#   python tagindex.py tags.idx tags.ndjson gigs.csv more_gigs.ndjson
+#
+# The index is one binary file: a small JSON header (niche names, array layout) followed
+# by flat uint32 arrays that are memory-mapped, so loading is instant and a lookup only
+# touches one niche's postings.
+
+import os, re, sys, json, time, queue, logging, argparse, threading
+from collections import Counter, defaultdict
+import numpy as np # type: ignore
+from draft import keywords
+from seo import field, iter_csv, iter_ndjson
+
+log = logging.getLogger("gig_helper.tags")
+
+MAGIC = b"GIGTAGS1"
+KINDS = ("tags", "keywords")
+# postings kept per niche and kind; more than any client asks for
+MAX_TERMS = 200
+# a loosely matching niche ("logo") merges at most this many indexed niches, the ones with most gigs
+MATCH_NICHES = 8
+
+_SPACE = re.compile(r"\s+")
+_PUNCT = re.compile(r"[#_-]+")
+_WORD = re.compile(r"[a-z0-9+#]+")
+
+
+def norm(text: str) -> str:
+    """Lowercase, single-spaced, hyphens as spaces, no hashtags: how niches and tags are compared."""
+    return _SPACE.sub(" ", _PUNCT.sub(" ", (text or "").lower())).strip(" ,.;|")
+
+
+def split_tags(tags) -> list:
+    """A list, or a comma/pipe separated string (CSV corpora), as distinct normalized tags."""
+    if isinstance(tags, str):
+        tags = re.split(r"[,|]", tags)
+    out = []
+    for tag in tags if isinstance(tags, list) else []:
+        tag = norm(tag) if isinstance(tag, str) else ""
+        if tag and tag not in out:
+            out.append(tag)
+    return out
+
+
+def contains(text: str, term: str) -> bool:
+    """Whole-word (or whole-phrase) match of a normalized term in normalized text."""
+    return re.search(rf"(?<![a-z0-9]){re.escape(term)}(?![a-z0-9])", text) is not None
+
+
+# ---------- Harvesting ----------
+
+class TagLog:
+    """
+    Appends (niche, title, description, tags) of answered gigs to an NDJSON file for the next
+    build. append() only queues the line; a writer thread does the file I/O, so it is safe to
+    call from the event loop. close() writes what is still queued.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lines = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._writer = None
+
+    def append(self, niche: str, title: str, description: str, tags):
+        tags = split_tags(tags)
+        if not self.path or not tags or not norm(niche):
+            return
+        self._lines.put(json.dumps({"niche": niche, "title": title, "description": description, "tags": tags}, ensure_ascii=False))
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write, name="tag-log", daemon=True)
+                self._writer.start()
+
+    def _write(self):
+        line = self._lines.get()
+        while line is not None:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    while line is not None:
+                        f.write(line + "\n")
+                        if self._lines.empty():
+                            f.flush()
+                        line = self._lines.get()
+            except OSError as e:
+                log.warning("tag log %s unwritable: %s", self.path, e)
+                line = self._lines.get()
+
+    def close(self):
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._lines.put(None)
+            writer.join()
+
+
+# ---------- Building ----------
+
+def count_rows(rows, seen: set = None):
+    """
+    Per niche: gig count and Counters of tags and title/description keywords, plus how many
+    rows were unusable (not an object, or a niche/title/description that isn't text). A gig
+    seen before (same niche, title and description; the tag log repeats cached answers) is skipped.
+    """
+    docs, bad = Counter(), 0
+    counts = {kind: defaultdict(Counter) for kind in KINDS}
+    seen = set() if seen is None else seen
+    for _, row in rows:
+        try:
+            if not isinstance(row, dict):
+                raise ValueError("expected a JSON object")
+            niche = norm(field(row, "niche") or field(row, "category"))
+            title, description = field(row, "title"), field(row, "description")
+        except ValueError:
+            bad += 1
+            continue
+        gig = hash((niche, norm(title), norm(description)))
+        if not niche or gig in seen:
+            continue
+        seen.add(gig)
+        docs[niche] += 1
+        counts["tags"][niche].update(split_tags(row.get("tags")))
+        counts["keywords"][niche].update(keywords(title, description, limit=10))
+    return docs, counts, bad
+
+
+def build(docs: Counter, counts: dict, path: str) -> dict:
+    """Write the index file (atomically) and return its header."""
+    niches = sorted(docs)
+    terms = sorted({t for kind in KINDS for c in counts[kind].values() for t in c})
+    term_id = {t: i for i, t in enumerate(terms)}
+    encoded = [t.encode("utf-8") for t in terms]
+
+    arrays = {
+        "term_offsets": np.cumsum([0] + [len(b) for b in encoded], dtype=np.uint32),
+        "term_blob": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        "docs": np.array([docs[n] for n in niches], dtype=np.uint32),
+    }
+    for kind in KINDS:
+        start, term, count = [0], [], []
+        for niche in niches:
+            top = counts[kind][niche].most_common(MAX_TERMS)
+            term += [term_id[t] for t, _ in top]
+            count += [c for _, c in top]
+            start.append(len(term))
+        arrays[f"{kind}_start"] = np.array(start, dtype=np.uint32)
+        arrays[f"{kind}_term"] = np.array(term, dtype=np.uint32)
+        arrays[f"{kind}_count"] = np.array(count, dtype=np.uint32)
+
+    layout, offset = {}, 0
+    for name, arr in arrays.items():
+        layout[name] = [offset, arr.dtype.str, len(arr)]
+        offset += arr.nbytes + (-arr.nbytes % 8)
+    header = json.dumps({"niches": niches, "arrays": layout, "built_at": time.time()}).encode("utf-8")
+    header += b" " * (-(len(MAGIC) + 8 + len(header)) % 8)
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + len(header).to_bytes(8, "little") + header)
+        for arr in arrays.values():
+            f.write(arr.tobytes() + b"\0" * (-arr.nbytes % 8))
+    os.replace(tmp, path)
+    return json.loads(header)
+
+
+# ---------- Lookup ----------
+
+class TagIndex:
+    """Read side of a built index file; every lookup is a dict probe plus a slice of the mapped arrays."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a tag index")
+            size = int.from_bytes(f.read(8), "little")
+            header = json.loads(f.read(size))
+        base = len(MAGIC) + 8 + size
+        self.built_at = header.get("built_at")
+        self.niches = header["niches"]
+        self._niche_id = {n: i for i, n in enumerate(self.niches)}
+        by_word = defaultdict(list)
+        for i, niche in enumerate(self.niches):
+            for word in set(_WORD.findall(niche)):
+                by_word[word].append(i)
+        self._by_word = {w: np.array(ids, dtype=np.int64) for w, ids in by_word.items()}  # niche word -> ids of niches containing it
+        self._a = {
+            name: np.memmap(path, dtype=np.dtype(dtype), mode="r", offset=base + offset, shape=(length,)) if length else np.zeros(0, dtype=dtype)
+            for name, (offset, dtype, length) in header["arrays"].items()
+        }
+        self._offsets = self._a["term_offsets"]
+
+    def term(self, i: int) -> str:
+        return bytes(self._a["term_blob"][self._offsets[i]:self._offsets[i + 1]]).decode("utf-8")
+
+    def match(self, niche: str):
+        """
+        (label, niche ids) for a niche as typed: the exact niche if indexed, otherwise
+        the indexed niches sharing the most words with it (e.g. "minimal logo design"
+        -> "logo design"), at most MATCH_NICHES of them, most gigs first. (None, []) when
+        nothing matches.
+        """
+        key = norm(niche)
+        if key in self._niche_id:
+            return key, [self._niche_id[key]]
+        hits = [self._by_word[w] for w in set(_WORD.findall(key)) if w in self._by_word]
+        if not hits:
+            return None, []
+        if len(hits) == 1:
+            ids = hits[0]
+        else:
+            ids, overlap = np.unique(np.concatenate(hits), return_counts=True)
+            ids = ids[overlap == overlap.max()]
+        if len(ids) > MATCH_NICHES:
+            ids = ids[np.argsort(-self._a["docs"][ids].astype(np.int64), kind="stable")[:MATCH_NICHES]]
+        ids = ids.tolist()
+        return (self.niches[ids[0]] if len(ids) == 1 else key), ids
+
+    def top(self, ids, kind: str, limit: int) -> list:
+        """[(term, gigs using it, share of gigs)] over the given niches, most used first."""
+        start, terms, counts = self._a[f"{kind}_start"], self._a[f"{kind}_term"], self._a[f"{kind}_count"]
+        if not len(ids):
+            return []
+        if len(ids) == 1:
+            lo, hi = int(start[ids[0]]), int(start[ids[0] + 1])
+            term, count = terms[lo:hi][:limit], counts[lo:hi][:limit]  # stored most used first
+        else:
+            spans = [(int(start[i]), int(start[i + 1])) for i in ids]
+            term, inverse = np.unique(np.concatenate([terms[lo:hi] for lo, hi in spans]), return_inverse=True)
+            count = np.bincount(inverse, weights=np.concatenate([counts[lo:hi] for lo, hi in spans])).astype(np.int64)
+            order = np.lexsort((term, -count))[:limit]
+            term, count = term[order], count[order]
+        docs = sum(int(self._a["docs"][i]) for i in ids) or 1
+        return [(self.term(t), c, round(c / docs, 3)) for t, c in zip(term.tolist(), count.tolist())]
+
+    def suggest(self, niche: str, limit: int = 10) -> dict:
+        label, ids = self.match(niche)
+        return {
+            "niche": label,
+            "gigs": sum(int(self._a["docs"][i]) for i in ids),
+            **{kind: [{"term": t, "gigs": c, "share": s} for t, c, s in self.top(ids, kind, limit)] for kind in KINDS},
+        }
+
+    def coverage(self, niche: str, text: str, limit: int = 10):
+        """Which of the niche's top tags/keywords appear in `text`; None for an unknown niche."""
+        label, ids = self.match(niche)
+        if not ids:
+            return None
+        text = norm(text)
+        terms = []
+        for kind in KINDS:
+            terms += [t for t, _, _ in self.top(ids, kind, limit) if t not in terms]
+        covered = [t for t in terms if contains(text, t)]
+        return {
+            "niche": label,
+            "covered": covered,
+            "missing": [t for t in terms if t not in covered],
+            "coverage": round(len(covered) / len(terms), 2) if terms else 0.0,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "niches": len(self.niches),
+            "terms": len(self._offsets) - 1,
+            "bytes": os.path.getsize(self.path),
+            "built_at": self.built_at,
+        }
+
+
+class TagIndexFile:
+    """The index at `path`, reopened when a rebuild replaces the file (checked every `check_every` s)."""
+
+    def __init__(self, path: str, check_every: float = 5.0):
+        self.path = path
+        self.check_every = check_every
+        self._index = None
+        self._checked = 0.0
+
+    def get(self):
+        """The current TagIndex, or None while there is no (valid) index file."""
+        now = time.monotonic()
+        if not self.path or now - self._checked < self.check_every:
+            return self._index
+        self._checked = now
+        try:
+            if self._index is None or os.path.getmtime(self.path) != self._index.mtime:
+                self._index = TagIndex(self.path)
+        except (OSError, ValueError) as e:
+            if self._index is not None or os.path.exists(self.path):
+                log.warning("tag index %s unavailable: %s", self.path, e)
+            self._index = None
+        return self._index
+
+
+# ---------- CLI ----------
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Build the niche keyword/tag index from NDJSON/CSV gigs (niche, title, description, tags).")
+    ap.add_argument("output", help="index file to write, e.g. tags.idx")
+    ap.add_argument("inputs", nargs="+", help="corpus files (.csv or NDJSON, e.g. the server's tag log)")
+    args = ap.parse_args(argv)
+
+    started = time.perf_counter()
+    docs, counts, seen, bad = Counter(), {kind: defaultdict(Counter) for kind in KINDS}, set(), 0
+    for path in args.inputs:
+        if not os.path.exists(path):
+            print(f"skipping {path}: not found", file=sys.stderr)
+            continue
+        with open(path, newline="", encoding="utf-8") as src:
+            d, c, b = count_rows(iter_csv(src) if path.lower().endswith(".csv") else iter_ndjson(src), seen)
+        docs.update(d)
+        bad += b
+        for kind in KINDS:
+            for niche, counter in c[kind].items():
+                counts[kind][niche].update(counter)
+
+    header = build(docs, counts, args.output)
+    print(f"indexed {sum(docs.values())} gigs in {len(header['niches'])} niches -> {args.output} "
+          f"({os.path.getsize(args.output):,} bytes, {time.perf_counter() - started:.2f}s)"
+          + (f", skipped {bad} unusable row(s)" if bad else ""), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+import os, sys
+
+# the backend modules are imported flat (`from concurrency import ...`), as app.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,13 @@
+import asyncio
+
+# pytest-asyncio isn't a dependency: async tests drive their own loop
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def settle():
+    """Let every ready task take a few steps."""
+    for _ in range(5):
+        await asyncio.sleep(0)
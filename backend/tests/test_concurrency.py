@@ -0,0 +1,246 @@
+import asyncio
+import pytest # type: ignore
+from helpers import run, settle
+from concurrency import AdmissionController, CancelOnDisconnect, Overloaded, SingleFlight
+
+
+# ---------- SingleFlight ----------
+
+def test_single_flight_shares_one_call():
+    async def main():
+        flight, calls = SingleFlight(), []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        results = await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+        return results, calls, flight.stats()
+
+    results, calls, stats = run(main())
+    assert results == ["answer"] * 5
+    assert len(calls) == 1
+    assert stats == {"in_flight": 0, "started": 1, "coalesced": 4}
+
+
+def test_single_flight_cancels_work_when_last_waiter_leaves():
+    async def main():
+        flight, state = SingleFlight(), {}
+
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                state["cancelled"] = True
+                raise
+
+        a = asyncio.ensure_future(flight.do("k", work))
+        b = asyncio.ensure_future(flight.do("k", work))
+        await settle()
+        a.cancel()
+        await settle()
+        state["after_first"] = state.get("cancelled", False)
+        b.cancel()
+        await settle()
+        return state, flight.stats()
+
+    state, stats = run(main())
+    assert state["after_first"] is False  # another caller was still waiting
+    assert state["cancelled"] is True
+    assert stats["in_flight"] == 0
+
+
+def test_single_flight_stream_replays_to_late_joiners_and_cancels_upstream():
+    async def main():
+        flight, state = SingleFlight(), {"closed": False}
+        release = asyncio.Event()
+
+        async def tokens():
+            try:
+                yield "a"
+                yield "b"
+                await release.wait()
+                yield "c"
+                await asyncio.sleep(10)
+            finally:
+                state["closed"] = True
+
+        async def take(n):
+            out = []
+            async for item in flight.stream("k", tokens):
+                out.append(item)
+                if len(out) == n:
+                    break
+            return out
+
+        first = await take(2)
+        full = asyncio.ensure_future(take(3))
+        late = asyncio.ensure_future(take(3))
+        await settle()
+        release.set()
+        got = await asyncio.gather(full, late)
+        await settle()
+        return first, got, state["closed"]
+
+    first, got, closed = run(main())
+    assert first == ["a", "b"]
+    assert got == [["a", "b", "c"], ["a", "b", "c"]]
+    assert closed  # nobody is reading any more, so the upstream generator was cancelled
+
+
+# ---------- AdmissionController ----------
+
+def test_admission_runs_higher_priority_first():
+    async def main():
+        ac, order = AdmissionController(max_inflight=1, max_queue=10, max_wait=60), []
+        await ac.acquire(0)
+
+        async def job(name, priority):
+            async with ac.slot(priority):
+                order.append(name)
+
+        tasks = [asyncio.ensure_future(job(n, p)) for n, p in (("batch", 3), ("chat", 1), ("improve", 2), ("reply", 0), ("chat2", 1))]
+        await settle()
+        ac.release()
+        await asyncio.gather(*tasks)
+        return order, ac.stats()
+
+    order, stats = run(main())
+    assert order == ["reply", "chat", "chat2", "improve", "batch"]
+    assert stats["in_flight"] == 0 and stats["queued"] == 0
+
+
+def test_admission_full_queue_displaces_lowest_priority_waiter():
+    async def main():
+        ac = AdmissionController(max_inflight=1, max_queue=2, max_wait=60)
+        await ac.acquire(0)
+        low = asyncio.ensure_future(ac.acquire(3))
+        mid = asyncio.ensure_future(ac.acquire(2))
+        await settle()
+        high = asyncio.ensure_future(ac.acquire(0))
+        await settle()
+        with pytest.raises(Overloaded, match="displaced"):
+            await low
+        with pytest.raises(Overloaded, match="full"):
+            await ac.acquire(3)  # nothing below it left to displace
+        ac.release()
+        await high
+        ac.release()
+        await mid
+        ac.release()
+        return ac.stats()
+
+    stats = run(main())
+    assert stats["in_flight"] == 0 and stats["queued"] == 0
+
+
+def test_admission_never_displaces_patient_waiters():
+    async def main():
+        ac = AdmissionController(max_inflight=1, max_queue=2, max_wait=60)
+        await ac.acquire(0)
+        patient = [asyncio.ensure_future(ac.acquire(3, patient=True)) for _ in range(3)]
+        await settle()
+        # patient waiters don't fill the bounded queue, so interactive work still gets in
+        urgent = asyncio.ensure_future(ac.acquire(0))
+        other = asyncio.ensure_future(ac.acquire(1))
+        await settle()
+        with pytest.raises(Overloaded, match="full"):
+            await ac.acquire(2)  # queue full and only patient work ranks below it
+        assert not any(p.done() for p in patient)
+        for waiter in (urgent, other, *patient):
+            ac.release()
+            await waiter
+        ac.release()
+        return ac.stats()
+
+    stats = run(main())
+    assert stats["in_flight"] == 0 and stats["queued"] == 0
+
+
+def test_admission_times_out_waiters_but_not_patient_ones():
+    async def main():
+        ac = AdmissionController(max_inflight=1, max_queue=10, max_wait=0.05)
+        ac.avg_service = 0.01  # so the wait estimate lets it queue
+        await ac.acquire(0)
+        patient = asyncio.ensure_future(ac.acquire(3, patient=True))
+        with pytest.raises(Overloaded, match="timed out"):
+            await ac.acquire(1)
+        assert not patient.done()
+        ac.release()
+        await patient
+        ac.release()
+        return ac.stats()
+
+    stats = run(main())
+    assert stats["in_flight"] == 0 and stats["rejected"] == 1
+
+
+def test_admission_rejects_when_estimated_wait_too_long():
+    ac = AdmissionController(max_inflight=1, max_queue=10, max_wait=5)
+    ac.avg_service = 60.0
+
+    async def main():
+        await ac.acquire(0)
+        with pytest.raises(Overloaded, match="estimated"):
+            await ac.acquire(1)
+        ac.release()
+
+    run(main())
+
+
+# ---------- CancelOnDisconnect ----------
+
+def asgi_server(gone_early: bool):
+    """receive/send like uvicorn's: http.disconnect once the response is complete (or the client left)."""
+    complete, sent = asyncio.Event(), []
+
+    async def receive():
+        if not sent:
+            sent.append({"type": "http.request", "body": b"", "more_body": False})
+            return sent[-1]
+        if not gone_early:
+            await complete.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+        if message["type"] == "http.response.body" and not message.get("more_body", False):
+            complete.set()
+
+    return receive, send
+
+
+def test_cancel_on_disconnect_cancels_a_handler_whose_client_left():
+    async def main():
+        state = {}
+
+        async def app(scope, receive, send):
+            await receive()
+            try:
+                await asyncio.sleep(10)  # a generation nobody is waiting for any more
+            except asyncio.CancelledError:
+                state["cancelled"] = True
+                raise
+
+        await asyncio.wait_for(CancelOnDisconnect(app)({"type": "http"}, *asgi_server(gone_early=True)), 5)
+        return state
+
+    assert run(main()) == {"cancelled": True}
+
+
+def test_cancel_on_disconnect_lets_the_handler_finish_after_its_response():
+    async def main():
+        state = {}
+
+        async def app(scope, receive, send):
+            await receive()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"ok"})
+            await asyncio.sleep(0.05)  # cleanup / background work after the response
+            state["finished"] = True
+
+        await asyncio.wait_for(CancelOnDisconnect(app)({"type": "http"}, *asgi_server(gone_early=False)), 5)
+        return state
+
+    assert run(main()) == {"finished": True}
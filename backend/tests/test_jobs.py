@@ -0,0 +1,188 @@
+import time, asyncio, threading
+from helpers import run, settle
+from jobs import CANCELLED, DONE, FAILED, QUEUED, JobQueue, RetryLater
+
+
+def test_retry_later_requeues_until_the_handler_succeeds():
+    async def main():
+        q, calls = JobQueue(db_path="", workers=1, max_attempts=5), []
+
+        async def flaky(payload):
+            calls.append(payload)
+            if len(calls) < 3:
+                raise RetryLater("ollama down", delay=0)
+            return {"ok": payload["n"]}
+
+        q.register("flaky", flaky)
+        q.start()
+        job = await q.submit("flaky", {"n": 1})
+        job = await q.wait(job["id"], 5)
+        await q.stop()
+        return job, len(calls)
+
+    job, calls = run(main())
+    assert job["status"] == DONE and job["result"] == {"ok": 1}
+    assert job["attempts"] == calls == 3
+
+
+def test_retry_later_fails_the_job_after_max_attempts():
+    async def main():
+        q = JobQueue(db_path="", workers=1, max_attempts=3)
+
+        async def down(payload):
+            raise RetryLater("ollama down", delay=0)
+
+        async def slow(payload):
+            raise RetryLater("over budget", delay=0, max_attempts=2)
+
+        q.register("down", down)
+        q.register("slow", slow)
+        q.start()
+        jobs = [await q.submit(kind, {}) for kind in ("down", "slow")]
+        jobs = [await q.wait(job["id"], 5) for job in jobs]
+        await q.stop()
+        return jobs
+
+    down, slow = run(main())
+    assert (down["status"], down["attempts"], down["error"]) == (FAILED, 3, "ollama down")
+    assert (slow["status"], slow["attempts"]) == (FAILED, 2)  # the handler's own, tighter cap
+
+
+def test_handler_error_fails_the_job():
+    async def main():
+        q = JobQueue(db_path="", workers=1)
+
+        async def broken(payload):
+            raise ValueError("bad gig")
+
+        q.register("broken", broken)
+        q.start()
+        job = await q.submit("broken", {})
+        job = await q.wait(job["id"], 5)
+        await q.stop()
+        return job
+
+    job = run(main())
+    assert (job["status"], job["error"], job["attempts"]) == (FAILED, "bad gig", 1)
+
+
+def test_cancel_queued_and_running_jobs():
+    async def main():
+        q, state = JobQueue(db_path="", workers=1), {}
+        started = asyncio.Event()
+
+        async def long(payload):
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                state["cancelled"] = True
+                raise
+
+        q.register("long", long)
+        q.start()
+        running = await q.submit("long", {})
+        queued = await q.submit("long", {})
+        await asyncio.wait_for(started.wait(), 5)
+        assert queued["status"] == QUEUED
+        queued = await q.cancel(queued["id"])
+        running = await q.cancel(running["id"])
+        await q.stop()
+        return running, queued, state, q.stats()
+
+    running, queued, state, stats = run(main())
+    assert running["status"] == CANCELLED and state["cancelled"]
+    assert queued["status"] == CANCELLED and queued["attempts"] == 0  # never ran
+    assert stats["running"] == 0
+
+
+def test_cancel_between_claim_and_run_stays_cancelled():
+    async def main():
+        q, calls = JobQueue(db_path="", workers=1), []
+
+        async def work(payload):
+            calls.append(payload)
+            return "done"
+
+        q.register("work", work)
+        job = await q.submit("work", {})
+        claimed = q._claim()  # a worker has taken it but not started the handler yet
+        cancel = asyncio.ensure_future(q.cancel(job["id"]))
+        await settle()
+        await q._run(claimed)
+        return await cancel, calls
+
+    job, calls = run(main())
+    assert job["status"] == CANCELLED and calls == []
+
+
+def test_finish_never_overwrites_a_recorded_outcome():
+    async def main():
+        q = JobQueue(db_path="", workers=1)
+        q.register("work", lambda payload: None)
+        job = await q.submit("work", {})
+        claimed = q._claim()
+        assert q._finish(job["id"], CANCELLED, None, "cancelled")
+        assert not q._finish(claimed["id"], DONE, "late result", None)
+        q._requeue(claimed["id"], 0)
+        return await q.get(job["id"])
+
+    job = run(main())
+    assert (job["status"], job["result"]) == (CANCELLED, None)
+
+
+def test_cancel_while_a_retry_is_being_requeued_stays_cancelled():
+    async def main():
+        q, calls = JobQueue(db_path="", workers=1, max_attempts=10), []
+        entered, proceed = threading.Event(), threading.Event()
+        requeue = q._requeue
+
+        def slow_requeue(job_id, not_before):
+            entered.set()
+            proceed.wait(5)
+            requeue(job_id, not_before)
+
+        async def flaky(payload):
+            calls.append(payload)
+            raise RetryLater("ollama down", delay=0)
+
+        q._requeue = slow_requeue
+        q.register("flaky", flaky)
+        q.start()
+        job = await q.submit("flaky", {})
+        await asyncio.to_thread(entered.wait, 5)
+        cancel = asyncio.ensure_future(q.cancel(job["id"]))  # the DELETE lands mid-requeue
+        while job["id"] not in q._cancelling:
+            await asyncio.sleep(0.01)
+        proceed.set()
+        job = await cancel
+        await asyncio.sleep(0.1)  # a requeued job would run again by now
+        await q.stop()
+        return job, len(calls), q._cancelling
+
+    job, calls, marks = run(main())
+    assert job["status"] == CANCELLED and calls == 1 and not marks
+
+
+def test_wait_sees_a_job_that_finishes_while_it_looks():
+    async def main():
+        q = JobQueue(db_path="", workers=1)
+        q.register("work", lambda payload: None)
+        job = await q.submit("work", {})
+        claimed = q._claim()
+        get = q.get
+
+        async def racing_get(job_id):
+            stale = await get(job_id)
+            q._finish(claimed["id"], DONE, "answer", None)  # the worker finishes right after the read
+            q._notify(claimed["id"])
+            return stale
+
+        q.get = racing_get
+        started = time.perf_counter()
+        await q.wait(job["id"], 5)
+        q.get = get
+        return await q.get(job["id"]), time.perf_counter() - started
+
+    job, elapsed = run(main())
+    assert job["status"] == DONE and elapsed < 1
@@ -0,0 +1,35 @@
+import json
+from jsonextract import JSONScanner, extract_json, loads_lenient
+
+ANSWER = 'Sure! ```json\n{"title": "Logo \\"pro\\" {design}", "tags": ["a", "b",], "faqs": [{"q": "x", "a": "y"}]}\n``` Hope it helps.'
+
+
+def test_incremental_scan_matches_one_shot_for_every_chunking():
+    expected = extract_json(ANSWER)
+    assert expected == {"title": 'Logo "pro" {design}', "tags": ["a", "b"], "faqs": [{"q": "x", "a": "y"}]}
+    for size in (1, 2, 3, 7, len(ANSWER)):
+        scanner = JSONScanner("{")
+        for i in range(0, len(ANSWER), size):
+            scanner.feed(ANSWER[i:i + size])
+        assert scanner.complete
+        assert extract_json(ANSWER, scanner) == expected
+
+
+def test_escape_split_across_chunks():
+    scanner = JSONScanner("{")
+    for chunk in ('{"a": "x\\', '""}', ' trailing'):
+        scanner.feed(chunk)
+    assert scanner.result() == {"a": 'x"'}
+
+
+def test_truncated_stream_is_repaired():
+    scanner = JSONScanner("{")
+    for token in ('{"tags": ["seo", "back', "links"):
+        scanner.feed(token)
+    assert not scanner.complete
+    assert scanner.result() == {"tags": ["seo", "backlinks"]}
+
+
+def test_loads_lenient_drops_dangling_member():
+    assert loads_lenient('{"a": 1, "b": {"c": [1, 2') == {"a": 1, "b": {"c": [1, 2]}}
+    assert loads_lenient(json.dumps({"a": "b"})) == {"a": "b"}
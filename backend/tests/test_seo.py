@@ -0,0 +1,31 @@
+import io, json
+from seo import iter_csv, iter_ndjson, render, score_gig
+
+DESC = "Transform your brand.\n• One\n• Two\n• Three\n" + "word " * 130
+
+
+def scored(text, reader=iter_ndjson):
+    out = "".join(t for _, t in render(reader(io.StringIO(text))))
+    return [json.loads(line) for line in out.splitlines()]
+
+
+def test_bulk_rows_match_single_scores():
+    rows = scored('{"id": 1, "title": "%s", "description": %s, "primary_kw": "brand"}\n' % ("x" * 60, json.dumps(DESC)))
+    single = score_gig("x" * 60, DESC.strip(), "brand")
+    assert rows == [{"row": 0, "id": 1, **single}]
+    assert single["score"] == 40
+
+
+def test_bad_rows_become_errors_without_stopping_the_stream():
+    rows = scored('{"title": 5}\nnot json\n{"title": ["a"]}\n[1]\n{"title": "ok"}\n')
+    assert [r["row"] for r in rows] == [0, 1, 2, 3, 4]
+    assert "error" not in rows[0] and rows[0]["score"] == 0  # numbers are read as text
+    assert rows[1]["error"].startswith("invalid JSON")
+    assert rows[2]["error"] == "title must be a string, not list"
+    assert rows[3]["error"] == "expected a JSON object"
+    assert "score" in rows[4]
+
+
+def test_csv_input():
+    rows = scored("title,description,primary_kw\nHello,,seo\n", iter_csv)
+    assert rows[0]["row"] == 0 and "score" in rows[0]
@@ -0,0 +1,82 @@
+import json
+from tagindex import MATCH_NICHES, TagIndex, TagLog, build, count_rows
+
+
+def gig(niche, title, tags, description="", **extra):
+    return {"niche": niche, "title": title, "description": description, "tags": tags, **extra}
+
+
+def index_of(rows, tmp_path):
+    docs, counts, bad = count_rows(enumerate(rows))
+    build(docs, counts, str(tmp_path / "tags.idx"))
+    return TagIndex(str(tmp_path / "tags.idx")), bad
+
+
+ROWS = [
+    gig("Logo Design", "I will design a minimalist logo", "minimalist logo, brand identity"),
+    gig("logo design", "I will design a vintage logo", ["vintage logo", "brand identity"]),
+    gig("logo-design", "I will design a vintage logo", ["vintage logo", "brand identity"]),  # same gig again
+    gig("WordPress Development", "I will fix your wordpress site", "wordpress, bug fix"),
+]
+
+
+def test_suggest_exact_and_fuzzy_niches(tmp_path):
+    index, bad = index_of(ROWS, tmp_path)
+    assert bad == 0 and index.niches == ["logo design", "wordpress development"]
+    exact = index.suggest("#Logo-Design", limit=2)
+    assert (exact["niche"], exact["gigs"]) == ("logo design", 2)  # the repeated gig counts once
+    assert exact["tags"][0] == {"term": "brand identity", "gigs": 2, "share": 1.0}
+    fuzzy = index.suggest("minimal logo design ideas")
+    assert fuzzy["niche"] == "logo design" and fuzzy["tags"] == index.suggest("logo design")["tags"]
+    assert index.suggest("knitting") == {"niche": None, "gigs": 0, "tags": [], "keywords": []}
+
+
+def test_coverage_of_a_gig_text(tmp_path):
+    index, _ = index_of(ROWS, tmp_path)
+    result = index.coverage("logo design", "A vintage logo for your brand", limit=3)
+    assert result["niche"] == "logo design"
+    assert {"vintage logo", "logo"} <= set(result["covered"])
+    assert {"brand identity", "minimalist logo", "design"} <= set(result["missing"])
+    assert result["coverage"] == round(len(result["covered"]) / (len(result["covered"]) + len(result["missing"])), 2)
+    assert index.coverage("knitting", "anything") is None
+
+
+def test_broad_niche_merges_only_the_biggest_matches(tmp_path):
+    rows = [gig(f"logo style{n}", f"logo {n} gig {g}", [f"tag{n}"]) for n in range(MATCH_NICHES + 4) for g in range(n + 1)]
+    index, _ = index_of(rows, tmp_path)
+    label, ids = index.match("logo")
+    assert label == "logo" and len(ids) == MATCH_NICHES
+    assert sorted(index.niches[i] for i in ids) == sorted(f"logo style{n}" for n in range(4, MATCH_NICHES + 4))
+    top = index.suggest("logo", limit=2)["tags"]
+    assert [t["term"] for t in top] == [f"tag{MATCH_NICHES + 3}", f"tag{MATCH_NICHES + 2}"]
+
+
+def test_unusable_rows_are_skipped_and_counted(tmp_path):
+    rows = ROWS + [{"niche": 5, "title": "numbers are text", "tags": ["five"]}, {"niche": ["a"]},
+                   gig("logo design", {"bad": 1}, "x"), ValueError("invalid JSON"), "not a row"]
+    index, bad = index_of(rows, tmp_path)
+    assert bad == 4
+    assert index.suggest("5")["gigs"] == 1
+
+
+def test_tag_log_writes_in_the_background_and_flushes_on_close(tmp_path):
+    path = tmp_path / "tags.ndjson"
+    tag_log = TagLog(str(path))
+    tag_log.append("Logo Design", "I will design a logo", "Minimal logos", "logo, minimal logo")
+    tag_log.append("", "no niche", "", ["ignored"])
+    tag_log.append("logo design", "no tags", "", [])
+    for i in range(100):
+        tag_log.append("logo design", f"gig {i}", "", ["logo"])
+    tag_log.close()
+    rows = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert len(rows) == 101
+    assert rows[0] == {"niche": "Logo Design", "title": "I will design a logo", "description": "Minimal logos",
+                       "tags": ["logo", "minimal logo"]}
+    assert [r["title"] for r in rows[1:]] == [f"gig {i}" for i in range(100)]
+
+
+def test_tag_log_without_a_path_writes_nothing():
+    tag_log = TagLog("")
+    tag_log.append("logo design", "t", "d", ["logo"])
+    tag_log.close()
+    assert tag_log._writer is None
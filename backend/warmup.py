@@ -0,0 +1,126 @@
+# backend/warmup.py
+#
+# Keeps the configured models loaded so user requests don't pay Ollama's model load:
+# preloads them on every host at startup, then, during business hours, pings any host
+# that has been idle long enough for its keep_alive to run out.
+
+import time, asyncio, logging
+from datetime import datetime
+from metrics import MODEL_LOAD_SECONDS
+from ollama_client import OllamaError
+
+log = logging.getLogger("gig_helper.warmup")
+
+DAY_NAMES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+
+def parse_days(spec: str) -> set:
+    """'mon-fri' / 'mon,wed,fri' / 'sat-sun' -> weekday numbers (Monday = 0). Empty means every day."""
+    days = set()
+    for part in filter(None, (p.strip().lower() for p in spec.split(","))):
+        first, _, last = part.partition("-")
+        a = DAY_NAMES.index(first[:3])
+        b = DAY_NAMES.index(last[:3]) if last else a
+        days.update(range(a, b + 1) if a <= b else [*range(a, 7), *range(0, b + 1)])
+    return days or set(range(7))
+
+
+def parse_hours(spec: str):
+    """'08:00-20:00' -> (480, 1200) minutes after midnight; empty means all day. Windows may wrap midnight."""
+    if not spec.strip():
+        return (0, 24 * 60)
+    start, _, end = spec.strip().partition("-")
+    minutes = lambda t: int(t.split(":")[0]) * 60 + int((t.split(":") + ["0"])[1])
+    return (minutes(start), minutes(end))
+
+
+def in_window(now: datetime, days: set, hours) -> bool:
+    if now.weekday() not in days:
+        return False
+    m = now.hour * 60 + now.minute
+    start, end = hours
+    return start <= m < end if start <= end else (m >= start or m < end)
+
+
+class ModelWarmer:
+    """
+    Preloads `models` on every host of `pool` (an empty /api/generate with keep_alive),
+    then every `interval` seconds inside the days/hours window re-sends that preload
+    to hosts that haven't served a request for `interval` seconds. interval=0 only preloads.
+    """
+
+    def __init__(self, pool, models, keep_alive=None, interval: float = 240, days: str = "mon-fri",
+                 hours: str = "08:00-20:00"):
+        self.pool = pool
+        self.models = list(dict.fromkeys(m for m in models if m))
+        self.keep_alive = keep_alive
+        self.interval = interval
+        self.days = parse_days(days)
+        self.hours = parse_hours(hours)
+        self.state = {}  # (backend url, model) -> last preload result
+        self.pings = 0
+        self._task = None
+
+    def start(self):
+        if self._task is None and self.models:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def business_hours(self) -> bool:
+        return in_window(datetime.now(), self.days, self.hours)
+
+    async def _run(self):
+        await self.warm_all("startup")
+        while self.interval > 0:
+            await asyncio.sleep(self.interval)
+            if self.business_hours():
+                await self.warm_all("keepalive", idle_for=self.interval)
+
+    async def warm_all(self, reason: str, idle_for: float = 0):
+        # hosts in parallel; models one after another per host so they don't fight over memory
+        await asyncio.gather(*(self._warm_backend(b, reason, idle_for) for b in self.pool.backends))
+
+    async def _warm_backend(self, backend, reason: str, idle_for: float):
+        if idle_for and time.monotonic() - backend.last_used < idle_for:
+            return  # real traffic is keeping it loaded
+        for model in self.models:
+            if not backend.usable(model):
+                continue  # host down or model not installed there; /health says which
+            await self.preload(backend, model, reason)
+
+    async def preload(self, backend, model: str, reason: str):
+        started = time.perf_counter()
+        try:
+            done = await backend.client.preload(model, keep_alive=self.keep_alive)
+        except OllamaError as e:
+            self.state[(backend.url, model)] = {"ok": False, "reason": reason, "at": time.time(), "error": str(e)}
+            log.warning("preloading %s on %s failed: %s", model, backend.url, e)
+            return
+        elapsed = time.perf_counter() - started
+        if reason == "keepalive":
+            self.pings += 1
+        MODEL_LOAD_SECONDS.observe(done.load_duration, backend=backend.url, model=model, reason=reason)
+        self.state[(backend.url, model)] = {
+            "ok": True, "reason": reason, "at": time.time(),
+            "load_s": round(done.load_duration, 3), "elapsed_s": round(elapsed, 3),
+        }
+        if done.load_duration > 1:
+            log.info("loaded %s on %s in %.1fs (%s)", model, backend.url, done.load_duration, reason)
+
+    def stats(self) -> dict:
+        return {
+            "models": self.models,
+            "keep_alive": self.keep_alive,
+            "ping_interval_s": self.interval,
+            "business_hours_now": self.business_hours(),
+            "keepalive_pings": self.pings,
+            "preloads": [{"backend": url, "model": model, **s} for (url, model), s in self.state.items()],
+        }
@@ -19,6 +19,31 @@ async function getFieldsFromPage() {
   return await chrome.tabs.sendMessage(tab.id, { type: "GET_GIG_FIELDS" });
 }
 
+// POST to a streaming endpoint and dispatch its SSE events ("draft", "token", "done", "error") to handlers.
+async function streamEvents(path, body, handlers) {
+  const r = await fetch(`${API}${path}`, {
+    method: "POST", headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body)
+  });
+  if (!r.ok) throw new Error(`HTTP ${r.status}: ${await r.text()}`);
+  const reader = r.body.getReader();
+  const decoder = new TextDecoder();
+  let buf = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buf += decoder.decode(value, { stream: true });
+    let sep;
+    while ((sep = buf.indexOf("\n\n")) >= 0) {
+      const block = buf.slice(0, sep);
+      buf = buf.slice(sep + 2);
+      const event = (block.match(/^event: (.*)$/m) || [])[1];
+      const data = (block.match(/^data: (.*)$/m) || [])[1];
+      if (event && data && handlers[event]) handlers[event](JSON.parse(data));
+    }
+  }
+}
+
 /* ------- tabs ------- */
 function switchTab(which) {
   show("#viewImprove", which === "improve");
@@ -156,14 +181,27 @@ async function improveGig() {
       return;
     }
     setStatus("#status", "Generating suggestions…");
-    const r = await fetch(`${API}/improve_gig`, {
-      method: "POST", headers: { "Content-Type": "application/json" },
-      body: JSON.stringify(gig)
+    let partial = "";
+    let failed = null;
+    await streamEvents("/improve_gig/stream", gig, {
+      draft: ({ result }) => {
+        // instant rule-based analysis; the streamed AI answer below replaces it
+        renderData(result);
+        setStatus("#status", "Draft ready, refining with AI…");
+      },
+      token: ({ text }) => {
+        // show tokens as they arrive; the final render below replaces them
+        partial += text;
+        el("#rawText").textContent = partial;
+        show("#raw", true);
+      },
+      done: ({ result }) => {
+        renderData(result);         // reuse your existing renderer
+        show("#btnInsert", Boolean(result.suggested_title || result.suggested_description));
+      },
+      error: ({ error }) => { failed = error; }
     });
-    if (!r.ok) throw new Error(`HTTP ${r.status}: ${await r.text()}`);
-    const data = await r.json();
-    renderData(data);               // reuse your existing renderer
-    show("#btnInsert", Boolean(data.suggested_title || data.suggested_description));
+    if (failed) throw new Error(failed);
     setStatus("#status", "Done ✅", "ok");
   } catch (e) {
     setStatus("#status", String(e), "error");
@@ -207,6 +245,31 @@ el("#ucLoadFromPage").onclick = async () => {
   }
 };
 
+// Upcraft rewrites run as server-side jobs: the job id is kept in storage so closing the
+// popup doesn't lose the analysis; reopening picks it up (or its result) again.
+async function waitForJob(id) {
+  for (;;) {
+    const r = await fetch(`${API}/jobs/${id}?wait=25`);
+    if (r.status === 404) throw new Error("The analysis expired, please run it again.");
+    if (!r.ok) throw new Error(`HTTP ${r.status}: ${await r.text()}`);
+    const job = await r.json();
+    if (job.status === "done") return job.result;
+    if (job.status !== "queued" && job.status !== "running") throw new Error(job.error || `Job ${job.status}`);
+    setStatus("#ucStatus", job.status === "queued" ? `Queued (${job.position} ahead)…` : "Rewriting…");
+  }
+}
+
+async function finishRewriteJob(id) {
+  try {
+    const data = await waitForJob(id);
+    renderRewrite(data);
+  } catch (e) {
+    setStatus("#ucStatus", String(e), "error");
+  } finally {
+    await chrome.storage.local.remove("rewriteJob");
+  }
+}
+
 el("#ucRewrite").onclick = async () => {
   try {
     setStatus("#ucStatus", "Rewriting…");
@@ -215,29 +278,39 @@ el("#ucRewrite").onclick = async () => {
       description: el("#ucDesc").value || "",
       niche: el("#ucNiche").value || ""
     };
-    const r = await fetch(`${API}/improve_gig`, {
+    const r = await fetch(`${API}/jobs/improve_gig?structured=true`, {
       method: "POST", headers: { "Content-Type": "application/json" },
       body: JSON.stringify(payload)
     });
     if (!r.ok) throw new Error(`HTTP ${r.status}: ${await r.text()}`);
-    const data = await r.json();
-
-    // render compactly into Upcraft boxes
-    el("#ucOutTitle").textContent = data.suggested_title || "";
-    el("#ucOutDesc").textContent = data.suggested_description || "";
-    el("#ucOutTags").innerHTML = (data.tags || []).map(t => `<span class="pill">${t}</span>`).join("");
-    el("#ucOutFaqs").textContent = (data.faqs || []).map(f => `Q: ${f.q}\nA: ${f.a}`).join("\n\n");
-    show("#ucResults", true);
-    setStatus("#ucStatus", "Done ✅", "ok");
-
-    // click to copy
-    el("#ucOutTitle").onclick = async () => { await navigator.clipboard.writeText(el("#ucOutTitle").textContent); setStatus("#ucStatus","Title copied ✅","ok"); };
-    el("#ucOutDesc").onclick = async () => { await navigator.clipboard.writeText(el("#ucOutDesc").textContent); setStatus("#ucStatus","Description copied ✅","ok"); };
+    const job = await r.json();
+    await chrome.storage.local.set({ rewriteJob: job.id });
+    await finishRewriteJob(job.id);
   } catch (e) {
     setStatus("#ucStatus", String(e), "error");
   }
 };
 
+chrome.storage.local.get("rewriteJob").then(({ rewriteJob }) => {
+  if (!rewriteJob) return;
+  setStatus("#ucStatus", "Picking up your last rewrite…");
+  finishRewriteJob(rewriteJob);
+});
+
+function renderRewrite(data) {
+  // render compactly into Upcraft boxes
+  el("#ucOutTitle").textContent = data.suggested_title || "";
+  el("#ucOutDesc").textContent = data.suggested_description || "";
+  el("#ucOutTags").innerHTML = (data.tags || []).map(t => `<span class="pill">${t}</span>`).join("");
+  el("#ucOutFaqs").textContent = (data.faqs || []).map(f => `Q: ${f.q}\nA: ${f.a}`).join("\n\n");
+  show("#ucResults", true);
+  setStatus("#ucStatus", "Done ✅", "ok");
+
+  // click to copy
+  el("#ucOutTitle").onclick = async () => { await navigator.clipboard.writeText(el("#ucOutTitle").textContent); setStatus("#ucStatus","Title copied ✅","ok"); };
+  el("#ucOutDesc").onclick = async () => { await navigator.clipboard.writeText(el("#ucOutDesc").textContent); setStatus("#ucStatus","Description copied ✅","ok"); };
+}
+
 el("#ucVariations").onclick = async () => {
   try {
     setStatus("#ucStatus", "Generating title variations…");
@@ -247,7 +320,7 @@ el("#ucVariations").onclick = async () => {
       description: el("#ucDesc").value || "",
       niche: el("#ucNiche").value || ""
     };
-    const r = await fetch(`${API}/improve_gig`, {
+    const r = await fetch(`${API}/improve_gig?structured=true`, {
       method: "POST", headers: { "Content-Type": "application/json" },
       body: JSON.stringify(payload)
     });
@@ -336,6 +409,9 @@ el("#copyAll").onclick = async () => {
 };
 
 /* Chatbot functionality */
+// Server-side conversation id; follow-ups send it back so the backend keeps the history
+let chatSessionId = "";
+
 el("#sendChat").onclick = async () => {
   const chatInput = el("#chatInput");
   const message = chatInput.value.trim();
@@ -351,23 +427,25 @@ el("#sendChat").onclick = async () => {
     // Get current gig data
     const gig = await getFieldsFromPage();
     
-    // Send chat request to backend
-    const r = await fetch(`${API}/chat_gig`, {
-      method: "POST", 
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({
-        title: gig.title || "",
-        description: gig.description || "",
-        niche: gig.niche || "",
-        user_message: message
-      })
+    // Stream the chat reply into a fresh AI message as tokens arrive
+    const reply = addChatMessage("AI Assistant", "…", "ai");
+    let partial = "";
+    let failed = null;
+    await streamEvents("/chat_gig/stream", {
+      title: gig.title || "",
+      description: gig.description || "",
+      niche: gig.niche || "",
+      user_message: message,
+      session_id: chatSessionId
+    }, {
+      token: ({ text }) => { partial += text; reply.textContent = partial; },
+      done: ({ result, session_id }) => {
+        if (session_id) chatSessionId = session_id;
+        reply.textContent = result.response || "I'm sorry, I couldn't process that request.";
+      },
+      error: ({ error }) => { failed = error; }
     });
-    
-    if (!r.ok) throw new Error(`HTTP ${r.status}: ${await r.text()}`);
-    const data = await r.json();
-    
-    // Add AI response to chat history
-    addChatMessage("AI Assistant", data.response || "I'm sorry, I couldn't process that request.", "ai");
+    if (failed) throw new Error(failed);
     
     setStatus("#status", "Response ready! ✅", "ok");
   } catch (e) {
@@ -410,4 +488,5 @@ function addChatMessage(sender, message, type) {
   
   // Scroll to bottom
   chatHistory.scrollTop = chatHistory.scrollHeight;
+  return messageSpan;
 }
\ No newline at end of file